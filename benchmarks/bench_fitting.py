@@ -0,0 +1,58 @@
+"""Benchmarks for fitting the models in :mod:`mvdlib.fit_functions` and
+Rabi flopping data. Run this module from the repository root for a
+quick overview::
+
+    python -m benchmarks.bench_fitting
+
+"""
+
+from __future__ import print_function
+import numpy as np
+from scipy.optimize import curve_fit
+from mvdlib import fit_functions
+from mvdlib.quantum.rabi import RabiFlop
+from benchmarks.common import rabi_data, run
+
+# Model name -> (true parameters, initial guess)
+_models = {
+    'gaussian': ([1., 0.1, 5., 0.5], [0.8, 0., 4.8, 0.7]),
+    'lorentzian': ([1., 0.1, 5., 0.5], [0.8, 0., 4.8, 0.7]),
+    'sechsq': ([1., 0.1, 5., 0.5], [0.8, 0., 4.8, 0.7]),
+    'sine': ([1., 0.1, 2., 0.3], [0.8, 0., 2.05, 0.2]),
+    'exp_decay': ([1., 0.1, 2., 0.], [0.8, 0., 1.5, 0.]),
+}
+
+class FitModels(object):
+    params = [sorted(_models), [100, 10000]]
+    param_names = ['model', 'points']
+
+    def setup(self, model, points):
+        p, self.p0 = _models[model]
+        self.func = getattr(fit_functions, model)
+        self.x = np.linspace(0, 10, points)
+        self.y = self.func(self.x, *p)
+        self.y += np.random.RandomState(0).normal(0, 0.01, points)
+
+    def time_evaluate(self, model, points):
+        self.func(self.x, *self.p0)
+
+    def time_curve_fit(self, model, points):
+        curve_fit(self.func, self.x, self.y, self.p0)
+
+class FitRabi(object):
+    params = [50, 5000]
+    param_names = ['points']
+
+    def setup(self, points):
+        # Bypass file loading, which is covered by bench_io
+        self.rabi = RabiFlop.__new__(RabiFlop)
+        t, P, err = rabi_data(points)
+        self.rabi.t, self.rabi.P, self.rabi.err = t, P/100, err/100
+        self.rabi.use_errorbars = True
+
+    def time_fit(self, points):
+        self.rabi.fit(2., 10.)
+
+if __name__ == "__main__":
+    run(FitModels)
+    run(FitRabi)
@@ -0,0 +1,111 @@
+"""Benchmarks for loading data files.
+
+Covers :class:`~mvdlib.analysis.combine.Combiner`,
+:class:`~mvdlib.analysis.plot.Plotter`,
+:meth:`~mvdlib.oceanoptics.OOSpectrum.load_sample`, and
+:class:`~mvdlib.quantum.rabi.RabiFlop` on synthetic files. Run this
+module from the repository root for a quick overview::
+
+    python -m benchmarks.bench_io
+
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import numpy as np
+from mvdlib.analysis.combine import Combiner
+from mvdlib.analysis.plot import Plotter
+from mvdlib.oceanoptics import OOSpectrum
+from mvdlib.quantum.rabi import RabiFlop
+from benchmarks.common import (tempdir, write_xy_files, write_rabi_file,
+                               write_spectrum, run)
+
+class LoadCombiner(object):
+    params = [[10, 100], [100, 10000]]
+    param_names = ['files', 'points']
+    timeout = 120
+
+    def setup(self, files, points):
+        self.datadir = tempdir()
+        write_xy_files(self.datadir, 'data_', files, points)
+        self.indices = range(1, files + 1)
+
+    def teardown(self, files, points):
+        shutil.rmtree(self.datadir)
+
+    def time_combine(self, files, points):
+        # A new Combiner, so the files are read every time
+        Combiner(self.datadir, 'data_', skiprows=1).combine(self.indices)
+
+class CombineChannels(object):
+    """Combine every channel of multi-channel detector files."""
+    params = [10, 30]
+    param_names = ['channels']
+    timeout = 120
+
+    def setup(self, channels):
+        self.datadir = tempdir()
+        random = np.random.RandomState(0)
+        t = np.linspace(0, 1, 1000)
+        for i in range(1, 21):
+            np.savetxt(os.path.join(self.datadir, 'det_%04d.dat' % i),
+                       np.column_stack([t, random.normal(size=(1000,
+                                                               channels))]))
+        self.indices = range(1, 21)
+
+    def teardown(self, channels):
+        shutil.rmtree(self.datadir)
+
+    def time_combine_all_channels(self, channels):
+        combiner = Combiner(self.datadir, 'det_')
+        for column in range(1, channels + 1):
+            combiner.combine(self.indices, y=column)
+
+class LoadPlotter(object):
+    params = [100, 10000, 100000]
+    param_names = ['points']
+
+    def setup(self, points):
+        self.datadir = tempdir()
+        write_xy_files(self.datadir, 'data_', 1, points)
+
+    def teardown(self, points):
+        shutil.rmtree(self.datadir)
+
+    def time_add_data(self, points):
+        Plotter(self.datadir, 'data_').add_data(1)
+
+class LoadSpectrum(object):
+    params = [2048, 3648]
+    param_names = ['pixels']
+
+    def setup(self, pixels):
+        self.datadir = tempdir()
+        self.filename = os.path.join(self.datadir, 'spectrum.txt')
+        write_spectrum(self.filename, pixels)
+
+    def teardown(self, pixels):
+        shutil.rmtree(self.datadir)
+
+    def time_load_sample(self, pixels):
+        OOSpectrum().load_sample(self.filename)
+
+class LoadRabi(object):
+    params = [50, 5000]
+    param_names = ['points']
+
+    def setup(self, points):
+        self.datadir = tempdir()
+        self.filename = os.path.join(self.datadir, 'rabi.csv')
+        write_rabi_file(self.filename, points)
+
+    def teardown(self, points):
+        shutil.rmtree(self.datadir)
+
+    def time_load(self, points):
+        RabiFlop(self.filename)
+
+if __name__ == "__main__":
+    for cls in [LoadCombiner, CombineChannels, LoadPlotter, LoadSpectrum, LoadRabi]:
+        run(cls)
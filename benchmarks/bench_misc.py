@@ -0,0 +1,65 @@
+"""Benchmarks for mvdlib.misc.
+
+The reference functions are the original implementations, which make a
+full pass (and usually a full temporary) per operation. Run this
+module from the repository root to compare them against the fused
+versions on large arrays::
+
+    python -m benchmarks.bench_misc [samples]
+
+"""
+
+from __future__ import print_function
+import sys
+import timeit
+import numpy as np
+from mvdlib import misc
+
+def _reference_fix_offset_and_normalize(data):
+    offset = data - np.min(data)
+    return offset/np.max(offset)
+
+def _reference_rms(x):
+    return np.sqrt(np.sum(x**2)/len(x))
+
+class TimeMisc(object):
+    params = [10**6, 10**8]
+    param_names = ['samples']
+
+    def setup(self, samples):
+        self.x = np.random.RandomState(0).normal(size=samples)
+        self.out = np.empty_like(self.x)
+
+    def time_rms_reference(self, samples):
+        _reference_rms(self.x)
+
+    def time_rms(self, samples):
+        misc.rms(self.x)
+
+    def time_running_stats(self, samples):
+        misc.running_stats(self.x)
+
+    def time_fix_offset_and_normalize_reference(self, samples):
+        _reference_fix_offset_and_normalize(self.x)
+
+    def time_fix_offset_and_normalize(self, samples):
+        misc.fix_offset_and_normalize(self.x)
+
+    def time_fix_offset_and_normalize_out(self, samples):
+        misc.fix_offset_and_normalize(self.x, out=self.out)
+
+    def time_fix_offset_and_normalize_inplace(self, samples):
+        # Repeated application is idempotent, so no reset is needed.
+        misc.fix_offset_and_normalize(self.out, inplace=True)
+
+if __name__ == "__main__":
+    samples = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**8
+    bench = TimeMisc()
+    bench.setup(samples)
+    bench.out[:] = bench.x
+    print("{:<45s} {:>10s}".format("benchmark (%d samples)" % samples, "best [s]"))
+    for name in sorted(dir(bench)):
+        if name.startswith('time_'):
+            func = getattr(bench, name)
+            best = min(timeit.repeat(lambda: func(samples), number=1, repeat=3))
+            print("{:<45s} {:>10.4f}".format(name[5:], best))
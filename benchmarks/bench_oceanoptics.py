@@ -0,0 +1,59 @@
+"""Benchmarks for mvdlib.oceanoptics fitting.
+
+Compares Gaussian fits of the full spectrum with fits restricted to a
+region of interest around the line, for speed (``time_*``) and for the
+error of the fitted center (``track_*``, in pm). Run this module from
+the repository root for a quick comparison::
+
+    python -m benchmarks.bench_oceanoptics
+
+"""
+
+from __future__ import print_function
+import timeit
+import numpy as np
+from mvdlib import fit_functions
+from mvdlib.oceanoptics import OOSpectrum
+
+def make_spectrum(pixels=3648, center=397.1234, sigma=0.2, noise=5., seed=0):
+    """Return an OOSpectrum with a single noisy Gaussian line."""
+    spectrum = OOSpectrum()
+    spectrum.lmbda = np.linspace(350., 450., pixels)
+    spectrum.response = fit_functions.gaussian(
+        spectrum.lmbda, 1000., 50., center, sigma)
+    spectrum.response += np.random.RandomState(seed).normal(0, noise, pixels)
+    return spectrum
+
+# Fit settings to compare: name -> keyword arguments for fit_gaussian
+_modes = {
+    'full': {},
+    'roi': {'roi': 'auto'},
+    'roi_binned': {'roi': 'auto', 'binning': 2},
+}
+
+class FitGaussian(object):
+    params = sorted(_modes)
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.center = 397.1234
+        self.spectrum = make_spectrum(center=self.center)
+        self.kwargs = _modes[mode]
+
+    def time_fit_gaussian(self, mode):
+        self.spectrum.fit_gaussian(**self.kwargs)
+
+    def track_center_error_pm(self, mode):
+        p, cov = self.spectrum.fit_gaussian(**self.kwargs)
+        return abs(p[2] - self.center)*1e3
+
+if __name__ == "__main__":
+    bench = FitGaussian()
+    print("{:<12s} {:>10s} {:>16s}".format("mode", "time [ms]",
+                                           "center err [pm]"))
+    for mode in FitGaussian.params:
+        bench.setup(mode)
+        best = min(timeit.repeat(lambda: bench.time_fit_gaussian(mode),
+                                 number=10, repeat=3))/10
+        print("{:<12s} {:>10.3f} {:>16.3f}".format(
+            mode, best*1e3, bench.track_center_error_pm(mode)))
@@ -0,0 +1,35 @@
+"""Benchmarks for :class:`mvdlib.optics.glass.Glass`. Run this module
+from the repository root for a quick overview::
+
+    python -m benchmarks.bench_optics
+
+"""
+
+from __future__ import print_function
+import numpy as np
+from mvdlib.optics import glass
+from benchmarks.common import run
+
+class GlassEvaluation(object):
+    params = [1, 10**5]
+    param_names = ['size']
+
+    def setup(self, size):
+        self.lmbda = np.linspace(400e-9, 1000e-9, size)
+        if size == 1:
+            self.lmbda = self.lmbda[0]
+
+    def time_sellmeier(self, size):
+        glass.BK7.sellmeier(self.lmbda)
+
+    def time_chromatic_dispersion(self, size):
+        glass.BK7.chromatic_dispersion(self.lmbda)
+
+    def time_focal_length(self, size):
+        glass.BK7.focal_length(self.lmbda, 0.1)
+
+    def time_focal_length_thick(self, size):
+        glass.BK7.focal_length(self.lmbda, 0.1, -0.1, 5e-3)
+
+if __name__ == "__main__":
+    run(GlassEvaluation)
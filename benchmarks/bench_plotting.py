@@ -0,0 +1,78 @@
+"""Benchmarks for plot styles and figure rendering, and for the time to
+import mvdlib modules. Run this module from the repository root for a
+quick overview::
+
+    python -m benchmarks.bench_plotting
+
+"""
+
+from __future__ import print_function
+import os
+import sys
+import shutil
+import subprocess
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from mvdlib import plotutils
+from mvdlib.analysis.plot import Plotter
+from mvdlib.plotutils.batch import render
+from benchmarks.common import tempdir, write_xy_files, run
+
+class Styles(object):
+    params = ['web', 'aps', 'default']
+    param_names = ['style']
+
+    def setup(self, style):
+        self.rc = dict(plt.rcParams)
+
+    def teardown(self, style):
+        plt.rcParams.update(self.rc)
+
+    def time_set_style(self, style):
+        plotutils.set_style(style, show_info=False)
+
+    def time_parse_style(self, style):
+        plotutils._parse_style(style)
+
+    def time_style_context(self, style):
+        with plotutils.style(style):
+            pass
+
+class RenderPlotter(object):
+    params = [[1000, 1000000], ['png', 'svg']]
+    param_names = ['points', 'format']
+    number = 1
+
+    def setup(self, points, format):
+        self.datadir = tempdir()
+        write_xy_files(self.datadir, 'data_', 1, points)
+        self.plotter = Plotter(self.datadir, 'data_')
+        self.plotter.add_data(1)
+        self.outfile = os.path.join(self.datadir, 'figure.' + format)
+
+    def teardown(self, points, format):
+        shutil.rmtree(self.datadir)
+
+    def time_render(self, points, format):
+        render(self.plotter, self.outfile, 'web')
+
+class ImportTime(object):
+    params = ['mvdlib', 'mvdlib.analysis.plot', 'mvdlib.oceanoptics',
+              'mvdlib.plotutils', 'mvdlib.quantum.transitions']
+    param_names = ['module']
+    unit = 'seconds'
+
+    def track_import(self, module):
+        """Best of three imports of module in a fresh interpreter."""
+        code = ("import timeit; "
+                "print(timeit.timeit('import %s', number=1))" % module)
+        env = dict(os.environ, MPLBACKEND='Agg')
+        return min(float(subprocess.check_output([sys.executable, '-c', code],
+                                                 env=env))
+                   for i in range(3))
+
+if __name__ == "__main__":
+    run(Styles)
+    run(RenderPlotter)
+    run(ImportTime)
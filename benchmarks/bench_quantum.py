@@ -0,0 +1,46 @@
+"""Benchmarks for :mod:`mvdlib.quantum`: angular momentum symbols and
+unit conversions of transitions. Run this module from the repository
+root for a quick overview::
+
+    python -m benchmarks.bench_quantum
+
+"""
+
+from __future__ import print_function
+import numpy as np
+from mvdlib.quantum import angular_momentum, transitions
+from benchmarks.common import run
+
+class AngularMomentum(object):
+    def time_lande_g(self):
+        angular_momentum.lande_g(0.5, 1, 1.5)
+
+    def time_cg_coef(self):
+        angular_momentum.cg_coef(1.5, 1, 0.5, 0, 1.5, 0.5)
+
+    def time_wigner_3j(self):
+        angular_momentum.wigner_3j(1.5, 1, 1.5, 0.5, 0, -0.5)
+
+    def time_wigner_6j(self):
+        angular_momentum.wigner_6j(1.5, 1, 0.5, 0.5, 1, 1.5)
+
+class Conversions(object):
+    params = [[1, 10**6], ['nm->THz', 'cm^-1->eV', 'nm->cm^-1']]
+    param_names = ['size', 'conversion']
+
+    def setup(self, size, conversion):
+        self.units = conversion.split('->')
+        self.values = np.linspace(300., 900., size)
+        if size == 1:
+            self.values = self.values[0]
+        self.convert = transitions.Conversion(*self.units)
+
+    def time_convert(self, size, conversion):
+        transitions.convert(self.values, *self.units)
+
+    def time_conversion(self, size, conversion):
+        self.convert(self.values)
+
+if __name__ == "__main__":
+    run(AngularMomentum)
+    run(Conversions)
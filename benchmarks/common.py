@@ -0,0 +1,112 @@
+"""Synthetic data generators and a simple runner shared by the
+benchmarks.
+
+The generators write files in the formats read by mvdlib (numbered
+data files for :class:`~mvdlib.analysis.combine.Combiner` and
+:class:`~mvdlib.analysis.plot.Plotter`, Rabi flopping CSV files, and
+SpectraSuite spectra) into a temporary directory, so benchmarks do
+not depend on lab data.
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import itertools
+import tempfile
+import timeit
+import numpy as np
+from mvdlib import fit_functions
+
+def write_xy_files(directory, prefix, files, points, suffix='dat', zpad=4,
+                   seed=0):
+    """Write files numbered 1 to files, each with points rows of a
+    noisy sine wave (x, y) and a one line header.
+
+    """
+    random = np.random.RandomState(seed)
+    x = np.linspace(0, 10, points)
+    for i in range(1, files + 1):
+        y = np.sin(x) + random.normal(0, 0.1, points)
+        fname = '{pre}{i:0{pad:d}d}.{suf}'.format(pre=prefix, i=i, pad=zpad,
+                                                  suf=suffix)
+        np.savetxt(os.path.join(directory, fname), np.column_stack([x, y]),
+                   header='x y')
+
+def rabi_data(points, seed=0):
+    """Return (t, P, err) of a damped Rabi oscillation in percent."""
+    t = np.linspace(0, 20, points)
+    P = 50*(1 - np.cos(2*t)*np.exp(-t/10))
+    P += np.random.RandomState(seed).normal(0, 2., points)
+    return t, P, np.full(points, 2.)
+
+def write_rabi_file(filename, points, seed=0):
+    """Write a Rabi flopping CSV file as read by
+    :class:`~mvdlib.quantum.rabi.RabiFlop`.
+
+    """
+    np.savetxt(filename, np.column_stack(rabi_data(points, seed)),
+               delimiter=',')
+
+_spectrasuite = """SpectraSuite Data File
+++++++++++++++++++++++++++++++++++++
+Date: Mon Feb 24 14:15:41 CET 2014
+User: mvd
+Spectrometer Serial Number: BENCH0001
+Spectrometer Channel: 0
+Integration Time (usec): 100000 (BENCH0001)
+Spectra Averaged: 1 (BENCH0001)
+Boxcar Smoothing: 0 (BENCH0001)
+Correct for Electrical Dark: No (BENCH0001)
+Correct for Detector Non-linearity: No (BENCH0001)
+Number of Pixels in Processed Spectrum: {pixels}
+>>>>>Begin Processed Spectral Data<<<<<
+{data}
+>>>>>End Processed Spectral Data<<<<<
+"""
+
+def write_spectrum(filename, pixels=3648, center=397., sigma=0.5, seed=0):
+    """Write a SpectraSuite file with a single noisy Gaussian line."""
+    lmbda = np.linspace(350., 450., pixels)
+    response = fit_functions.gaussian(lmbda, 1000., 50., center, sigma)
+    response += np.random.RandomState(seed).normal(0, 5., pixels)
+    data = '\n'.join('%.3f\t%.2f' % row for row in zip(lmbda, response))
+    with open(filename, 'w') as out:
+        out.write(_spectrasuite.format(pixels=pixels, data=data))
+
+def tempdir():
+    """Return a new temporary directory."""
+    return tempfile.mkdtemp(prefix='mvdlib-bench-')
+
+def run(cls, number=None, repeat=3):
+    """Run the ``time_*`` and ``track_*`` methods of an asv benchmark
+    class for every parameter combination and print the results.
+
+    """
+    params = getattr(cls, 'params', None)
+    if params is None:
+        combinations = [()]
+    elif params and isinstance(params[0], list):
+        combinations = list(itertools.product(*params))
+    else:
+        combinations = [(p,) for p in params]
+    names = sorted(n for n in dir(cls)
+                   if n.startswith('time_') or n.startswith('track_'))
+    print(cls.__name__)
+    for args in combinations:
+        bench = cls()
+        if hasattr(bench, 'setup'):
+            bench.setup(*args)
+        label = ', '.join(str(a) for a in args)
+        for name in names:
+            func = getattr(bench, name)
+            if name.startswith('track_'):
+                result = '%.4g' % func(*args)
+            else:
+                n = number or getattr(bench, 'number', 0) or 1
+                best = min(timeit.repeat(lambda: func(*args), number=n,
+                                         repeat=repeat))/n
+                result = '%.4g ms' % (best*1e3)
+            print("  {:<40s} {:<20s} {:>14s}".format(name, label, result))
+        if hasattr(bench, 'teardown'):
+            bench.teardown(*args)
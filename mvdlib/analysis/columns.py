@@ -0,0 +1,53 @@
+"""Column selection for multi-column data files.
+
+Data files from multi-channel detectors have many columns. They are
+read once into a 2-D array (rows x columns), and columns are selected
+by position or by name as views of that array, so extracting many
+channels neither parses nor copies a file again. Column names are
+given explicitly or taken from the file's header line, e.g., as written
+by ``np.savetxt(fname, data, header='t ch1 ch2')``.
+
+"""
+
+from types import StringTypes
+
+def header_names(fname, skiprows=0, delimiter=None):
+    """Return the column names of the data file fname, or None.
+
+    The names are read from the last of the skiprows header lines or,
+    if skiprows is 0, from the first line if it is a comment starting
+    with '#'.
+
+    """
+    line = None
+    with open(fname) as infile:
+        for i, line in enumerate(infile):
+            if i + 1 >= skiprows:
+                break
+    if line is None or (skiprows == 0 and not line.startswith('#')):
+        return None
+    names = line.lstrip('#').strip().split(delimiter)
+    return [name.strip() for name in names] or None
+
+def column_index(column, names=None):
+    """Return the position of column, given by position or by name in
+    the list names.
+
+    """
+    if isinstance(column, StringTypes):
+        if names is None or column not in names:
+            raise KeyError("No column named %r" % column)
+        return list(names).index(column)
+    assert isinstance(column, (int, long))
+    return column
+
+def column_name(column, names=None):
+    """Return a label for column: its name if known, else its
+    position.
+
+    """
+    if isinstance(column, StringTypes):
+        return column
+    if names is not None and -len(names) <= column < len(names):
+        return names[column]
+    return str(column)
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 """Utilities for combining data files to build statistics with nice
 error bars. Outputs data to a text-delimited format for easy use in
-other programs.
+other programs, or to binary formats (numpy, HDF5, Parquet) which
+keep full precision and are fast to load.
 
 TODO:
 
@@ -9,10 +10,28 @@ TODO:
 
 """
 
+import os
 import os.path
+import re
+import errno
+import json
 import numpy as np
+try:
+    import h5py
+except ImportError:
+    h5py = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 import matplotlib.pyplot as plt
 from types import NoneType, StringTypes
+from .. import profiling
+from . import resample
+from .index import DatasetIndex
+from .columns import header_names, column_index
+from ..plotutils.errorbar import fast_errorbar
 
 class CombinationError(Exception):
     pass
@@ -39,6 +58,10 @@ class Combiner(object):
             Data file text delimiter. Default: None
         skiprows : int
             Skip the first skiprows rows. Default: 0
+        columns : list or None
+            Names of the data file columns, for selecting columns by
+            name in :meth:`combine`. Default: read from the header
+            line of the first file when needed
 
         """
         # Get and check arguments
@@ -56,71 +79,237 @@ class Combiner(object):
         assert isinstance(self.delimiter, (str, unicode, NoneType))
         self.skiprows = kwargs.get('skiprows', 0)
         assert isinstance(self.skiprows, int)
+        self.columns = kwargs.get('columns', None)
+        assert isinstance(self.columns, (list, tuple, NoneType))
 
         # Set data to None
         self.xdata = None
         self.ydata = None
         self.yerr = None
+        self.ystack = None
+        self.ymask = None
+        self.method = None
+        self._params = {}
 
-    def combine(self, indeces, plot=False):
+        # Loaded data files and the (name, size, mtime) of each file
+        self.data = None
+        self._loaded = None
+
+        # Index of the data directory, scanned on first use; call
+        # self.index.refresh() to pick up new files
+        self.index = DatasetIndex(self.datadir, self.prefix, self.suffix)
+
+    @profiling.timed('Combiner.combine')
+    def combine(self, indeces, plot=False, **kwargs):
         """Combine data files by averaging.
 
+        Each file is read once and kept in :attr:`data`, so combining
+        further columns of the same files does not read them again
+        unless they changed.
+
         Parameters
         ----------
-        indeces : list
-            List of indeces to use for data file names.
+        indeces : list, str, or None
+            List of indeces to use for data file names, a glob pattern
+            matching the file names, or None to combine all files in
+            the data directory.
         plot : bool
             Plot the data (for testing mostly).
 
+        Keyword arguments
+        -----------------
+        skip_missing : bool
+            Leave out indeces without a data file instead of failing.
+            Default: False
+        x : int or str
+            Column of the independent variable, by position or name.
+            Default: 0
+        y : int or str
+            Column to combine. Default: 1
+        err : int or str
+            Column of the errors of y for the 'weighted' method.
+            Default: 2
+        skip_changed : bool
+            Leave out files modified since the data directory was
+            indexed (see :class:`~mvdlib.analysis.index.DatasetIndex`).
+            Default: False
+        method : str
+            How to combine the files at each point:
+
+            * 'mean': plain average; the error is the standard
+              deviation of the files
+            * 'weighted': inverse-variance weighted average using the
+              err column of each file as its error; the error is
+              that of the weighted mean. Points with a non-positive
+              or non-finite error are ignored.
+            * 'clip': sigma-clipped average; points further than sigma
+              standard deviations from the mean are rejected
+              iteratively (see :attr:`ymask`). The error is the
+              standard deviation of the remaining files.
+            * 'median': median; the error is the median absolute
+              deviation scaled to a standard deviation (1.4826 MAD)
+
+            Default: 'mean'
+        sigma : float
+            Clipping threshold in standard deviations. Default: 3
+        iterations : int
+            Maximum number of clipping iterations. Default: 5
+
         Returns
         -------
         xdata : np.ndarray
             Array containing the independent variables.
         ydata : np.ndarry
-            Array containing the averaged dependent variables.
+            Array containing the combined dependent variables.
         yerr : np.ndarray
-            Array containing the standard deviation of the dependent
-            variables.
+            Array containing the error of the dependent variables.
 
         """
-        # Load and combine data
-        xdata, ydata = [], []
-        self.indeces = indeces
-        for i in indeces:
-            fname = '{pre}{num:0{width}d}.{suf}'.format(
-                pre=self.prefix, num=i,
-                width=self.zpad, suf=self.suffix
-            )
-            fname = os.path.join(self.datadir, fname)
-            x, y = np.loadtxt(
-                fname, skiprows=self.skiprows,
-                delimiter=self.delimiter, unpack=True
-            )
-            if len(xdata) != 0:
-                if not np.in1d(xdata[0], x).all():
-                    raise CombinationError("x data must all be identical")
-            xdata.append(x)
-            ydata.append(y)
-
-        # Find the standard deviation and average
-        xdata = np.array(xdata)
-        ydata = np.array(ydata)
-        self.yerr = [np.std(ydata[:,i]) for i in range(ydata.shape[1])]
+        method = kwargs.get('method', 'mean')
+        if method not in _methods:
+            raise ValueError("method must be one of " + str(sorted(_methods)))
+        sigma = kwargs.get('sigma', 3.)
+        assert sigma > 0
+        iterations = kwargs.get('iterations', 5)
+        assert isinstance(iterations, int)
+
+        files = self.index.paths(
+            indeces, self.zpad,
+            skip_missing=kwargs.get('skip_missing', False),
+            skip_changed=kwargs.get('skip_changed', False)
+        )
+        if len(files) == 0:
+            raise CombinationError("No data files selected")
+        self.indeces = [i for i, fname in files]
+        self._load([fname for i, fname in files])
+        xdata = self.column(kwargs.get('x', 0))
+        for x in xdata[1:]:
+            if not np.in1d(xdata[0], x).all():
+                raise CombinationError("x data must all be identical")
+        ydata = self.column(kwargs.get('y', 1))
+        if method == 'weighted':
+            try:
+                errors = self.column(kwargs.get('err', 2))
+            except IndexError:
+                raise CombinationError("No error column for weighting")
+
+        # Combine the stacked data along the file axis
+        self.ystack = ydata
+        self.ymask = None
+        self._params = {}
         self.xdata = xdata[0]
-        ydata = [np.sum(ydata[:,i]) for i in range(ydata.shape[1])]
-        self.ydata = np.array(ydata)/len(indeces)
+        if method == 'weighted':
+            self.ydata, self.yerr = _combine_weighted(ydata, errors)
+            self._params = {'errors': errors}
+        elif method == 'clip':
+            self.ydata, self.yerr, self.ymask = _combine_clipped(
+                ydata, sigma, iterations)
+            self._params = {'sigma': sigma, 'iterations': iterations}
+        else:
+            self.ydata, self.yerr = _methods[method](ydata)
+        self.method = method
 
         # Plot if requested and return
         if plot:
-            plt.errorbar(self.xdata, self.ydata, self.yerr)
+            fast_errorbar(plt.gca(), self.xdata, self.ydata, self.yerr)
             plt.show()
         return self.xdata, self.ydata, self.yerr
 
+    def _load(self, fnames):
+        """Read the data files fnames into :attr:`data`, unless they
+        are the files last read and have not changed since.
+
+        """
+        try:
+            stats = [os.stat(fname) for fname in fnames]
+        except OSError as e:
+            raise IOError(e.errno, e.strerror, e.filename)
+        loaded = [(fname, st.st_size, st.st_mtime)
+                  for fname, st in zip(fnames, stats)]
+        if loaded == self._loaded:
+            return
+        self.data, self._loaded = None, None
+        data = []
+        for fname, st in zip(fnames, stats):
+            profiling.add_bytes('Combiner.combine', st.st_size)
+            data.append(np.loadtxt(
+                fname, skiprows=self.skiprows,
+                delimiter=self.delimiter, ndmin=2
+            ))
+            if data[-1].shape != data[0].shape:
+                raise CombinationError("Data files must all have the same "
+                                       "number of rows and columns")
+        self.data = np.array(data)
+        self._loaded = loaded
+        if self.columns is None:
+            self.columns = header_names(fnames[0], self.skiprows,
+                                        self.delimiter)
+
+    def column(self, column):
+        """Return one column of all data files last combined, by
+        position or name, as an array of shape (files x rows). This is
+        a view of :attr:`data`, not a copy.
+
+        """
+        if self.data is None:
+            raise CombinationError("You must combine data first!")
+        j = column_index(column, self.columns)
+        if not -self.data.shape[2] <= j < self.data.shape[2]:
+            raise IndexError("Data files have no column %d" % j)
+        return self.data[:,:,j]
+
+    def _statistic(self):
+        """Return the data to resample and the statistic reproducing
+        :attr:`ydata` with the method and parameters of the last
+        :meth:`combine`. For the 'weighted' method the errors are
+        resampled along with the data, side by side in one array.
+
+        """
+        if self.ystack is None:
+            raise CombinationError("You must combine data first!")
+        method, params = self.method, self._params
+        if method == 'mean':
+            return self.ystack, None
+        if method == 'weighted':
+            n = self.ystack.shape[1]
+            stack = np.concatenate([self.ystack, params['errors']], axis=1)
+            return stack, lambda d: _combine_weighted(d[...,:n], d[...,n:])[0]
+        if method == 'clip':
+            return self.ystack, lambda d: _combine_clipped(
+                d, params['sigma'], params['iterations'])[0]
+        return self.ystack, lambda d: _methods[method](d)[0]
+
+    def bootstrap(self, **kwargs):
+        """Bootstrap estimate of the error of the combined data, using
+        the combining method of the last :meth:`combine`. See
+        :func:`mvdlib.analysis.resample.bootstrap` for keyword
+        arguments; :func:`mvdlib.analysis.resample.bootstrap_fit`
+        gives errors of fit parameters of the plain mean.
+
+        """
+        stack, statistic = self._statistic()
+        return resample.bootstrap(stack, statistic, **kwargs)
+
+    def jackknife(self, **kwargs):
+        """Jackknife estimate of the error of the combined data, using
+        the combining method of the last :meth:`combine`. See
+        :func:`mvdlib.analysis.resample.jackknife` for keyword
+        arguments.
+
+        """
+        stack, statistic = self._statistic()
+        return resample.jackknife(stack, statistic, **kwargs)
+
     def write(self, location='.', readme='', header='', **kwargs):
         """Write the combined data to a file. Additionally, write a
         README file which contains information on where the raw data
         came from and anything else the user desires.
 
+        The output file is named ``<prefix>_combined_<n>.<ext>`` with n
+        one larger than that of any existing output file of any format.
+        The number is reserved atomically by creating the README file,
+        so concurrent writers never overwrite each other's results.
+
         Parameters
         ----------
         location : str
@@ -129,55 +318,242 @@ class Combiner(object):
             Additional text to write to the README file. Default: ''
         header : list or None
             Length 3 list of strings to label the resulting data
-            columns. Default: ''
+            columns. Default: 'x', 'y', 'yerr'
+
+        Keyword arguments
+        -----------------
+        format : str
+            Output format, one of
+
+            * 'csv': comma separated text
+            * 'npy': numpy structured array with one field per column,
+              which can be memory mapped with
+              ``np.load(filename, mmap_mode='r')``
+            * 'npz': one numpy array per column
+            * 'hdf5': one dataset per column (requires h5py)
+            * 'parquet': Apache Parquet table (requires pyarrow)
+
+            For all binary formats the README information is also
+            stored as JSON: the 'metadata' array (npz) or attribute
+            (hdf5), the 'mvdlib' key of the Parquet schema metadata,
+            or, since .npy files cannot hold it, the sidecar file
+            ``<prefix>_combined_<n>.json`` (npy). Default: 'csv'
+        fmt : str
+            Number format for CSV output. Default: '%f'
+
+        Returns
+        -------
+        outfile : str
+            The name of the data file written.
 
         """
         # Verify data exists
         if self.xdata is None:
             raise CombinationError("You must combine data first!")
-        
+        format = kwargs.get('format', 'csv')
+        if format not in _writers:
+            raise ValueError("format must be one of " + str(sorted(_writers)))
+
         # Determine output file name
         assert isinstance(location, StringTypes)
         if location == '.':
             location = os.path.abspath(os.path.curdir)
-        basename = '{pre}_combined_{i:0{zpad}d}.csv'
-        i = 1
-        while True:
-            outfile = os.path.join(
-                location, basename.format(
-                    pre=self.prefix, zpad=self.zpad, i=i
-                )
-            )
-            if not os.path.exists(outfile):
-                break
-            i += 1
-
-        # Generate header
-        header = '{},{},{}'.format(header[0], header[1], header[2])
+        outfile = allocate_filename(location, self.prefix + '_combined_',
+                                    _extensions[format], self.zpad,
+                                    lock='README.txt')
+        stem = os.path.splitext(outfile)[0]
 
         # Write data
-        np.savetxt(
-            outfile,
-            np.transpose([self.xdata, self.ydata, self.yerr]),
-            delimiter=',',
-            header=header,
-            fmt=kwargs.get('fmt', '%f')
-        )        
-        
+        columns = [str(name) for name in (header or ['x', 'y', 'yerr'])]
+        assert len(columns) == 3
+        data = [np.asarray(column, dtype=float)
+                for column in (self.xdata, self.ydata, self.yerr)]
+        metadata = {
+            'datadir': self.datadir,
+            'prefix': self.prefix,
+            'indices': [int(i) for i in self.indeces],
+            'method': self.method,
+            'readme': readme,
+        }
+        try:
+            _writers[format](outfile, columns, data, metadata, **kwargs)
+        except Exception:
+            for fname in (outfile, stem + '.json', stem + '.README.txt'):
+                if os.path.exists(fname):
+                    os.remove(fname)
+            raise
+
         # README output
-        readme_fname = os.path.join(
-            location, outfile[:-4] + '.README.txt'
-        )
+        readme_fname = stem + '.README.txt'
         readme = (
             'Data directory: {}\n'.format(self.datadir),
             'Data prefix: {}\n'.format(self.prefix),
             'Data indeces {}\n'.format(str(self.indeces)),
+            'Combined by: {}\n'.format(self.method),
             '\n', readme
         )
         with open(readme_fname, 'w') as out:
             out.writelines(readme)
         return outfile
 
+def _create_exclusive(fname):
+    """Create the empty file fname. Return False if it exists."""
+    try:
+        fd = os.open(fname, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        return False
+    os.close(fd)
+    return True
+
+def allocate_filename(location, stem, extension, zpad=4, lock=None):
+    """Create and return a new, empty file named
+    ``<stem><n>.<extension>`` in location, with n one larger than the
+    largest number of existing files ``<stem><n>.*`` of any extension
+    (or 1), so that files sharing a number belong together. Creation
+    uses O_EXCL, so concurrent callers always get distinct files.
+
+    If lock is given, ``<stem><n>.<lock>`` is created first. Callers
+    using the same lock extension then get distinct numbers whatever
+    their extension.
+
+    """
+    pattern = re.compile(re.escape(stem) + r'(\d+)\.')
+    used = [int(match.group(1))
+            for match in map(pattern.match, os.listdir(location)) if match]
+    i = max(used) + 1 if used else 1
+    while True:
+        fname = os.path.join(location, '{stem}{i:0{zpad}d}.'.format(
+            stem=stem, i=i, zpad=zpad))
+        i += 1
+        if lock is not None and not _create_exclusive(fname + lock):
+            continue
+        if _create_exclusive(fname + extension):
+            return fname + extension
+        if lock is not None:
+            os.remove(fname + lock)
+
+# Combining methods
+# -----------------
+#
+# Each reduces the data stack (files x points) along the file axis -2
+# and returns the combined values and their errors. Leading axes are
+# kept, so the same functions combine many resamples at once (see
+# Combiner.bootstrap).
+
+def _combine_mean(stack):
+    return stack.mean(axis=-2), stack.std(axis=-2)
+
+def _combine_weighted(stack, errors):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = 1/errors**2
+        weights[~np.isfinite(weights) | (errors <= 0)] = 0
+        total = weights.sum(axis=-2)
+        value = (weights*np.where(weights > 0, stack, 0)).sum(axis=-2)/total
+        return value, 1/np.sqrt(total)
+
+def _combine_clipped(stack, sigma=3., iterations=5):
+    """Sigma-clipped mean and standard deviation. Also returns the
+    mask of rejected points.
+
+    Points are clipped around the median. The first pass estimates
+    the spread from the median absolute deviation, so that outliers do
+    not inflate the spread they are tested against (with the standard
+    deviation, a single outlier among N points is never more than
+    sqrt(N - 1) sigma from the mean). Later passes use the standard
+    deviation of the remaining points, as the MAD of a clipped small
+    sample shrinks with every pass.
+
+    """
+    data = np.ma.masked_invalid(stack)
+    mask = np.ma.getmaskarray(data)
+    for i in range(iterations):
+        center = np.ma.expand_dims(np.ma.median(data, axis=-2), -2)
+        if i == 0:
+            spread = 1.482602218505602*np.ma.expand_dims(
+                np.ma.median(abs(data - center), axis=-2), -2)
+        else:
+            spread = np.ma.expand_dims(data.std(axis=-2), -2)
+        outliers = abs(data - center) > sigma*spread
+        new = mask | np.ma.filled(outliers, True)
+        if (new == mask).all():
+            break
+        mask = new
+        data = np.ma.array(stack, mask=mask)
+    return (np.ma.filled(data.mean(axis=-2), np.nan),
+            np.ma.filled(data.std(axis=-2), np.nan), mask)
+
+def _combine_median(stack):
+    with np.errstate(invalid='ignore'):
+        median = np.nanmedian(stack, axis=-2)
+        mad = np.nanmedian(abs(stack - np.expand_dims(median, -2)), axis=-2)
+    return median, 1.482602218505602*mad
+
+_methods = {
+    'mean': _combine_mean,
+    'weighted': _combine_weighted,
+    'clip': _combine_clipped,
+    'median': _combine_median,
+}
+
+# Output backends
+# ---------------
+
+def _write_csv(outfile, columns, data, metadata, **kwargs):
+    np.savetxt(
+        outfile,
+        np.transpose(data),
+        delimiter=',',
+        header=','.join(columns),
+        fmt=kwargs.get('fmt', '%f')
+    )
+
+def _write_npy(outfile, columns, data, metadata, **kwargs):
+    table = np.empty(len(data[0]), dtype=[(name, float) for name in columns])
+    for name, column in zip(columns, data):
+        table[name] = column
+    np.save(outfile, table)
+    # The .npy header cannot hold extra keys, so use a sidecar file
+    with open(os.path.splitext(outfile)[0] + '.json', 'w') as out:
+        json.dump(metadata, out, indent=2, sort_keys=True)
+
+def _write_npz(outfile, columns, data, metadata, **kwargs):
+    arrays = dict(zip(columns, data))
+    arrays['metadata'] = np.array(json.dumps(metadata))
+    np.savez(outfile, **arrays)
+
+def _write_hdf5(outfile, columns, data, metadata, **kwargs):
+    if h5py is None:
+        raise ImportError("HDF5 output requires h5py.")
+    with h5py.File(outfile, 'w') as out:
+        for name, column in zip(columns, data):
+            out.create_dataset(name, data=column)
+        out.attrs['metadata'] = json.dumps(metadata)
+
+def _write_parquet(outfile, columns, data, metadata, **kwargs):
+    if pyarrow is None:
+        raise ImportError("Parquet output requires pyarrow.")
+    table = pyarrow.Table.from_arrays([pyarrow.array(column)
+                                       for column in data], columns)
+    table = table.replace_schema_metadata({'mvdlib': json.dumps(metadata)})
+    pyarrow.parquet.write_table(table, outfile)
+
+_writers = {
+    'csv': _write_csv,
+    'npy': _write_npy,
+    'npz': _write_npz,
+    'hdf5': _write_hdf5,
+    'parquet': _write_parquet,
+}
+_extensions = {
+    'csv': 'csv',
+    'npy': 'npy',
+    'npz': 'npz',
+    'hdf5': 'h5',
+    'parquet': 'parquet',
+}
+
 if __name__ == "__main__":
     data = Combiner('/home/mvd/tmp/20140918', 'rabi_', skiprows=1)
     #data.write('/tmp')
@@ -0,0 +1,100 @@
+"""Decimation of long traces for plotting.
+
+A trace with millions of points drawn into a figure a few hundred
+pixels wide is mostly wasted work: only the minimum and maximum of
+the samples falling into each horizontal pixel are visible. The
+min/max envelope computed here keeps exactly those, so the plot looks
+the same while the number of points is at most twice the number of
+bins.
+
+"""
+
+import weakref
+import numpy as np
+
+def minmax_envelope(x, y, bins):
+    """Reduce a trace to the minimum and maximum of each of bins
+    equally sized groups of consecutive samples.
+
+    The x values are assumed to be sorted (as for time traces). Within
+    each bin the two points are kept in their original order, so the
+    result can be plotted as a line.
+
+    Parameters
+    ----------
+    x : array-like
+        Independent variable.
+    y : array-like
+        Dependent variable.
+    bins : int
+        Number of bins, e.g., the width of the axes in pixels.
+
+    Returns
+    -------
+    x : np.ndarray
+        Decimated independent variable.
+    y : np.ndarray
+        Decimated dependent variable.
+
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    bins = int(bins)
+    if bins < 1:
+        raise ValueError("bins must be positive.")
+    if n <= 2*bins:
+        return x, y
+    size = -(-n//bins)
+    full = n//size
+    blocks = y[:full*size].reshape(full, size)
+    start = np.arange(full)*size
+    idx = np.column_stack([start + blocks.argmin(axis=1),
+                           start + blocks.argmax(axis=1)])
+    if full*size < n:
+        tail = y[full*size:]
+        idx = np.vstack([idx, [full*size + tail.argmin(),
+                               full*size + tail.argmax()]])
+    idx.sort(axis=1)
+    idx = idx.ravel()
+    return x[idx], y[idx]
+
+class DecimationCache(object):
+    """Cache of decimated traces keyed on the trace arrays and the
+    number of bins, so redrawing at the same resolution is free.
+
+    Traces are identified by their array objects (held only by weak
+    references), so replacing a trace by new arrays decimates it
+    again, and entries are dropped once the arrays are garbage
+    collected. Call :meth:`clear` after modifying arrays in place.
+
+    """
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, x, y, bins):
+        """Return the envelope of the trace given by the arrays x and
+        y.
+
+        """
+        key = (id(x), id(y), bins)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0]() is x and entry[1]() is y:
+            return entry[2]
+        result = minmax_envelope(x, y, bins)
+        forget = lambda ref: self._cache.pop(key, None)
+        self._cache[key] = (weakref.ref(x, forget), weakref.ref(y, forget),
+                            result)
+        return result
+
+    def clear(self):
+        """Forget all cached traces."""
+        self._cache.clear()
+
+    def __getstate__(self):
+        # Weak references cannot be pickled, and the arrays they refer
+        # to are not the ones of the unpickled trace anyway
+        return {}
+
+    def __setstate__(self, state):
+        self._cache = {}
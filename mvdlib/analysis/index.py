@@ -0,0 +1,220 @@
+"""Indexing of numbered data files.
+
+:class:`~mvdlib.analysis.combine.Combiner` and
+:class:`~mvdlib.analysis.plot.Plotter` read files named like
+``rabi_0001.dat``. A :class:`DatasetIndex` lists the data directory
+once, parses the index of every matching file name, and keeps its size
+and modification time, so that files can be selected by index range or
+glob pattern and missing files skipped without touching the file
+system again. Example::
+
+    index = DatasetIndex('/data/20140918', 'rabi_', 'dat')
+    files = index.select(start=6, stop=10)     # indices 6 to 10
+    files = index.select('rabi_001*.dat')      # by glob pattern
+    files = index.select([1, 2, 5], skip_missing=True)
+    index.refresh()                            # rescan when needed
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import re
+import stat
+import errno
+import fnmatch
+from collections import namedtuple
+from types import StringTypes
+from .. import profiling
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+class FileInfo(namedtuple('FileInfo', ['index', 'name', 'path', 'size',
+                                       'mtime'])):
+    """
+    A data file found by :class:`DatasetIndex`.
+
+    index : the index parsed from the file name
+    name : file name
+    path : full path
+    size : size in bytes at the time of the scan
+    mtime : modification time at the time of the scan
+
+    """
+    __slots__ = ()
+
+    def changed(self):
+        """Return True if the file was modified or removed since it was
+        indexed.
+
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return True
+        return st.st_size != self.size or st.st_mtime != self.mtime
+
+def _listdir(datadir):
+    """Yield (name, stat) of the regular files in datadir."""
+    if scandir is not None:
+        for entry in scandir(datadir):
+            if entry.is_file():
+                yield entry.name, entry.stat()
+    else:
+        for name in os.listdir(datadir):
+            try:
+                st = os.stat(os.path.join(datadir, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield name, st
+
+class DatasetIndex(object):
+    def __init__(self, datadir, prefix, suffix='dat', pattern=None):
+        """Index the data files in a directory.
+
+        Parameters
+        ----------
+        datadir : str
+            Directory containing the data files.
+        prefix : str
+            String prefixing data files.
+        suffix : str, optional
+            Data file filename extension. Default: 'dat'
+        pattern : str or None, optional
+            Regular expression matching the full file name, whose first
+            group (or group named 'index') is the index. Default:
+            prefix, digits, '.', suffix
+
+        """
+        assert isinstance(datadir, StringTypes)
+        self.datadir = datadir
+        assert isinstance(prefix, StringTypes)
+        self.prefix = prefix
+        assert isinstance(suffix, StringTypes)
+        self.suffix = suffix
+        if pattern is None:
+            pattern = (re.escape(prefix) + r'(?P<index>\d+)\.'
+                       + re.escape(suffix) + '$')
+        self.pattern = re.compile(pattern)
+        self._files = None
+
+    @profiling.timed('DatasetIndex.scan')
+    def refresh(self):
+        """List the data directory again."""
+        files = {}
+        group = 'index' if 'index' in self.pattern.groupindex else 1
+        for name, st in _listdir(self.datadir):
+            match = self.pattern.match(name)
+            if match is None:
+                continue
+            i = int(match.group(group))
+            if i in files:
+                raise ValueError("Files %s and %s have the same index."
+                                 % (files[i].name, name))
+            files[i] = FileInfo(i, name, os.path.join(self.datadir, name),
+                                st.st_size, st.st_mtime)
+        self._files = files
+
+    @property
+    def files(self):
+        """Dict of :class:`FileInfo` by index, scanning the directory on
+        first use.
+
+        """
+        if self._files is None:
+            self.refresh()
+        return self._files
+
+    @property
+    def indices(self):
+        """Sorted list of all indices found."""
+        return sorted(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, index):
+        return index in self.files
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __getitem__(self, index):
+        return self.files[index]
+
+    def select(self, selection=None, start=None, stop=None, **kwargs):
+        """
+        Select data files.
+
+        Parameters
+        ----------
+        selection : list, str, or None, optional
+            Indices of the files, a glob pattern matched against the
+            file names, or None for all files.
+        start, stop : int or None, optional
+            Only select files with start <= index <= stop.
+
+        Keyword arguments
+        -----------------
+        skip_missing : bool
+            Leave out requested indices without a file instead of
+            raising IOError. Default: False
+        skip_changed : bool
+            Leave out files modified or removed since the directory was
+            scanned. This checks only the selected files. Default:
+            False
+
+        Returns
+        -------
+        list
+            :class:`FileInfo` of the selected files, in the order of
+            selection or sorted by index.
+
+        """
+        skip_missing = kwargs.get('skip_missing', False)
+        skip_changed = kwargs.get('skip_changed', False)
+        files = self.files
+        if selection is None or isinstance(selection, StringTypes):
+            selected = [files[i] for i in sorted(files)]
+            if selection is not None:
+                selected = [f for f in selected
+                            if fnmatch.fnmatch(f.name, selection)]
+        else:
+            selected = []
+            for i in selection:
+                if i in files:
+                    selected.append(files[i])
+                elif not skip_missing:
+                    raise IOError(errno.ENOENT, "No data file with index %d "
+                                  "in %s" % (i, self.datadir))
+        if start is not None:
+            selected = [f for f in selected if f.index >= start]
+        if stop is not None:
+            selected = [f for f in selected if f.index <= stop]
+        if skip_changed:
+            selected = [f for f in selected if not f.changed()]
+        return selected
+
+    def paths(self, selection, zpad=4, **kwargs):
+        """Return a list of (index, path) of data files as used by
+        :class:`~mvdlib.analysis.combine.Combiner` and
+        :class:`~mvdlib.analysis.plot.Plotter`. A list of indices is
+        formatted as prefix + zero padded index + suffix without
+        scanning the directory, unless files are to be skipped;
+        otherwise arguments are as for :meth:`select`.
+
+        """
+        if (selection is None or isinstance(selection, StringTypes)
+                or kwargs.get('skip_missing') or kwargs.get('skip_changed')):
+            return [(f.index, f.path)
+                    for f in self.select(selection, **kwargs)]
+        return [(i, os.path.join(self.datadir, '{pre}{i:0{pad:d}d}.{suf}'
+                                 .format(pre=self.prefix, i=i, pad=zpad,
+                                         suf=self.suffix)))
+                for i in selection]
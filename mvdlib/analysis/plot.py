@@ -1,13 +1,17 @@
 """Plotting of arbitrary (text-based) data files."""
 
 import os.path
-from types import StringTypes
+from types import StringTypes, NoneType
 import itertools
 import numpy as np
 import matplotlib.pyplot as plt
-from .. import plot_settings
+from .. import plotutils
+from .. import profiling
+from .decimate import DecimationCache
+from .index import DatasetIndex
+from .columns import header_names, column_index, column_name
 
-_markers = itertools.cycle(('o', 's', 'D', '+', '^', 'v', '<', '>', '*'))
+_markers = ('o', 's', 'D', '+', '^', 'v', '<', '>', '*')
 
 class Plotter(object):
     def __init__(self, datadir, prefix, suffix='dat', **kwargs):
@@ -25,9 +29,10 @@ class Plotter(object):
 
         Keyword arguments
         -----------------
-        columns : int
-            Number of columns in the data file. This does nothing
-            now. Default: 2
+        columns : list or None
+            Names of the data file columns, for selecting columns by
+            name in :meth:`add_data`. Default: read from the header
+            line of each file when needed
         labels : list
             A list of axis labels. In the future, this could be
             modified to allow for more than 2 axes.
@@ -44,8 +49,11 @@ class Plotter(object):
         self.prefix = prefix
         assert isinstance(suffix, StringTypes)
         self.suffix = suffix
-        self.columns = kwargs.get('columns', 2)
-        assert self.columns is 2 # TODO: allow this to be changed
+        self.columns = kwargs.get('columns', None)
+        if isinstance(self.columns, int):
+            # Formerly the number of columns, which is not needed
+            self.columns = None
+        assert isinstance(self.columns, (list, tuple, NoneType))
         self.labels = kwargs.get('labels', ['', ''])
         assert isinstance(self.labels, (list, tuple))
         assert len(self.labels) is 2 # TODO: allow this to be changed
@@ -56,14 +64,21 @@ class Plotter(object):
         self.x = []
         self.y = []
         self.legend = []
+        self._decimated = DecimationCache()
+        self.index = DatasetIndex(datadir, prefix, suffix)
 
+    @profiling.timed('Plotter.add_data')
     def add_data(self, index, **kwargs):
         """Add data files to the Plotter.
 
         Parameters
         ----------
-        index : int or list
-            Add a single data file or multiple data files.
+        index : int, list, or str
+            Add a single data file, multiple data files, or all data
+            files whose names match a glob pattern. The data directory
+            is only scanned once (see
+            :class:`~mvdlib.analysis.index.DatasetIndex`); call
+            ``self.index.refresh()`` to pick up new files.
 
         Keyword arguments
         -----------------
@@ -71,40 +86,65 @@ class Plotter(object):
             Text delimiter for data file. Default: None
         skiprows : int
             Number of rows in the data file to skip. Default: 1
-        legend : str
-            A legend label to give the data. If None, uses the
-            filename. Default: None
+        x : int or str
+            Column of the independent variable, by position or name.
+            Default: 0
+        y : int, str, or list
+            Column or list of columns to plot against x. Default: 1
+        legend : str or list
+            A legend label to give the data, or one per file. If None,
+            uses the filename. With several y columns, the column name
+            is appended. Default: None
+        skip_missing : bool
+            Leave out indices without a data file instead of failing.
+            Default: False
+        skip_changed : bool
+            Leave out files modified since the data directory was
+            indexed. Default: False
 
         """
-        # Read data
-        # TODO: allow i to actually be a list
-        fname = '{pre}{i:0{pad:d}d}.{suf}'.format(
-            pre=self.prefix, i=index, pad=self.zpad, suf=self.suffix
+        if isinstance(index, (int, long)):
+            index = [index]
+        files = self.index.paths(
+            index, self.zpad,
+            skip_missing=kwargs.get('skip_missing', False),
+            skip_changed=kwargs.get('skip_changed', False)
         )
+        legends = kwargs.get('legend', None)
+        if legends is None or isinstance(legends, StringTypes):
+            legends = [legends]*len(files)
+        assert len(legends) == len(files)
         delimiter = kwargs.get('delimiter', None)
         skiprows = kwargs.get('skiprows', 1)
-        data = np.loadtxt(
-            os.path.join(self.datadir, fname),
-            delimiter=delimiter,
-            skiprows=skiprows
-        )
-        x, y = data[:,0], data[:,1]
-
-        # Add to list
-        self.x.append(x)
-        self.y.append(y)
-        legend = kwargs.get('legend', None)
-        if legend is None:
-            legend = fname
-        self.legend.append(legend)
-
-    def plot(self, style='web', **kwargs):
-        """Plot the loaded data.
-
-        Parameters
-        ----------
-        style : str
-            The plot style to use.
+        xcolumn = kwargs.get('x', 0)
+        ycolumns = kwargs.get('y', 1)
+        if not isinstance(ycolumns, (list, tuple)):
+            ycolumns = [ycolumns]
+
+        # Read each file once and add views of its columns to the lists
+        for (i, path), legend in zip(files, legends):
+            profiling.add_bytes('Plotter.add_data', path)
+            data = np.loadtxt(path, delimiter=delimiter, skiprows=skiprows,
+                              ndmin=2)
+            names = self.columns
+            if names is None and any(isinstance(c, StringTypes)
+                                     for c in [xcolumn] + ycolumns):
+                names = header_names(path, skiprows, delimiter)
+            x = data[:,column_index(xcolumn, names)]
+            if legend is None:
+                legend = os.path.basename(path)
+            for column in ycolumns:
+                self.x.append(x)
+                self.y.append(data[:,column_index(column, names)])
+                if len(ycolumns) > 1:
+                    self.legend.append(
+                        legend + ' ' + column_name(column, names))
+                else:
+                    self.legend.append(legend)
+
+    def draw(self, ax, **kwargs):
+        """Draw the loaded data onto the matplotlib Axes ax using only
+        the object-oriented API, so no global pyplot state is used.
 
         Keyword arguments
         -----------------
@@ -116,15 +156,19 @@ class Plotter(object):
             Matplotlib linestyle specification. Default: '-'
         linewidth : float
             Line width. Default: 1.5
+        decimate : bool or int
+            Reduce each trace to a min/max envelope before plotting
+            (see :func:`mvdlib.analysis.decimate.minmax_envelope`).
+            If True, use one bin per horizontal pixel of the figure;
+            an int gives the number of bins. Traces shorter than two
+            points per bin are plotted unchanged. Default: True
 
         """
         # Check that there's actually something to plot
         if len(self.x) == 0:
             raise ValueError("You must load data first!")
-            
+
         # Check arguments
-        assert isinstance(style, StringTypes)
-        assert style in plot_settings.styles
         xlabel = kwargs.get('xlabel', '')
         assert isinstance(xlabel, StringTypes)
         ylabel = kwargs.get('ylabel', '')
@@ -133,25 +177,69 @@ class Plotter(object):
         assert isinstance(linestyle, StringTypes)
         linewidth = kwargs.get('linewidth', 1.5)
         assert isinstance(linewidth, (int, float))
+        decimate = kwargs.get('decimate', True)
+        assert isinstance(decimate, (bool, int))
 
         # Plotting
-        plot_settings.load_settings(style)
-        plt.figure()
-        plt.hold(True)
+        fig = ax.get_figure()
+        if decimate is True:
+            bins = int(fig.get_figwidth()*fig.get_dpi())
+        else:
+            bins = int(decimate)
+        markers = itertools.cycle(_markers)
         for i in range(len(self.x)):
-            plt.plot(
-                self.x[i], self.y[i],
+            x, y = self.x[i], self.y[i]
+            if bins:
+                x, y = self._decimated.get(x, y, bins)
+            ax.plot(
+                x, y,
                 label=self.legend[i],
-                marker=_markers.next(),
+                marker=next(markers),
                 linestyle=linestyle,
                 linewidth=linewidth
             )
-        plt.legend()
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        plt.hold(False)
-        plt.savefig(
-            os.path.join(self.datadir, 'last.svg'), bbox_inches='tight'
-        )
-        plt.show()
-        
\ No newline at end of file
+        ax.legend()
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+
+    @profiling.timed('Plotter.plot')
+    def plot(self, style='web', **kwargs):
+        """Plot the loaded data.
+
+        Parameters
+        ----------
+        style : str
+            The plot style to use. It is only applied to this figure
+            (see :func:`mvdlib.plotutils.style`).
+
+        Keyword arguments
+        -----------------
+        outfile : str or None
+            File to save the figure to. Default: 'last.svg' in the
+            data directory
+        show : bool
+            Show the plot upon completion. Otherwise the figure is
+            closed after saving. Default: True
+
+        Other keyword arguments are passed to :meth:`draw`. To render
+        many figures, see :func:`mvdlib.plotutils.batch.render_batch`.
+
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+
+        """
+        assert isinstance(style, StringTypes)
+        assert style in plotutils.styles
+        outfile = kwargs.pop('outfile', os.path.join(self.datadir, 'last.svg'))
+        show = kwargs.pop('show', True)
+        with plotutils.style(style, show_info=True):
+            fig = plt.figure()
+            self.draw(fig.gca(), **kwargs)
+            if outfile is not None:
+                fig.savefig(outfile, bbox_inches='tight')
+            if show:
+                plt.show()
+            else:
+                plt.close(fig)
+        return fig
@@ -0,0 +1,274 @@
+"""Bootstrap and jackknife error estimates for combined data.
+
+The functions here work on the stack of dependent variables of all
+combined files, an array of shape (files x points) such as
+:attr:`mvdlib.analysis.combine.Combiner.ystack`. Resamples of the
+files are drawn as index arrays and the statistic is evaluated for
+many resamples at once: for the mean (the default statistic), all
+bootstrap means are a single matrix product of the resampling counts
+with the stack, and the jackknife means follow from the total sum.
+Refitting a model to every resample, which is the expensive part for
+confidence intervals of fit parameters, is spread over a process
+pool. Example::
+
+    combiner.combine(range(1, 21))
+    curve = combiner.bootstrap(resamples=2000, seed=0)
+    params = bootstrap_fit(combiner.xdata, combiner.ystack,
+                           fit_functions.gaussian, p0)
+    print(params.value, params.error)
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+from collections import namedtuple
+import warnings
+import multiprocessing
+import numpy as np
+from scipy.optimize import curve_fit
+from scipy.stats import norm
+
+# One standard deviation of a normal distribution
+_ONE_SIGMA = 0.682689492137
+
+class Estimate(namedtuple('Estimate', ['value', 'error', 'interval',
+                                       'replicates'])):
+    """
+    Result of a resampling error estimate.
+
+    value : the statistic of the full data set
+    error : standard error estimated from the replicates
+    interval : (lower, upper) confidence interval
+    replicates : the statistic of every resample
+
+    """
+    __slots__ = ()
+
+def bootstrap_indices(n, resamples, seed=None):
+    """Return a (resamples x n) array of indices drawn with
+    replacement from range(n).
+
+    """
+    return np.random.RandomState(seed).randint(0, n, (resamples, n))
+
+def jackknife_indices(n):
+    """Return an (n x n-1) array whose row i holds all indices of
+    range(n) except i.
+
+    """
+    idx = np.arange(1, n)
+    return idx[None,:] - (idx[None,:] <= np.arange(n)[:,None])
+
+def _counts(idx, n):
+    """Return how often each of range(n) occurs in each row of idx."""
+    rows = len(idx)
+    flat = (idx + n*np.arange(rows)[:,None]).ravel()
+    return np.bincount(flat, minlength=rows*n).reshape(rows, n)
+
+def _mean(data):
+    return data.mean(axis=-2)
+
+def _replicates(stack, idx, statistic, chunksize):
+    """Evaluate statistic for the resamples of the rows of stack given
+    by the rows of idx.
+
+    """
+    if statistic is None:
+        return _counts(idx, len(stack)).dot(stack)/idx.shape[1]
+    return np.concatenate([statistic(stack[idx[start:start + chunksize]])
+                           for start in range(0, len(idx), chunksize)])
+
+def bootstrap(stack, statistic=None, resamples=1000, level=_ONE_SIGMA,
+              seed=None, chunksize=100):
+    """
+    Bootstrap estimate of the error of a statistic of combined data.
+
+    Parameters
+    ----------
+    stack : array-like
+        Data of shape (files x points).
+    statistic : callable or None, optional
+        Function reducing an array of shape (..., files, points) along
+        axis -2, e.g., ``lambda d: np.median(d, axis=-2)``. Default:
+        the mean, which is computed without building the resampled
+        data.
+    resamples : int, optional
+        Number of bootstrap resamples. Default: 1000
+    level : float, optional
+        Confidence level of the percentile interval. Default: one
+        standard deviation (0.683)
+    seed : int, optional
+        Random seed.
+    chunksize : int, optional
+        Number of resamples evaluated at a time by statistic.
+
+    Returns
+    -------
+    Estimate
+
+    """
+    stack = np.asarray(stack, dtype=float)
+    idx = bootstrap_indices(len(stack), resamples, seed)
+    replicates = _replicates(stack, idx, statistic, chunksize)
+    value = (statistic or _mean)(stack)
+    return _percentile_estimate(value, replicates, level)
+
+def jackknife(stack, statistic=None, level=_ONE_SIGMA):
+    """
+    Jackknife estimate of the error of a statistic of combined data.
+    Arguments are as for :func:`bootstrap`; the interval is the normal
+    approximation value +/- z*error.
+
+    Returns
+    -------
+    Estimate
+
+    """
+    stack = np.asarray(stack, dtype=float)
+    n = len(stack)
+    if n < 2:
+        raise ValueError("The jackknife needs at least 2 files.")
+    if statistic is None:
+        replicates = (stack.sum(axis=0) - stack)/(n - 1)
+    else:
+        replicates = statistic(stack[jackknife_indices(n)])
+    value = (statistic or _mean)(stack)
+    return _jackknife_estimate(value, replicates, level)
+
+def _percentile_estimate(value, replicates, level):
+    tail = 50*(1 - level)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        interval = np.nanpercentile(replicates, [tail, 100 - tail], axis=0)
+        error = np.nanstd(replicates, axis=0, ddof=1)
+    return Estimate(value, error, interval, replicates)
+
+def _jackknife_estimate(value, replicates, level):
+    n = np.sum(np.isfinite(replicates), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        deviation = replicates - np.nanmean(replicates, axis=0)
+        error = np.sqrt((n - 1)/n*np.nansum(deviation**2, axis=0))
+    z = norm.ppf(0.5 + level/2)
+    return Estimate(value, error, np.array([value - z*error, value + z*error]),
+                    replicates)
+
+# Fitting
+# -------
+
+def _fit_rows(args):
+    """Fit func to every row of ys; failed fits give NaN."""
+    func, x, ys, p0, kwargs = args
+    p = np.full((len(ys), len(p0)), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for i, y in enumerate(ys):
+            try:
+                p[i] = curve_fit(func, x, y, p0, **kwargs)[0]
+            except (RuntimeError, ValueError):
+                pass
+    return p
+
+def fit_replicates(func, x, ys, p0, processes=None, chunksize=50, **kwargs):
+    """
+    Fit func to each row of ys with :func:`scipy.optimize.curve_fit`,
+    in parallel.
+
+    Parameters
+    ----------
+    func : callable
+        Model function f(x, *params). It must be picklable (defined at
+        module level) for parallel fitting.
+    x : array-like
+        Independent variable.
+    ys : array-like
+        Data of shape (rows x points).
+    p0 : array-like
+        Initial guess.
+    processes : int or None, optional
+        Number of worker processes. If None, use the number of CPUs.
+        With 1, fit in the current process.
+    chunksize : int, optional
+        Number of rows fitted per task.
+
+    Other keyword arguments are passed to curve_fit.
+
+    Returns
+    -------
+    np.ndarray
+        Best-fit parameters of shape (rows x len(p0)). Rows for which
+        the fit failed are NaN.
+
+    """
+    x = np.asarray(x, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    p0 = np.asarray(p0, dtype=float)
+    tasks = [(func, x, ys[start:start + chunksize], p0, kwargs)
+             for start in range(0, len(ys), chunksize)]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        results = [_fit_rows(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_fit_rows, tasks)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    return np.concatenate(results) if results else np.empty((0, len(p0)))
+
+def _fit_mean(func, x, stack, p0, kwargs):
+    """Fit func to the mean of stack. Return the parameters and the
+    initial guess to use for the resamples.
+
+    """
+    value = fit_replicates(func, x, stack.mean(axis=0)[None,:], p0, 1,
+                           **kwargs)[0]
+    if np.isfinite(value).all():
+        return value, value
+    return value, p0
+
+def bootstrap_fit(x, stack, func, p0, resamples=1000, level=_ONE_SIGMA,
+                  seed=None, processes=None, **kwargs):
+    """
+    Bootstrap estimate of the errors of parameters from fitting func
+    to the mean of combined data. Each resample of files is averaged
+    and refitted (see :func:`fit_replicates` for the arguments).
+
+    Returns
+    -------
+    Estimate
+        The value is the fit to the mean of all files.
+
+    """
+    stack = np.asarray(stack, dtype=float)
+    idx = bootstrap_indices(len(stack), resamples, seed)
+    means = _replicates(stack, idx, None, None)
+    value, start = _fit_mean(func, x, stack, p0, kwargs)
+    replicates = fit_replicates(func, x, means, start, processes, **kwargs)
+    return _percentile_estimate(value, replicates, level)
+
+def jackknife_fit(x, stack, func, p0, level=_ONE_SIGMA, processes=None,
+                  **kwargs):
+    """
+    Jackknife estimate of the errors of parameters from fitting func
+    to the mean of combined data (see :func:`bootstrap_fit`).
+
+    Returns
+    -------
+    Estimate
+
+    """
+    stack = np.asarray(stack, dtype=float)
+    n = len(stack)
+    if n < 2:
+        raise ValueError("The jackknife needs at least 2 files.")
+    means = (stack.sum(axis=0) - stack)/(n - 1)
+    value, start = _fit_mean(func, x, stack, p0, kwargs)
+    replicates = fit_replicates(func, x, means, start, processes, **kwargs)
+    return _jackknife_estimate(value, replicates, level)
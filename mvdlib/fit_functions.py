@@ -107,6 +107,28 @@ def exp_decay(t, A, B, tau, t0):
     """
     return A*np.exp(-(t - t0)/tau) + B
 
+# Jacobians
+# ---------
+
+def gaussian_jac(t, A, B, t0, sigma):
+    """
+    Analytic Jacobian of :py:func:`gaussian` with respect to the
+    parameters (A, B, t0, sigma), suitable for the ``jac`` argument of
+    :py:meth:`scipy.optimize.curve_fit`.
+
+    Returns
+    -------
+    array-like
+        Array of shape (len(t), 4).
+
+    """
+    t = np.asarray(t, dtype=float)
+    dt = t - t0
+    e = np.exp(-dt**2/(2*sigma**2))
+    Ae = A*e
+    return np.column_stack([e, np.ones_like(t), Ae*dt/sigma**2,
+                            Ae*dt**2/sigma**3])
+
 # Utility functions
 # -----------------
 
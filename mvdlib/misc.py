@@ -2,24 +2,178 @@
 mvdlib.misc
 
 Miscellaneous utility functions that don't fit anywhere else.
+
+The offset and normalization functions optionally work in place.
+In-place operation and the streaming statistics functions process
+data in chunks, so they work in constant memory on memory mapped
+arrays (e.g., :py:class:`numpy.memmap`) or on any iterable of
+chunks, such as blocks read from a digitizer file.
+
+Reductions and rescaling are fused where possible: :func:`rms` uses a
+single dot product, and :func:`fix_offset_and_normalize` finds both
+extrema in one pass and writes its output in a second, either with
+numexpr (if installed) or block by block so each block is still in
+cache for every operation applied to it.
 """
 
 import numpy as np
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# Default number of samples processed at a time by chunked functions.
+CHUNKSIZE = 2**20
+
+# Samples per block in fused kernels. Small enough for a block of
+# doubles to stay in L2 cache between consecutive operations.
+_BLOCKSIZE = 2**14
+
+def chunks(data, chunksize=CHUNKSIZE):
+    """Iterate over views of at most chunksize samples of the array
+    data along the first axis.
+
+    """
+    for start in range(0, len(data), chunksize):
+        yield data[start:start + chunksize]
+
+def _iter_chunks(data, chunksize):
+    """Return an iterator over chunks of data, which may be an array
+    or already an iterable of chunks.
+
+    """
+    if isinstance(data, np.ndarray):
+        return chunks(data, chunksize)
+    return iter(data)
+
+def _check_inplace(data):
+    if not (isinstance(data, np.ndarray) and data.dtype.kind in 'fc'):
+        raise TypeError("In-place operation requires a floating point array.")
+
+def _minmax(data):
+    """Return the minimum and maximum of the contiguous array data in
+    a single pass over memory.
+
+    """
+    flat = data.reshape(-1)
+    lo, hi = np.inf, -np.inf
+    for block in chunks(flat, _BLOCKSIZE):
+        lo = np.minimum(lo, block.min())
+        hi = np.maximum(hi, block.max())
+    return lo, hi
 
-def remove_offset(data):
-    """Makes the minimum value of data be zero."""
-    return data - np.min(data)
+def running_stats(data, chunksize=CHUNKSIZE):
+    """
+    Compute the minimum, maximum, sum of squares, and number of
+    samples of data in a single pass.
 
-def normalize(data):
-    """Normalizes data by dividing by the maximum value."""
-    return data/np.max(data)
+    Parameters
+    ----------
+    data : array-like or iterable
+        An array (possibly memory mapped) or an iterable yielding
+        array chunks.
+    chunksize : int, optional
+        Number of samples to process at a time when data is an array.
 
-def fix_offset_and_normalize(data):
-    """Removes dc offsets and normalizes data."""
-    offset = remove_offset(data)
-    return normalize(offset)
+    Returns
+    -------
+    lo : float
+        Minimum value (NaN if data contains NaN, as for ``np.min``).
+    hi : float
+        Maximum value (NaN if data contains NaN).
+    sumsq : float
+        Sum of the squares of all values.
+    n : int
+        Number of samples.
+
+    """
+    lo, hi, sumsq, n = np.inf, -np.inf, 0., 0
+    for chunk in _iter_chunks(data, chunksize):
+        chunk = np.asarray(chunk).ravel()
+        if chunk.size == 0:
+            continue
+        lo = np.minimum(lo, chunk.min())
+        hi = np.maximum(hi, chunk.max())
+        sumsq += np.dot(chunk, chunk)
+        n += chunk.size
+    if n == 0:
+        raise ValueError("No data.")
+    return lo, hi, sumsq, n
+
+def stream_rms(data, chunksize=CHUNKSIZE):
+    """Return the root mean square value of an array or iterable of
+    chunks without ever squaring more than one chunk at a time.
+
+    """
+    _, _, sumsq, n = running_stats(data, chunksize)
+    return np.sqrt(sumsq/n)
+
+def remove_offset(data, inplace=False, chunksize=CHUNKSIZE):
+    """Makes the minimum value of data be zero. If inplace is True,
+    data must be a floating point array and is modified chunk by
+    chunk.
+
+    """
+    if not inplace:
+        return data - np.min(data)
+    _check_inplace(data)
+    lo = np.minimum.reduce([chunk.min() for chunk in chunks(data, chunksize)])
+    for chunk in chunks(data, chunksize):
+        chunk -= lo
+    return data
+
+def normalize(data, inplace=False, chunksize=CHUNKSIZE):
+    """Normalizes data by dividing by the maximum value. If inplace is
+    True, data must be a floating point array and is modified chunk by
+    chunk.
+
+    """
+    if not inplace:
+        return data/np.max(data)
+    _check_inplace(data)
+    hi = np.maximum.reduce([chunk.max() for chunk in chunks(data, chunksize)])
+    for chunk in chunks(data, chunksize):
+        chunk /= hi
+    return data
+
+def fix_offset_and_normalize(data, inplace=False, chunksize=CHUNKSIZE,
+                             out=None):
+    """Removes dc offsets and normalizes data. If inplace is True,
+    data must be a floating point array and is processed in two
+    passes: one to find the extrema and one to rescale each chunk.
+    Otherwise the result is written to out (allocated if not given)
+    without any intermediate temporaries.
+
+    """
+    if not inplace:
+        data = np.asarray(data)
+        if out is None:
+            out = np.empty(data.shape, dtype=np.result_type(data, float))
+        if (data.size == 0 or not data.flags.c_contiguous
+            or not out.flags.c_contiguous):
+            np.subtract(data, np.min(data), out=out)
+            out /= np.max(out)
+            return out
+        lo, hi = _minmax(data)
+        span = hi - lo
+        if numexpr is not None:
+            return numexpr.evaluate('(data - lo)/span', out=out,
+                                    casting='same_kind')
+        src, dst = data.reshape(-1), out.reshape(-1)
+        for start in range(0, len(src), _BLOCKSIZE):
+            block = dst[start:start + _BLOCKSIZE]
+            np.subtract(src[start:start + _BLOCKSIZE], lo, out=block)
+            np.divide(block, span, out=block)
+        return out
+    _check_inplace(data)
+    lo, hi, _, _ = running_stats(data, chunksize)
+    for chunk in chunks(data, chunksize):
+        chunk -= lo
+        chunk /= hi - lo
+    return data
 
 def rms(x):
     """Return the root mean square value of the array x."""
-    return np.sqrt(np.sum(x**2)/len(x))
-
+    x = np.asarray(x)
+    flat = x.reshape(-1)
+    return np.sqrt(np.dot(flat, flat)/len(x))
@@ -0,0 +1,130 @@
+"""
+mvdlib.oceanoptics
+
+Read spectra datafiles from Ocean Optics spectromters.
+"""
+
+from __future__ import print_function
+from types import StringTypes
+from .. import fit_functions
+from .. import profiling
+from .reader import read_spectrum, read_spectra, Spectrum, SpectrumHeader
+from .series import SpectrumSeries
+from . import peaks
+from . import calibration
+import numpy as np
+import scipy.optimize as spo
+import matplotlib.pyplot as plt
+
+class OOSpectrum(object):
+    def __init__(self):
+        self.lmbda = None
+        self.response = None
+        self.header = None
+
+    @profiling.timed('OOSpectrum.load_sample')
+    def load_sample(self, filename):
+        """Load sample data from file filename. Any format supported
+        by :func:`mvdlib.oceanoptics.reader.read_spectrum` can be
+        used; metadata is stored as a
+        :class:`~mvdlib.oceanoptics.reader.SpectrumHeader` in
+        ``self.header``. If a calibration is registered for the
+        spectrometer (see :mod:`mvdlib.oceanoptics.calibration`), its
+        wavelength axis is used instead of the one in the file.
+
+        """
+        profiling.add_bytes('OOSpectrum.load_sample', filename)
+        spectrum = read_spectrum(filename)
+        self.header = spectrum.header
+        self.lmbda = calibration.wavelengths(spectrum)
+        self.response = spectrum.response
+
+    @profiling.timed('OOSpectrum.fit_gaussian')
+    def fit_gaussian(self, p0=None, roi=None, window=3., binning=1):
+        """Try to fit the spectral data to a Gaussian profile.
+
+        Fitting only a region of interest around the line is much
+        faster than fitting the full spectrum when the line spans a
+        small fraction of the detector, and the analytic Jacobian of
+        the Gaussian is used to avoid numerical differentiation.
+
+        Parameters
+        ----------
+            p0 : array-like
+                Initial guess for parameters. If None, it is estimated
+                with :func:`mvdlib.oceanoptics.peaks.gaussian_params`.
+            roi : None, 'auto', or tuple
+                Region to fit. None fits the full spectrum, 'auto'
+                fits window FWHMs on either side of the strongest
+                peak, and a (min, max) tuple gives explicit wavelength
+                bounds. Default: None
+            window : float
+                Half width of the automatic region of interest in
+                units of the FWHM of the peak. Default: 3
+            binning : int
+                Average this many adjacent pixels before fitting.
+                Default: 1 (no binning)
+
+        Returns
+        -------
+            p : list
+                List of best-fit parameters.
+            cov : numpy array
+                Numpy array of covariances for the fit parameters.
+
+        """
+        if self.response is None:
+            raise RuntimeError("You must load data first.")
+        lmbda, response = self.lmbda, self.response
+        if roi is not None or p0 is None:
+            guess = peaks.gaussian_params(lmbda, response)
+        if roi is not None:
+            if isinstance(roi, StringTypes) and roi == 'auto':
+                fwhm = fit_functions.get_fwhm(guess)
+                if not np.isfinite(fwhm):
+                    fwhm = abs(lmbda[-1] - lmbda[0])
+                lo, hi = guess[2] - window*fwhm, guess[2] + window*fwhm
+            else:
+                lo, hi = roi
+            lo, hi = min(lo, hi), max(lo, hi)
+            idx = np.flatnonzero((lmbda >= lo) & (lmbda <= hi))
+            if len(idx) == 0:
+                raise ValueError("Region of interest contains no pixels.")
+            lmbda = lmbda[idx[0]:idx[-1] + 1]
+            response = response[idx[0]:idx[-1] + 1]
+        if binning > 1:
+            n = len(lmbda)//binning*binning
+            lmbda = lmbda[:n].reshape(-1, binning).mean(axis=1)
+            response = response[:n].reshape(-1, binning).mean(axis=1)
+        if len(lmbda) < 4:
+            raise ValueError("Too few points to fit (need at least 4).")
+        if p0 is None:
+            # Fall back to curve_fit's default of ones where the guess
+            # failed, but always pass p0: curve_fit cannot count the
+            # parameters of the model wrapped by profiling.counted
+            p0 = np.where(np.isfinite(guess), guess, 1.)
+        model = profiling.counted('OOSpectrum.fit_gaussian',
+                                  fit_functions.gaussian)
+        p, cov = spo.curve_fit(model, lmbda, response, p0,
+                               jac=fit_functions.gaussian_jac)
+        return p, cov
+
+    def plot_spectrum(self, p=None, p_type='gaussian',
+                      xlims=None, filename=None):
+        """Plot a spectrum and fit if p is not None and optionally save."""
+        if self.response is None:
+            raise RuntimeError("You must load data first.")
+        plt.figure()
+        plt.plot(self.lmbda, self.response, 'b-')
+        if p is not None:
+            if p_type == 'gaussian':
+                y = fit_functions.gaussian(self.lmbda, *p)
+            else:
+                raise ValueError("p_type must be one of: 'gaussian'")
+            plt.plot(self.lmbda, y, 'b-', lw=2)
+        plt.xlabel('$\lambda$ [nm]')
+        plt.ylabel('Response [arb. units]')
+        if xlims is not None:
+            plt.xlim(xlims)
+        if filename is not None:
+            plt.savefig(filename)
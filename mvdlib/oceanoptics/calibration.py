@@ -0,0 +1,184 @@
+"""
+mvdlib.oceanoptics.calibration
+
+Wavelength calibration of spectrometers against reference lamps.
+
+A :class:`Calibration` maps pixel index to wavelength with a
+polynomial fitted to the positions of known lines. Calibrations are
+registered per device (by spectrometer serial number); spectra loaded
+from a registered device then use the calibrated wavelength axis
+instead of the one stored in the file. The evaluated axis is computed
+once per calibration, kept with it, and shared, read-only, by every
+spectrum, so applying a calibration costs neither time nor memory.
+
+Example::
+
+    lamp = reader.read_spectrum('hg_ar_lamp.txt')
+    cal = Calibration.fit(lamp.response, hg_ar_lines_nm,
+                          approx=lamp.lmbda, serial=lamp.header.serial)
+    register(cal)
+    spectrum = OOSpectrum()
+    spectrum.load_sample('sample.txt')  # spectrum.lmbda is cal.axis()
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+from ..quantum import transitions
+from . import peaks
+
+# Registered calibrations by serial number
+_registry = {}
+
+class Calibration(object):
+    def __init__(self, coefficients, pixels, serial=None):
+        """A polynomial pixel to wavelength (in nm) mapping.
+
+        Parameters
+        ----------
+        coefficients : array-like
+            Polynomial coefficients, highest power first (as for
+            :func:`numpy.polyval`).
+        pixels : int
+            Number of detector pixels.
+        serial : str, optional
+            Serial number of the spectrometer this calibration
+            belongs to.
+
+        """
+        self.coefficients = tuple(float(c) for c in coefficients)
+        self.pixels = int(pixels)
+        self.serial = serial
+        self.residuals = None
+        self._axis = None
+
+    @classmethod
+    def fit(cls, response, reference, units='nm', approx=None, degree=3,
+            tolerance=1., nsigma=5., serial=None):
+        """
+        Fit a calibration to a reference lamp spectrum.
+
+        Peaks are located with :mod:`mvdlib.oceanoptics.peaks` and
+        matched to the closest reference line within tolerance of
+        their approximate wavelength. Each line is matched to at most
+        one peak, the closest; other peaks near it are ignored.
+
+        Parameters
+        ----------
+        response : array-like
+            Reference lamp spectrum.
+        reference : array-like
+            Known line positions.
+        units : str, optional
+            Units of reference; anything accepted by
+            :func:`mvdlib.quantum.transitions.convert`. Default: 'nm'
+        approx : array-like, optional
+            Approximate wavelength axis in nm used to match peaks to
+            lines, e.g., the axis stored in the file. If not given,
+            the peaks are assumed to be the reference lines in order.
+        degree : int, optional
+            Polynomial degree. Default: 3
+        tolerance : float, optional
+            Maximum distance in nm between the approximate position of
+            a peak and a reference line. Default: 1
+        nsigma : float, optional
+            Peak detection threshold (see
+            :func:`mvdlib.oceanoptics.peaks.find_peaks`).
+        serial : str, optional
+            Spectrometer serial number.
+
+        Returns
+        -------
+        Calibration
+
+        """
+        response = np.asarray(response, dtype=float)
+        reference = np.sort(np.atleast_1d(
+            transitions.convert(np.asarray(reference, dtype=float),
+                                units, 'nm')))
+        index = peaks.find_peaks(response, nsigma)
+        position = peaks.interpolate(response, index)
+        if approx is None:
+            if len(position) != len(reference):
+                raise ValueError("Found %d peaks for %d reference lines."
+                                 % (len(position), len(reference)))
+            pixel, lmbda = position, reference
+        else:
+            approx = np.asarray(approx, dtype=float)
+            found = peaks.to_x(approx, position)
+            nearest = np.abs(found[:,None] - reference[None,:]).argmin(axis=1)
+            distance = np.abs(found - reference[nearest])
+            # Candidates by increasing distance; keep the first (the
+            # closest) peak for every line
+            order = np.argsort(distance, kind='mergesort')
+            order = order[distance[order] <= tolerance]
+            _, first = np.unique(nearest[order], return_index=True)
+            matched = np.sort(order[first])
+            pixel, lmbda = position[matched], reference[nearest[matched]]
+        if len(pixel) <= degree:
+            raise ValueError("Only %d lines matched; need more than %d."
+                             % (len(pixel), degree))
+        calibration = cls(np.polyfit(pixel, lmbda, degree), len(response),
+                          serial)
+        calibration.residuals = lmbda - calibration(pixel)
+        return calibration
+
+    def __call__(self, pixel):
+        """Return the wavelength in nm at (fractional) pixel."""
+        return np.polyval(self.coefficients, pixel)
+
+    def axis(self):
+        """
+        Return the calibrated wavelength axis. The array is evaluated
+        once per calibration, kept with it, and read-only, so all
+        spectra using this calibration share the same memory.
+
+        """
+        key = (self.coefficients, self.pixels)
+        if self._axis is None or self._axis[0] != key:
+            axis = self(np.arange(self.pixels, dtype=float))
+            axis.flags.writeable = False
+            self._axis = (key, axis)
+        return self._axis[1]
+
+    def apply(self, spectrum):
+        """Set the wavelength axis of spectrum (anything with a
+        ``lmbda`` attribute) to the calibrated axis.
+
+        """
+        if len(spectrum.lmbda) != self.pixels:
+            raise ValueError("Spectrum does not match the calibration.")
+        spectrum.lmbda = self.axis()
+        return spectrum
+
+def register(calibration, serial=None):
+    """Register calibration for the device serial (default: the
+    calibration's own serial number).
+
+    """
+    serial = serial or calibration.serial
+    if serial is None:
+        raise ValueError("A serial number is required.")
+    _registry[serial] = calibration
+
+def unregister(serial):
+    """Remove the calibration for device serial, if any."""
+    _registry.pop(serial, None)
+
+def lookup(serial):
+    """Return the calibration registered for device serial or None."""
+    return _registry.get(serial)
+
+def wavelengths(spectrum):
+    """Return the wavelength axis to use for a
+    :class:`~mvdlib.oceanoptics.reader.Spectrum`: the calibrated axis
+    if its device has a matching registered calibration, otherwise
+    the axis read from file.
+
+    """
+    header = spectrum.header
+    calibration = _registry.get(header.serial) if header else None
+    if calibration is not None and calibration.pixels == len(spectrum.lmbda):
+        return calibration.axis()
+    return spectrum.lmbda
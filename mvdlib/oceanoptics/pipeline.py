@@ -0,0 +1,396 @@
+"""
+mvdlib.oceanoptics.pipeline
+
+Process spectra as they are acquired.
+
+A :class:`Pipeline` reads spectra from a source, runs each through a
+chain of stages, and publishes the results on a bounded queue. The
+source, the stages, and the consumer run concurrently; because both
+queues are bounded, a slow consumer blocks the workers and, in turn,
+the source (backpressure) instead of letting spectra pile up in
+memory.
+
+Sources are iterables of ``(key, spectrum)`` pairs where spectrum is
+a :class:`~mvdlib.oceanoptics.reader.Spectrum`, or of ready
+:class:`Frame` objects (e.g., to report a file which could not be
+read). Two are provided:
+:class:`DirectorySource`, which watches a directory for new files,
+and :class:`SimulatedSource`, which generates synthetic spectra.
+
+Stages are callables which take a :class:`Frame` and modify it in
+place. Example::
+
+    source = DirectorySource('/data/spectra', pattern='*.txt')
+    pipeline = Pipeline(source, [DarkSubtraction(dark), Normalize(),
+                                 GaussianFit()])
+    pipeline.start()
+    for frame in pipeline.results():
+        print(frame.key, frame.results['gaussian'], frame.latency)
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import time
+import fnmatch
+import threading
+import Queue
+from collections import deque
+import numpy as np
+import scipy.optimize as spo
+from .. import fit_functions
+from .. import misc
+from .reader import read_spectrum, Spectrum, SpectrumHeader
+from . import peaks
+
+# Sentinel marking the end of a stream
+_DONE = object()
+
+class Frame(object):
+    """A spectrum travelling through a pipeline.
+
+    Attributes
+    ----------
+    key : str
+        Identifier given by the source (e.g., a filename).
+    lmbda : np.ndarray
+        Wavelengths.
+    response : np.ndarray
+        Response, possibly modified by previous stages.
+    header : SpectrumHeader or None
+        Metadata from the source.
+    results : dict
+        Results stored by stages.
+    error : Exception or None
+        Exception raised by the source or a stage, if any. Later
+        stages are skipped.
+    received : float
+        Time the spectrum was received from the source (for files,
+        before parsing).
+    latency : float or None
+        Time in seconds from receiving to publishing the result.
+
+    """
+    def __init__(self, key, spectrum, received=None, error=None):
+        self.key = key
+        if spectrum is None:
+            self.lmbda = self.response = self.header = None
+        else:
+            self.lmbda = spectrum.lmbda
+            self.response = spectrum.response
+            self.header = spectrum.header
+        self.results = {}
+        self.error = error
+        self.received = time.time() if received is None else received
+        self.latency = None
+
+# Sources
+# -------
+
+class DirectorySource(object):
+    def __init__(self, path, pattern='*', interval=0.25, existing=False,
+                 timeout=None):
+        """Watch a directory for new spectrum files.
+
+        A file is only read once its size has not changed between two
+        polls, so partially written files are not parsed. A file which
+        cannot be read is passed on as a :class:`Frame` with the
+        exception as its error, and watching continues.
+
+        Parameters
+        ----------
+        path : str
+            Directory to watch.
+        pattern : str, optional
+            Shell pattern new files must match. Default: '*'
+        interval : float, optional
+            Polling interval in seconds. Default: 0.25
+        existing : bool, optional
+            If True, also process files already present when watching
+            starts. Default: False
+        timeout : float or None, optional
+            Stop after this many seconds without new files. If None,
+            watch until :meth:`stop` is called.
+
+        """
+        assert os.path.isdir(path)
+        self.path = path
+        self.pattern = pattern
+        self.interval = interval
+        self.existing = existing
+        self.timeout = timeout
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop watching."""
+        self._stop.set()
+
+    def _scan(self):
+        sizes = {}
+        for name in fnmatch.filter(os.listdir(self.path), self.pattern):
+            try:
+                sizes[name] = os.path.getsize(os.path.join(self.path, name))
+            except OSError:
+                pass
+        return sizes
+
+    def __iter__(self):
+        seen = set() if self.existing else set(self._scan())
+        pending = {}
+        last = time.time()
+        while not self._stop.is_set():
+            for name, size in sorted(self._scan().items()):
+                if name in seen:
+                    continue
+                if pending.get(name) != size:
+                    pending[name] = size
+                    continue
+                seen.add(name)
+                del pending[name]
+                last = time.time()
+                filename = os.path.join(self.path, name)
+                received = time.time()
+                try:
+                    spectrum = read_spectrum(filename)
+                except Exception as e:
+                    yield Frame(filename, None, received, e)
+                else:
+                    yield Frame(filename, spectrum, received)
+            if self.timeout is not None and time.time() - last > self.timeout:
+                break
+            self._stop.wait(self.interval)
+
+class SimulatedSource(object):
+    def __init__(self, n=None, pixels=2048, lmbda=(380., 420.),
+                 center=397., sigma=0.5, amplitude=1000., offset=50.,
+                 noise=5., drift=0., interval=0., seed=None):
+        """Generate noisy Gaussian spectra, e.g., for testing a
+        pipeline without a spectrometer.
+
+        Parameters
+        ----------
+        n : int or None, optional
+            Number of spectra to generate. If None, generate until
+            :meth:`stop` is called.
+        pixels : int, optional
+            Number of pixels per spectrum.
+        lmbda : tuple, optional
+            First and last wavelength.
+        center, sigma, amplitude, offset : float, optional
+            Parameters of the Gaussian line.
+        noise : float, optional
+            Standard deviation of the added white noise.
+        drift : float, optional
+            Change of the line center from one spectrum to the next.
+        interval : float, optional
+            Seconds to wait between spectra. Default: 0
+        seed : int, optional
+            Random seed.
+
+        """
+        self.n = n
+        self.lmbda = np.linspace(lmbda[0], lmbda[1], pixels)
+        self.center = center
+        self.sigma = sigma
+        self.amplitude = amplitude
+        self.offset = offset
+        self.noise = noise
+        self.drift = drift
+        self.interval = interval
+        self._random = np.random.RandomState(seed)
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop generating spectra."""
+        self._stop.set()
+
+    def __iter__(self):
+        header = SpectrumHeader(None, None, 'SIMULATED', None, 1, 0,
+                                False, False, len(self.lmbda), {})
+        i = 0
+        while not self._stop.is_set() and (self.n is None or i < self.n):
+            t0 = self.center + i*self.drift
+            response = fit_functions.gaussian(
+                self.lmbda, self.amplitude, self.offset, t0, self.sigma)
+            response += self._random.normal(0, self.noise, len(self.lmbda))
+            yield 'simulated_%d' % i, Spectrum(header, self.lmbda, response)
+            i += 1
+            if self.interval:
+                self._stop.wait(self.interval)
+
+# Stages
+# ------
+
+class DarkSubtraction(object):
+    """Subtract a dark spectrum."""
+    def __init__(self, dark):
+        self.dark = np.asarray(dark)
+
+    def __call__(self, frame):
+        frame.response = frame.response - self.dark
+
+class Normalize(object):
+    """Remove the offset and normalize with
+    :func:`mvdlib.misc.fix_offset_and_normalize`.
+
+    """
+    def __call__(self, frame):
+        frame.response = misc.fix_offset_and_normalize(frame.response)
+
+class GaussianFit(object):
+    """Fit the response to :func:`mvdlib.fit_functions.gaussian` and
+    store the parameters as ``results['gaussian']``.
+
+    Parameters
+    ----------
+    p0 : array-like, optional
+        Initial guess. If not given, the previous result is used, or
+        an estimate from the data for the first spectrum (see
+        :func:`mvdlib.oceanoptics.peaks.gaussian_params`). A fit
+        giving non-finite parameters sets the frame's error and is
+        not used as a starting point.
+
+    """
+    def __init__(self, p0=None):
+        self.p0 = p0
+        self._last = None
+
+    def __call__(self, frame):
+        p0 = self.p0
+        if p0 is None and self._last is not None:
+            if np.isfinite(self._last).all():
+                p0 = self._last
+        if p0 is None:
+            p0 = peaks.gaussian_params(frame.lmbda, frame.response)
+        p, cov = spo.curve_fit(fit_functions.gaussian, frame.lmbda,
+                               frame.response, p0)
+        if not np.isfinite(p).all():
+            # Never warm-start later frames from a failed fit
+            raise RuntimeError("Gaussian fit gave non-finite parameters.")
+        self._last = p
+        frame.results['gaussian'] = p
+
+# Pipeline
+# --------
+
+class Pipeline(object):
+    def __init__(self, source, stages=(), maxsize=8, workers=1,
+                 history=1000):
+        """Set up a processing pipeline.
+
+        Parameters
+        ----------
+        source : iterable
+            Iterable yielding (key, spectrum) pairs.
+        stages : list, optional
+            Callables applied to each :class:`Frame` in order.
+        maxsize : int, optional
+            Maximum number of frames waiting to be processed and
+            waiting to be consumed, respectively. Default: 8
+        workers : int, optional
+            Number of worker threads running the stages. With more
+            than one worker, results may be published out of order.
+            Default: 1
+        history : int, optional
+            Number of latencies to keep for :meth:`latency_stats`.
+
+        """
+        self.source = source
+        self.stages = list(stages)
+        self.workers = workers
+        self.latencies = deque(maxlen=history)
+        self._input = Queue.Queue(maxsize)
+        self._output = Queue.Queue(maxsize)
+        self._threads = []
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start reading from the source and processing."""
+        if self._threads:
+            raise RuntimeError("Pipeline already started.")
+        self._threads.append(threading.Thread(target=self._read))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def stop(self):
+        """Stop the source and discard frames not yet processed."""
+        self._stopped.set()
+        if hasattr(self.source, 'stop'):
+            self.source.stop()
+
+    def _put(self, queue, item):
+        """Put item on queue, blocking while full unless stopped."""
+        while True:
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                if self._stopped.is_set() and item is not _DONE:
+                    return
+
+    def _read(self):
+        try:
+            for item in self.source:
+                if self._stopped.is_set():
+                    break
+                if not isinstance(item, Frame):
+                    item = Frame(*item)
+                self._put(self._input, item)
+        finally:
+            for i in range(self.workers):
+                self._put(self._input, _DONE)
+
+    def _work(self):
+        while True:
+            frame = self._input.get()
+            if frame is _DONE:
+                self._put(self._output, _DONE)
+                return
+            if self._stopped.is_set():
+                continue
+            for stage in self.stages if frame.error is None else ():
+                try:
+                    stage(frame)
+                except Exception as e:
+                    frame.error = e
+                    break
+            frame.latency = time.time() - frame.received
+            self.latencies.append(frame.latency)
+            self._put(self._output, frame)
+
+    def results(self, timeout=None):
+        """
+        Iterate over processed frames as they are published. Iteration
+        ends when the source is exhausted (or the pipeline is stopped)
+        and all frames have been consumed.
+
+        Parameters
+        ----------
+        timeout : float or None, optional
+            Raise ``Queue.Empty`` if no frame arrives within this many
+            seconds.
+
+        """
+        done = 0
+        while done < self.workers:
+            frame = self._output.get(timeout=timeout)
+            if frame is _DONE:
+                done += 1
+            else:
+                yield frame
+
+    def latency_stats(self):
+        """Return a dict with the count, mean, median, and maximum of
+        the recent per-spectrum latencies in seconds.
+
+        """
+        latencies = np.array(self.latencies)
+        if len(latencies) == 0:
+            return {'count': 0, 'mean': None, 'median': None, 'max': None}
+        return {'count': len(latencies), 'mean': latencies.mean(),
+                'median': np.median(latencies), 'max': latencies.max()}
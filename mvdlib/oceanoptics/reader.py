@@ -0,0 +1,268 @@
+"""
+mvdlib.oceanoptics.reader
+
+Readers for spectra exported by Ocean Optics SpectraSuite and
+OceanView. Supported formats are
+
+* Tab-delimited text exports with or without a header. The header
+  length is detected from the ``>>>>>Begin ... Data<<<<<`` marker
+  rather than assumed, and header entries are parsed into a
+  :class:`SpectrumHeader`.
+* Text files with several spectra, either as several header/data
+  blocks one after another or as additional response columns next to
+  a single wavelength column.
+* Binary ``.ProcSpec`` files, which are zip archives containing an
+  XML serialization of the spectrum.
+
+The numeric body of text files is decoded in one call to numpy's C
+parser instead of line by line.
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import re
+import zipfile
+from collections import namedtuple
+import xml.etree.cElementTree as ElementTree
+import numpy as np
+
+class SpectrumHeader(namedtuple('SpectrumHeader', [
+        'date', 'user', 'serial', 'integration_time', 'averages', 'boxcar',
+        'dark_corrected', 'nonlinearity_corrected', 'pixels', 'extra'])):
+    """
+    Metadata of a spectrum. The integration time is always in seconds.
+    Entries that are not present in a file are None. Entries not
+    mapped to a field are kept as strings in the ``extra`` dict.
+
+    """
+    __slots__ = ()
+
+class Spectrum(namedtuple('Spectrum', ['header', 'lmbda', 'response'])):
+    """
+    A spectrum as read from file. ``response`` is 1-D for a single
+    spectrum or (spectra x pixels) if a file stores several response
+    columns for one wavelength axis.
+
+    """
+    __slots__ = ()
+
+_BEGIN = '>>>>>Begin'
+_END = '>>>>>End'
+
+# Header keys (lower case, without units) and the fields they map to.
+_fields = {
+    'date': 'date',
+    'user': 'user',
+    'spectrometer serial number': 'serial',
+    'spectrometer': 'serial',
+    'integration time': 'integration_time',
+    'spectra averaged': 'averages',
+    'scans to average': 'averages',
+    'boxcar smoothing': 'boxcar',
+    'boxcar width': 'boxcar',
+    'correct for electrical dark': 'dark_corrected',
+    'electric dark correction enabled': 'dark_corrected',
+    'correct for detector non-linearity': 'nonlinearity_corrected',
+    'nonlinearity correction enabled': 'nonlinearity_corrected',
+    'number of pixels in processed spectrum': 'pixels',
+    'number of pixels in spectrum': 'pixels',
+}
+
+# Integration time units to seconds.
+_time_units = {'usec': 1e-6, 'us': 1e-6, 'msec': 1e-3, 'ms': 1e-3,
+               'sec': 1.0, 's': 1.0}
+
+_key_re = re.compile(r'^(.*?)\s*(?:\((\w+)\))?$')
+
+def _to_bool(value):
+    return value.split()[0].lower() in ('yes', 'true', '1', 'on')
+
+def _to_int(value):
+    return int(float(value.split()[0]))
+
+def _parse_header(lines):
+    """Parse header lines of the form 'key: value' into a
+    SpectrumHeader.
+
+    """
+    fields = dict.fromkeys(SpectrumHeader._fields)
+    extra = {}
+    for line in lines:
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        value = value.strip()
+        name, units = _key_re.match(key.strip()).groups()
+        field = _fields.get(name.lower())
+        if field is None or fields[field] is not None or not value:
+            extra[key.strip()] = value
+            continue
+        try:
+            if field == 'integration_time':
+                scale = _time_units.get(units or 'sec', 1.0)
+                fields[field] = float(value.split()[0])*scale
+            elif field in ('averages', 'boxcar', 'pixels'):
+                fields[field] = _to_int(value)
+            elif field in ('dark_corrected', 'nonlinearity_corrected'):
+                fields[field] = _to_bool(value)
+            else:
+                fields[field] = value
+        except (ValueError, IndexError):
+            extra[key.strip()] = value
+    fields['extra'] = extra
+    return SpectrumHeader(**fields)
+
+def _parse_body(body):
+    """Decode the numeric body of a text export into an array of
+    shape (pixels, columns).
+
+    """
+    body = body.strip()
+    if len(body) == 0:
+        return np.empty((0, 2))
+    first = body[:body.find('\n')] if '\n' in body else body
+    if ',' in first and '\t' in first:
+        # Decimal commas from OceanView in some locales
+        body = body.replace(',', '.')
+        first = first.replace(',', '.')
+    ncols = len(first.split())
+    values = np.fromstring(body, sep=' ')
+    rows = body.count('\n') + 1
+    if values.size != rows*ncols:
+        # Fall back to the slower parser for a useful error message
+        # (or for bodies with blank lines).
+        return np.loadtxt(body.splitlines(), ndmin=2)
+    return values.reshape(rows, ncols)
+
+def _is_numeric(line):
+    try:
+        [float(x) for x in line.replace(',', '.').split()]
+    except ValueError:
+        return False
+    return len(line.split()) > 0
+
+def _make_spectrum(header_lines, body):
+    header = _parse_header(header_lines)
+    data = _parse_body(body)
+    lmbda = data[:,0]
+    if data.shape[1] == 2:
+        response = data[:,1]
+    else:
+        response = data[:,1:].T
+    return Spectrum(header, lmbda, response)
+
+def _read_text(filename):
+    with open(filename, 'r') as infile:
+        text = infile.read()
+    if text.startswith('\xef\xbb\xbf'):
+        text = text[3:]
+    spectra = []
+    pos = 0
+    while True:
+        begin = text.find(_BEGIN, pos)
+        if begin < 0:
+            break
+        header = text[pos:begin].splitlines()
+        start = text.find('\n', begin)
+        if start < 0:
+            break
+        end = text.find(_END, start)
+        if end < 0:
+            end = len(text)
+        spectra.append(_make_spectrum(header, text[start + 1:end]))
+        pos = text.find('\n', end)
+        if pos < 0:
+            break
+    if len(spectra) == 0:
+        # No markers: the header is everything before the first line
+        # of numbers.
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if _is_numeric(line):
+                break
+        else:
+            raise ValueError("No spectral data found in " + filename)
+        spectra.append(_make_spectrum(lines[:i], '\n'.join(lines[i:])))
+    return spectra
+
+# Candidate XML tags in .ProcSpec files for each header field.
+_xml_fields = {
+    'date': ('acquisitionTime', 'date'),
+    'user': ('userName', 'user'),
+    'serial': ('spectrometerSerialNumber', 'serialNumber'),
+    'integration_time': ('integrationTime',),
+    'averages': ('scansToAverage', 'numberOfSamplesToAverage'),
+    'boxcar': ('boxcarWidth',),
+    'dark_corrected': ('correctForElectricalDark',
+                       'electricDarkCorrectionEnabled'),
+    'nonlinearity_corrected': ('correctForDetectorNonlinearity',
+                               'nonlinearityCorrectionEnabled'),
+}
+
+def _xml_array(root, tag):
+    elem = root.find('.//' + tag)
+    if elem is None:
+        return None
+    text = ' '.join(child.text for child in elem if child.text)
+    return np.fromstring(text, sep=' ')
+
+def _read_procspec(filename):
+    with zipfile.ZipFile(filename) as archive:
+        names = [name for name in archive.namelist()
+                 if name.endswith('.xml') and 'Signature' not in name]
+        if len(names) == 0:
+            raise ValueError("No spectrum found in " + filename)
+        root = ElementTree.fromstring(archive.read(names[0]))
+    response = _xml_array(root, 'processedPixels')
+    lmbda = _xml_array(root, 'channelWavelengths')
+    if response is None or lmbda is None:
+        raise ValueError("No spectrum found in " + filename)
+    fields = dict.fromkeys(SpectrumHeader._fields)
+    for field, tags in _xml_fields.items():
+        for tag in tags:
+            elem = root.find('.//' + tag)
+            if elem is not None and elem.text:
+                fields[field] = elem.text.strip()
+                break
+    try:
+        # Stored in microseconds
+        if fields['integration_time'] is not None:
+            fields['integration_time'] = float(fields['integration_time'])*1e-6
+        for field in ('averages', 'boxcar'):
+            if fields[field] is not None:
+                fields[field] = _to_int(fields[field])
+        for field in ('dark_corrected', 'nonlinearity_corrected'):
+            if fields[field] is not None:
+                fields[field] = _to_bool(fields[field])
+    except ValueError:
+        raise ValueError("Malformed metadata in " + filename)
+    fields['pixels'] = len(response)
+    fields['extra'] = {}
+    return [Spectrum(SpectrumHeader(**fields), lmbda, response)]
+
+def read_spectra(filename):
+    """
+    Read all spectra from file filename.
+
+    Parameters
+    ----------
+    filename : str
+        A text export or ``.ProcSpec`` file.
+
+    Returns
+    -------
+    list
+        List of :class:`Spectrum` records.
+
+    """
+    if filename.lower().endswith('.procspec'):
+        return _read_procspec(filename)
+    return _read_text(filename)
+
+def read_spectrum(filename):
+    """Read the first spectrum from file filename and return it as a
+    :class:`Spectrum` record.
+
+    """
+    return read_spectra(filename)[0]
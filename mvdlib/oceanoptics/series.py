@@ -0,0 +1,224 @@
+"""
+mvdlib.oceanoptics.series
+
+Time series of spectra sharing a single wavelength axis.
+
+Responses are stored as rows of one contiguous (time x pixel) array,
+optionally backed by a memory mapped file, so operations across the
+whole series are single vectorized numpy calls. Storage grows
+geometrically, so appending spectra one at a time does not reallocate
+on every append.
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+import scipy.optimize as spo
+from .. import fit_functions
+from .reader import read_spectra
+from .calibration import wavelengths
+from . import peaks
+
+class SpectrumSeries(object):
+    def __init__(self, lmbda, capacity=16, filename=None, dtype=float):
+        """Create an empty series.
+
+        Parameters
+        ----------
+        lmbda : array-like
+            Wavelength axis shared by all spectra.
+        capacity : int, optional
+            Number of spectra to allocate storage for initially.
+            Default: 16
+        filename : str or None, optional
+            If given, store responses in a memory mapped file of this
+            name (which is overwritten) instead of in memory.
+        dtype : dtype, optional
+            Data type for stored responses. Default: float
+
+        """
+        self.lmbda = np.asarray(lmbda, dtype=float)
+        assert self.lmbda.ndim == 1
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.headers = []
+        self._n = 0
+        self._data = None
+        self._allocate(max(int(capacity), 1))
+
+    @classmethod
+    def from_files(cls, filenames, **kwargs):
+        """Create a series from a list of spectrum files. The
+        wavelength axis is taken from the first file (or from a
+        registered calibration of its spectrometer). Keyword
+        arguments are passed on to the constructor.
+
+        """
+        filenames = list(filenames)
+        if len(filenames) == 0:
+            raise ValueError("At least one file is required.")
+        first = read_spectra(filenames[0])
+        kwargs.setdefault('capacity', len(filenames))
+        series = cls(wavelengths(first[0]), **kwargs)
+        for spectrum in first:
+            series.append(spectrum.response, spectrum.header)
+        for filename in filenames[1:]:
+            series.append_file(filename)
+        return series
+
+    def _allocate(self, capacity):
+        """(Re)allocate storage for capacity spectra, keeping the
+        spectra stored so far.
+
+        """
+        shape = (capacity, len(self.lmbda))
+        if self.filename is None:
+            data = np.empty(shape, dtype=self.dtype)
+            if self._data is not None:
+                data[:self._n] = self._data[:self._n]
+        elif self._data is None:
+            data = np.memmap(self.filename, dtype=self.dtype, mode='w+',
+                             shape=shape)
+        else:
+            # Growing a memory map only extends the file; nothing is
+            # copied.
+            self._data.flush()
+            self._data = None
+            data = np.memmap(self.filename, dtype=self.dtype, mode='r+',
+                             shape=shape)
+        self._data = data
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def capacity(self):
+        """Number of spectra that fit into the current storage."""
+        return self._data.shape[0]
+
+    @property
+    def responses(self):
+        """View of the stored responses with shape (time x pixel)."""
+        return self._data[:self._n]
+
+    def reserve(self, n):
+        """Make sure there is room for n more spectra."""
+        needed = self._n + n
+        if needed > self.capacity:
+            self._allocate(max(needed, 2*self.capacity))
+
+    def append(self, response, header=None):
+        """Append one response (or a 2-D array of several) with an
+        optional header.
+
+        """
+        response = np.asarray(response)
+        rows = response.reshape(-1, response.shape[-1])
+        if rows.shape[1] != len(self.lmbda):
+            raise ValueError("Response does not match the wavelength axis.")
+        self.reserve(len(rows))
+        self._data[self._n:self._n + len(rows)] = rows
+        self._n += len(rows)
+        self.headers.extend([header]*len(rows))
+
+    def append_file(self, filename):
+        """Append all spectra in file filename."""
+        for spectrum in read_spectra(filename):
+            lmbda = wavelengths(spectrum)
+            if lmbda is not self.lmbda and (
+                    len(lmbda) != len(self.lmbda)
+                    or not np.allclose(lmbda, self.lmbda)):
+                raise ValueError(
+                    "Wavelength axis of %s does not match." % filename)
+            self.append(spectrum.response, spectrum.header)
+
+    def flush(self):
+        """Flush memory mapped storage to disk."""
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
+
+    def subtract_dark(self, dark, inplace=False):
+        """Subtract the dark spectrum dark from all responses. If
+        inplace is True, the stored responses are modified and
+        returned; otherwise a new array is returned.
+
+        """
+        dark = np.asarray(dark)
+        if inplace:
+            responses = self.responses
+            responses -= dark
+            return responses
+        return self.responses - dark
+
+    def mean(self, start=None, stop=None):
+        """Return the average spectrum of the spectra start to stop."""
+        return self.responses[start:stop].mean(axis=0)
+
+    def _band(self, lo, hi):
+        """Return a slice selecting pixels with lo <= lmbda <= hi."""
+        if self.lmbda[0] <= self.lmbda[-1]:
+            start = np.searchsorted(self.lmbda, lo, side='left')
+            stop = np.searchsorted(self.lmbda, hi, side='right')
+            return slice(start, stop)
+        idx = np.flatnonzero((self.lmbda >= lo) & (self.lmbda <= hi))
+        return slice(idx[0], idx[-1] + 1) if len(idx) else slice(0, 0)
+
+    def integrate_band(self, lo, hi):
+        """Return the response integrated over the wavelength band lo
+        to hi for every spectrum in the series.
+
+        """
+        band = self._band(lo, hi)
+        return np.trapz(self.responses[:,band], self.lmbda[band], axis=1)
+
+    def guess_gaussians(self):
+        """
+        Estimate Gaussian parameters (A, B, t0, sigma) for all spectra
+        at once with :func:`mvdlib.oceanoptics.peaks.gaussian_params`.
+
+        Returns
+        -------
+        p0 : np.ndarray
+            Array of shape (time x 4).
+
+        """
+        return peaks.gaussian_params(self.lmbda, self.responses)
+
+    def fit_gaussians(self, p0=None):
+        """
+        Fit every spectrum in the series to a Gaussian profile.
+
+        Parameters
+        ----------
+        p0 : array-like, optional
+            Initial guesses, either one set of parameters for all
+            spectra or one row per spectrum. If not given, they are
+            estimated with :meth:`guess_gaussians`.
+
+        Returns
+        -------
+        p : np.ndarray
+            Best-fit parameters with shape (time x 4). Rows for which
+            the fit failed are NaN.
+        perr : np.ndarray
+            One standard deviation errors of the parameters.
+
+        """
+        if p0 is None:
+            p0 = self.guess_gaussians()
+        p0 = np.broadcast_to(np.asarray(p0, dtype=float), (self._n, 4))
+        p = np.empty((self._n, 4))
+        perr = np.empty((self._n, 4))
+        for i, response in enumerate(self.responses):
+            try:
+                p[i], cov = spo.curve_fit(fit_functions.gaussian,
+                                          self.lmbda, response, p0[i])
+                perr[i] = np.sqrt(np.diag(cov))
+            except (RuntimeError, ValueError):
+                p[i] = np.nan
+                perr[i] = np.nan
+            if not np.isfinite(p[i]).all():
+                p[i] = np.nan
+                perr[i] = np.nan
+        return p, perr
@@ -1,3 +1,3 @@
 """Present for backwards compatibility."""
 
-from .. plotutils import set_style as load_settings
+from .. plotutils import set_style as load_settings, styles, style
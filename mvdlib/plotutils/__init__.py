@@ -16,7 +16,10 @@ import shutil
 import tempfile
 import subprocess
 import json
+import hashlib
+import matplotlib
 import matplotlib.pyplot as plt
+from .. import profiling
 
 _path = os.path.join(os.path.dirname(__file__), 'styles')
 styles = {
@@ -56,10 +59,103 @@ def _decode_dict(data):
         rv[key] = value
     return rv
 
+# Parsed and validated styles by name
+_style_cache = {}
+
+# rc parameters describing the matplotlib installation rather than the
+# look of a figure, which are ignored in styles
+_installation_keys = ('backend', 'backend_fallback', 'backend.qt4',
+                      'backend.qt5', 'interactive', 'datapath',
+                      'examples.directory')
+
+def register_style(name, source):
+    """Register a user style.
+
+    Parameters
+    ----------
+    name : str
+        Name of the style. Registering an existing name replaces the
+        style.
+    source : str or dict
+        Path to a JSON style file (in the same format as the built-in
+        styles) or a dict of rc parameters.
+
+    """
+    assert isinstance(name, (str, unicode))
+    assert isinstance(source, (str, unicode, dict))
+    if isinstance(source, dict):
+        source = dict(source)
+    styles[name] = source
+    _style_cache.pop(name, None)
+
+def _parse_style(style):
+    """Parse and validate the style named style."""
+    source = styles[style]
+    if isinstance(source, dict):
+        rc_params = _decode_dict(source)
+    else:
+        with open(source, 'r') as json_file:
+            rc_params = json.load(json_file, object_hook=_decode_dict)
+    comment = rc_params.pop("comment", None)
+    # Older style files may set parameters the installed matplotlib
+    # no longer knows about
+    validate = matplotlib.rcParams.validate
+    rc_params = dict((key, validate[key](value))
+                     for key, value in rc_params.items()
+                     if key in validate and key not in _installation_keys)
+    return rc_params, comment
+
+def read_style(style="default"):
+    """Read the rc parameters of a style without applying them. Each
+    style is parsed and validated only once; later calls return the
+    cached result.
+
+    Parameters
+    ----------
+    style : str, optional
+        Name of the style (a key of styles).
+
+    Returns
+    -------
+    rc_params : dict
+        The rc parameters defined by the style which are valid for
+        the installed version of matplotlib.
+    comment : str or None
+        The comment string from the JSON file.
+
+    """
+    try:
+        rc_params, comment = _style_cache[style]
+    except KeyError:
+        rc_params, comment = _style_cache[style] = _parse_style(style)
+    return dict(rc_params), comment
+
+def style(style="default", show_info=False):
+    """Return a context manager applying a style, restoring the
+    previous rcParams on exit::
+
+        with style('aps'):
+            plt.plot(x, y)
+            plt.savefig('figure.pdf')
+
+    Parameters
+    ----------
+    style : str, optional
+        Plotting style to use.
+    show_info : bool, optional
+        If True, print the comment string from the JSON file.
+
+    """
+    rc_params, comment = read_style(style)
+    if comment is not None and show_info:
+        print("PLOT SETTINGS INFO:", comment)
+    return matplotlib.rc_context(rc_params)
+
 def set_style(style="default", show_info=True):
     """Loads the matplotlib settings from a file. The file does not
     need to define all rc parameters, but only the ones that should be
-    different from the defaults.
+    different from the defaults. The settings stay in effect until
+    changed; see :func:`style` to apply them temporarily.
 
     Parameters
     ----------
@@ -71,18 +167,13 @@ def set_style(style="default", show_info=True):
 
     """
     try:
-        with open(styles[style], 'r') as json_file:
-            rc_params = json.load(json_file, object_hook=_decode_dict)
+        rc_params, comment = read_style(style)
     except KeyError:
         print("style must be one of", styles.keys())
-    try:
-        comment = rc_params.pop("comment")
-        if show_info:
-            print("PLOT SETTINGS INFO:", comment)
-    except KeyError:
-        pass
-    finally:
-        plt.rcParams.update(rc_params)
+        return
+    if comment is not None and show_info:
+        print("PLOT SETTINGS INFO:", comment)
+    plt.rcParams.update(rc_params)
 
 _export_formats = ['pdf']
 _tex = r"""\documentclass{{standalone}}
@@ -92,42 +183,174 @@ _tex = r"""\documentclass{{standalone}}
 \input{{{fig:s}}}
 \end{{document}}
 """
+# Directory holding compiled figures named by the hash of their input
+cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'mvdlib', 'pgf')
+
+def _encode(text):
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return text
+
+def _build_hash(builddir, name, preamble, texcmd):
+    """Return a hash of everything determining the output of a build
+    of name.pgf in builddir: the TeX engine, the document template and
+    preamble, the PGF file, and any raster images it includes. The
+    name itself does not enter the hash.
+
+    """
+    digest = hashlib.sha1()
+    for part in [texcmd, _tex, '\n'.join(preamble)]:
+        digest.update(_encode(part) + '\0')
+    files = [name + '.pgf'] + sorted(
+        f for f in os.listdir(builddir) if f.startswith(name + '-img'))
+    for f in files:
+        with open(os.path.join(builddir, f), 'rb') as infile:
+            content = infile.read()
+        if f.endswith('.pgf'):
+            content = content.replace(name + '-img', '-img')
+        digest.update(_encode(f[len(name):]) + '\0' + content + '\0')
+    return digest.hexdigest()
+
+def _cached(key):
+    """Return the cached PDF file for key or None."""
+    cached = os.path.join(cache_dir, key + '.pdf')
+    if os.path.exists(cached):
+        return cached
+    return None
+
+def _store(pdf_file, key):
+    """Add pdf_file to the cache under key."""
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # Created concurrently
+            pass
+    # Rename is atomic, so concurrent builds never see partial files
+    partial = tempfile.NamedTemporaryFile(dir=cache_dir, delete=False)
+    partial.close()
+    shutil.copyfile(pdf_file, partial.name)
+    os.rename(partial.name, os.path.join(cache_dir, key + '.pdf'))
+
+class TeXError(RuntimeError):
+    """Error when processing LaTeX. The log attribute holds the output
+    of the TeX engine.
+
+    """
+    def __init__(self, message, log=None):
+        RuntimeError.__init__(self, message)
+        self.log = log
+
+def _run_tex(builddir, name, texcmd):
+    """Run texcmd on name.tex in builddir and return the PDF file."""
+    log_file = os.path.join(builddir, name + '.log.txt')
+    with open(log_file, 'w') as log:
+        status = subprocess.call(
+            [texcmd, '-interaction=nonstopmode', '-halt-on-error',
+             name + '.tex'],
+            cwd=builddir, stdout=log, stderr=subprocess.STDOUT)
+    pdf_file = os.path.join(builddir, name + '.pdf')
+    if status or not os.path.exists(pdf_file):
+        with open(log_file) as log:
+            raise TeXError("Error when processing LaTeX; see the log in "
+                           + builddir, log.read())
+    return pdf_file
+
+def _compile(builddir, name, filename, preamble, texcmd, cache,
+             remove=True):
+    """Compile name.pgf in builddir to the PDF file filename, reusing
+    a cached result when one exists. builddir is removed afterwards
+    if remove is True, unless compiling fails.
+
+    """
+    key = _build_hash(builddir, name, preamble, texcmd)
+    cached = _cached(key) if cache else None
+    if cached is not None:
+        shutil.copyfile(cached, filename)
+    else:
+        with open(os.path.join(builddir, name + '.tex'), 'w') as out:
+            out.write(_encode(_tex.format(preamble='\n'.join(preamble),
+                                          fig=name + '.pgf')))
+        pdf_file = _run_tex(builddir, name, texcmd)
+        if cache:
+            _store(pdf_file, key)
+        shutil.copyfile(pdf_file, filename)
+    if remove:
+        shutil.rmtree(builddir)
+    return filename
+
+def _export(fig, builddir, name):
+    """Save fig as name.pgf in builddir with rc fonts turned off."""
+    with matplotlib.rc_context({'pgf.rcfonts': False}):
+        fig.savefig(os.path.join(builddir, name + '.pgf'),
+                    bbox_inches='tight')
+
+@profiling.timed('pgfsave')
 def pgfsave(filename, **kwargs):
     """Use the matplotlib pgf backend to render the figure and save it
     as an image file.
 
+    Compiled figures are cached in :data:`cache_dir` under a hash of
+    the PGF output, the preamble, and the TeX engine, so saving an
+    unchanged figure again does not run TeX. Each compile runs in its
+    own temporary directory, so several may run concurrently.
+
     Keyword arguments
     -----------------
     format: str
         For now, limited to 'pdf'.
     preamble : list
         List of strings to use as the pgf preamble.
+    texcmd : str
+        TeX engine to use. Default: 'xelatex'
+    cache : bool
+        Use the render cache. Default: True
+    figure : matplotlib.figure.Figure
+        Figure to save. Default: the current figure
+    batch : mvdlib.plotutils.pgfbatch.PGFBatch
+        Instead of compiling now, add the figure to this batch, which
+        compiles all its figures in a single TeX run (the other
+        keyword arguments are then taken from the batch).
+    pool : mvdlib.plotutils.texpool.TeXPool
+        Instead of compiling now, submit the figure to this pool of
+        concurrent TeX processes and return a
+        :class:`~mvdlib.plotutils.texpool.PGFFuture` (the other
+        keyword arguments are then taken from the pool).
+
+    Returns
+    -------
+    str
+        The output filename.
+
+    Raises
+    ------
+    TeXError
+        If TeX fails.
 
     """
     format = kwargs.get('format', 'pdf')
     assert format in _export_formats
     assert isinstance(filename, (str, unicode))
-    texcmd = 'xelatex'
+    texcmd = kwargs.get('texcmd', 'xelatex')
     preamble = kwargs.get('preamble', [])
     assert isinstance(preamble, (list, tuple))
+    cache = kwargs.get('cache', True)
+    fig = kwargs.get('figure', None) or plt.gcf()
+
+    batch = kwargs.get('batch', None)
+    if batch is not None:
+        return batch.add(filename, fig)
+    pool = kwargs.get('pool', None)
+    if pool is not None:
+        return pool.submit(filename, fig)
 
-    # Temporarily turn off rc fonts
-    rc = plt.rcParams
-    plt.rcParams['pgf.rcfonts'] = False
+    # Export the figure with rc fonts temporarily turned off
+    builddir = tempfile.mkdtemp(prefix='pgfsave-')
+    try:
+        _export(fig, builddir, 'figure')
+    except:
+        shutil.rmtree(builddir)
+        raise
 
     # Compile the figure
-    prefix = filename[:-3]
-    tmp = tempfile.gettempdir()
-    pgf_file = os.path.join(tmp, prefix + 'pgf')
-    tex_file = os.path.join(tmp, prefix + 'tex')
-    pdf_file = os.path.join(tmp, prefix + 'pdf')
-    plt.savefig(pgf_file, bbox_inches='tight')
-    with open(tex_file, 'w') as out:
-        out.write(_tex.format(preamble=('\n'.join(preamble)), fig=prefix + 'pgf'))
-    if subprocess.check_call([texcmd, os.path.basename(tex_file)], cwd=tmp):
-        raise RuntimeError("Error when processing LaTeX.")
-    os.rename(pdf_file, os.path.join(os.getcwd(), prefix + 'pdf'))
-
-    # Restore rcParams
-    plt.rcParams = rc
-    
+    return _compile(builddir, 'figure', filename, preamble, texcmd, cache)
@@ -0,0 +1,162 @@
+"""Batch rendering of figures.
+
+Objects providing a ``draw(ax, **kwargs)`` method (such as
+:class:`mvdlib.analysis.plot.Plotter` and
+:class:`mvdlib.quantum.rabi.RabiFlop`) can be rendered to files
+without going through pyplot: each figure is built with the
+object-oriented API on its own Agg canvas, with its style applied in
+a :func:`matplotlib.rc_context` on top of the matplotlib defaults, so
+neither the current pyplot state nor a previously rendered figure
+affects the result. Many figures are rendered concurrently in a
+process pool. Example::
+
+    jobs = [RenderJob(RabiFlop(f), f[:-3] + 'png', style='web')
+            for f in datafiles]
+    render_batch(jobs, processes=4)
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+import multiprocessing
+import matplotlib
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from . import read_style, _installation_keys
+
+class RenderJob(namedtuple('RenderJob', ['obj', 'filename', 'style',
+                                         'options'])):
+    """
+    A figure to render.
+
+    obj : object with a ``draw(ax, **kwargs)`` method
+    filename : output file; the format is taken from the extension
+        unless given as ``options['format']``
+    style : name of a style in :data:`mvdlib.plotutils.styles` or None
+        for the matplotlib defaults
+    options : dict of keyword arguments for :func:`render`
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, obj, filename, style=None, options=None):
+        return super(RenderJob, cls).__new__(cls, obj, filename, style,
+                                             options or {})
+
+@contextmanager
+def _style_context(style):
+    """Context in which rc parameters are the matplotlib defaults
+    updated with style. The previous parameters are restored on exit.
+
+    """
+    with matplotlib.rc_context():
+        keep = dict((key, matplotlib.rcParams[key])
+                    for key in _installation_keys
+                    if key in matplotlib.rcParams)
+        matplotlib.rc_file_defaults()
+        dict.update(matplotlib.rcParams, keep)
+        if style is not None:
+            matplotlib.rcParams.update(read_style(style)[0])
+        yield
+
+def render(obj, filename, style=None, **kwargs):
+    """
+    Render a single figure to a file without using pyplot.
+
+    Parameters
+    ----------
+    obj : object
+        Anything with a ``draw(ax, **kwargs)`` method.
+    filename : str
+        Output file.
+    style : str or None, optional
+        Plot style to use. Default: matplotlib defaults
+
+    Keyword arguments
+    -----------------
+    format : str
+        Output format. Default: taken from the file extension
+    figsize : tuple
+        Figure size in inches. Default: from the style
+    dpi : float
+        Resolution. Default: from the style
+    bbox_inches : str or None
+        Passed to savefig. Default: 'tight'
+
+    Other keyword arguments are passed to ``obj.draw``.
+
+    Returns
+    -------
+    str
+        The output filename.
+
+    """
+    format = kwargs.pop('format', None)
+    figsize = kwargs.pop('figsize', None)
+    dpi = kwargs.pop('dpi', None)
+    bbox_inches = kwargs.pop('bbox_inches', 'tight')
+    with _style_context(style):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        obj.draw(fig.add_subplot(111), **kwargs)
+        fig.savefig(filename, format=format, bbox_inches=bbox_inches)
+    return filename
+
+def _init_worker():
+    """Drop font objects inherited from the parent process; sharing
+    them between forked processes corrupts text rendering.
+
+    """
+    cache_clear = getattr(getattr(font_manager, '_get_font', None),
+                          'cache_clear', None)
+    if cache_clear is not None:
+        cache_clear()
+
+def _render_job(job):
+    return render(job.obj, job.filename, job.style, **job.options)
+
+def render_batch(jobs, processes=None, chunksize=1):
+    """
+    Render many figures concurrently.
+
+    Parameters
+    ----------
+    jobs : iterable
+        :class:`RenderJob` instances (or equivalent tuples). The
+        objects to draw must be picklable.
+    processes : int or None, optional
+        Number of worker processes. If None, use the number of CPUs.
+        With 1, render in the current process.
+    chunksize : int, optional
+        Number of jobs sent to a worker at a time. Default: 1
+
+    Returns
+    -------
+    list
+        Output filenames in the order of jobs.
+
+    """
+    jobs = [RenderJob(*job) for job in jobs]
+    for job in jobs:
+        directory = os.path.dirname(job.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(jobs))
+    if processes <= 1:
+        return [_render_job(job) for job in jobs]
+    pool = multiprocessing.Pool(processes, _init_worker)
+    try:
+        result = pool.map(_render_job, jobs, chunksize)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return result
@@ -0,0 +1,158 @@
+"""Fast errorbar plots for large data sets.
+
+:func:`matplotlib.pyplot.errorbar` creates a separate artist for every
+error bar, which is slow to draw and produces huge vector files for
+large data sets. :func:`fast_errorbar` instead draws all error bars as
+a single :class:`~matplotlib.collections.LineCollection`, rasterizes
+dense layers (so vector output stays small while text and axes remain
+vector graphics), and above a threshold plots binned averages instead
+of every point.
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+from collections import namedtuple
+import numpy as np
+from matplotlib.collections import LineCollection
+
+class ErrorbarArtists(namedtuple('ErrorbarArtists', ['line', 'errorbars',
+                                                     'binned'])):
+    """
+    Artists created by :func:`fast_errorbar`.
+
+    line : the :class:`~matplotlib.lines.Line2D` with the data points
+    errorbars : the :class:`~matplotlib.collections.LineCollection` of
+        error bars (None if there are no errors)
+    binned : True if binned averages were plotted
+
+    """
+    __slots__ = ()
+
+def bin_data(x, y, yerr=None, bins=500):
+    """
+    Average data in equally wide bins of x.
+
+    Parameters
+    ----------
+    x, y : array-like
+        Data points. x need not be sorted.
+    yerr : array-like or None, optional
+        Errors of y. If given, the error of each bin is propagated from
+        them; otherwise it is the standard error of the mean of the y
+        values in the bin.
+    bins : int, optional
+        Number of bins. Default: 500
+
+    Returns
+    -------
+    x, y, yerr : np.ndarray
+        Mean x, mean y, and error of the mean y of each non-empty bin.
+
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    lo, hi = x.min(), x.max()
+    scale = bins/(hi - lo) if hi > lo else 0.
+    idx = np.minimum(((x - lo)*scale).astype(int), bins - 1)
+    n = np.bincount(idx, minlength=bins)
+    full = n > 0
+    n = n[full]
+    xm = np.bincount(idx, x, bins)[full]/n
+    ym = np.bincount(idx, y, bins)[full]/n
+    if yerr is not None:
+        yerr = np.broadcast_to(np.asarray(yerr, dtype=float), y.shape)
+        err = np.sqrt(np.bincount(idx, yerr**2, bins)[full])/n
+    else:
+        var = np.bincount(idx, y**2, bins)[full]/n - ym**2
+        err = np.sqrt(np.clip(var, 0, None)/n)
+    return xm, ym, err
+
+def _segments(x, y, lo, hi, vertical=True):
+    """Return an array of line segments from lo to hi at each point."""
+    segments = np.empty((len(x), 2, 2))
+    if vertical:
+        segments[:,:,0] = x[:,None]
+        segments[:,0,1] = lo
+        segments[:,1,1] = hi
+    else:
+        segments[:,:,1] = y[:,None]
+        segments[:,0,0] = lo
+        segments[:,1,0] = hi
+    return segments
+
+def fast_errorbar(ax, x, y, yerr=None, xerr=None, fmt='', **kwargs):
+    """
+    Plot data with error bars on the Axes ax, like
+    :meth:`matplotlib.axes.Axes.errorbar` but efficient for many
+    points.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        Axes to plot on.
+    x, y : array-like
+        Data points.
+    yerr, xerr : scalar or array-like, optional
+        Symmetric errors.
+    fmt : str, optional
+        Format string for the data points. Default: ''
+
+    Keyword arguments
+    -----------------
+    threshold : int or None
+        Plot binned averages (see :func:`bin_data`) when there are more
+        than this many points. None disables binning. Default: 10000
+    bins : int
+        Number of bins when binning. Default: 500
+    rasterize : int or None
+        Rasterize the points and error bars when more than this many
+        are drawn. None disables rasterization. Default: 2000
+    ecolor : color
+        Error bar color. Default: the color of the data points
+    elinewidth : float
+        Error bar line width. Default: the line width of the data
+        points
+
+    Other keyword arguments are passed to :meth:`ax.plot`.
+
+    Returns
+    -------
+    ErrorbarArtists
+
+    """
+    threshold = kwargs.pop('threshold', 10000)
+    bins = kwargs.pop('bins', 500)
+    rasterize = kwargs.pop('rasterize', 2000)
+    ecolor = kwargs.pop('ecolor', None)
+    elinewidth = kwargs.pop('elinewidth', None)
+
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    binned = threshold is not None and len(x) > threshold
+    if binned:
+        if xerr is not None:
+            raise ValueError("xerr is not supported for binned data.")
+        x, y, yerr = bin_data(x, y, yerr, bins)
+    rasterized = rasterize is not None and len(x) > rasterize
+
+    line, = ax.plot(x, y, fmt, rasterized=rasterized, **kwargs)
+    segments = []
+    if yerr is not None:
+        yerr = np.broadcast_to(np.asarray(yerr, dtype=float), y.shape)
+        segments.append(_segments(x, y, y - yerr, y + yerr))
+    if xerr is not None:
+        xerr = np.broadcast_to(np.asarray(xerr, dtype=float), x.shape)
+        segments.append(_segments(x, y, x - xerr, x + xerr, False))
+    errorbars = None
+    if segments:
+        errorbars = LineCollection(
+            np.concatenate(segments),
+            colors=ecolor if ecolor is not None else line.get_color(),
+            linewidths=(elinewidth if elinewidth is not None
+                        else line.get_linewidth()),
+            zorder=line.get_zorder() - 0.1,
+            rasterized=rasterized)
+        ax.add_collection(errorbars, autolim=True)
+        ax.autoscale_view()
+    return ErrorbarArtists(line, errorbars, binned)
@@ -0,0 +1,160 @@
+"""Compile many PGF figures in a single TeX run.
+
+Starting the TeX engine and loading fonts and packages takes most of
+the time of :func:`mvdlib.plotutils.pgfsave`. A :class:`PGFBatch`
+instead collects figures and compiles all of those not found in the
+render cache as the pages of one standalone document, which is then
+split into one PDF file per figure with ``pdfseparate`` (poppler) or
+Ghostscript. Example::
+
+    with PGFBatch(preamble=[r'\\usepackage{fontspec}']) as batch:
+        for name in names:
+            make_figure(name)
+            pgfsave(name + '.pdf', batch=batch)
+            plt.close()
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import shutil
+import tempfile
+import subprocess
+from distutils.spawn import find_executable
+import matplotlib.pyplot as plt
+from . import _encode, _build_hash, _cached, _store, _run_tex, _export
+
+_batch_tex = r"""\documentclass[multi=pgfpage]{{standalone}}
+\usepackage{{pgf}}
+{preamble}
+\newenvironment{{pgfpage}}{{}}{{}}
+\begin{{document}}
+{pages}
+\end{{document}}
+"""
+
+# Commands splitting a PDF file into one file per page; {output} is a
+# filename pattern with %d standing for the page number (from 1).
+splitters = {
+    'pdfseparate': ['pdfseparate', '{input}', '{output}'],
+    'gs': ['gs', '-q', '-dNOPAUSE', '-dBATCH', '-dSAFER', '-sDEVICE=pdfwrite',
+           '-sOutputFile={output}', '{input}'],
+}
+
+def _find_splitter():
+    for name in ['pdfseparate', 'gs']:
+        if find_executable(name):
+            return splitters[name]
+    raise RuntimeError("Splitting PDF files requires pdfseparate or gs.")
+
+class PGFBatch(object):
+    def __init__(self, preamble=(), texcmd='xelatex', cache=True,
+                 splitcmd=None):
+        """Create an empty batch.
+
+        Parameters
+        ----------
+        preamble : list, optional
+            List of strings to use as the pgf preamble.
+        texcmd : str, optional
+            TeX engine to use. Default: 'xelatex'
+        cache : bool, optional
+            Use the render cache of :func:`mvdlib.plotutils.pgfsave`.
+            Default: True
+        splitcmd : list or str, optional
+            Command splitting the combined PDF file: either a key of
+            :data:`splitters` or a list of arguments containing the
+            placeholders {input} and {output}. Default: pdfseparate
+            if available, otherwise gs
+
+        """
+        assert isinstance(preamble, (list, tuple))
+        self.preamble = list(preamble)
+        self.texcmd = texcmd
+        self.cache = cache
+        if isinstance(splitcmd, basestring):
+            splitcmd = splitters[splitcmd]
+        self.splitcmd = splitcmd
+        self.builddir = tempfile.mkdtemp(prefix='pgfbatch-')
+        self._figures = []
+
+    def __len__(self):
+        return len(self._figures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.compile()
+        else:
+            self.discard()
+
+    def add(self, filename, figure=None):
+        """Export figure (default: the current figure) for output to
+        the PDF file filename. The figure may be closed or modified
+        afterwards; nothing is compiled until :meth:`compile`.
+
+        """
+        assert isinstance(filename, (str, unicode))
+        name = 'fig%04d' % len(self._figures)
+        _export(figure or plt.gcf(), self.builddir, name)
+        self._figures.append((name, filename))
+        return filename
+
+    def discard(self):
+        """Remove all figures and temporary files."""
+        shutil.rmtree(self.builddir, ignore_errors=True)
+        self._figures = []
+
+    def compile(self):
+        """
+        Compile all figures, copying cached ones and compiling the rest
+        in a single TeX run.
+
+        Returns
+        -------
+        list
+            The output filenames.
+
+        """
+        todo = []
+        for name, filename in self._figures:
+            key = _build_hash(self.builddir, name, self.preamble, self.texcmd)
+            cached = _cached(key) if self.cache else None
+            if cached is not None:
+                shutil.copyfile(cached, filename)
+            else:
+                todo.append((name, filename, key))
+        if todo:
+            for (name, filename, key), page in zip(todo, self._build(todo)):
+                if self.cache:
+                    _store(page, key)
+                shutil.copyfile(page, filename)
+        filenames = [filename for name, filename in self._figures]
+        self.discard()
+        return filenames
+
+    def _build(self, todo):
+        """Compile figures todo into one document and return the
+        filenames of its pages.
+
+        """
+        pages = '\n'.join(r'\begin{pgfpage}\input{%s.pgf}\end{pgfpage}'
+                          % name for name, filename, key in todo)
+        with open(os.path.join(self.builddir, 'batch.tex'), 'w') as out:
+            out.write(_encode(_batch_tex.format(
+                preamble='\n'.join(self.preamble), pages=pages)))
+        pdf_file = _run_tex(self.builddir, 'batch', self.texcmd)
+        if len(todo) == 1:
+            return [pdf_file]
+        splitcmd = self.splitcmd or _find_splitter()
+        pattern = os.path.join(self.builddir, 'page-%d.pdf')
+        subprocess.check_call(
+            [arg.format(input=pdf_file, output=pattern) for arg in splitcmd])
+        pages = [pattern % (i + 1) for i in range(len(todo))]
+        if not all(os.path.exists(page) for page in pages):
+            raise RuntimeError("Splitting %s did not give %d pages."
+                               % (pdf_file, len(todo)))
+        return pages
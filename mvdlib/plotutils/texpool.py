@@ -0,0 +1,165 @@
+"""Compile PGF figures in the background.
+
+:func:`mvdlib.plotutils.pgfsave` waits for TeX to finish. A
+:class:`TeXPool` instead exports the figure (which is quick and must
+happen in the plotting thread), then hands the compile to one of a
+bounded number of concurrent TeX processes and returns a
+:class:`PGFFuture` right away, so a script can keep generating
+figures while earlier ones compile. Example::
+
+    with TeXPool(processes=4) as pool:
+        futures = [pgfsave(name + '.pdf', figure=make_figure(name),
+                           pool=pool)
+                   for name in names]
+    for future in futures:
+        if future.exception() is not None:
+            print(future.filename, future.log)
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import shutil
+import tempfile
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import matplotlib.pyplot as plt
+from . import _compile, _export, TeXError
+
+def _compile_job(builddir, filename, preamble, texcmd, cache):
+    """Compile in a worker thread; return the filename and TeX log."""
+    _compile(builddir, 'figure', filename, preamble, texcmd, cache,
+             remove=False)
+    log_file = os.path.join(builddir, 'figure.log.txt')
+    log = None
+    if os.path.exists(log_file):
+        with open(log_file) as infile:
+            log = infile.read()
+    shutil.rmtree(builddir)
+    return filename, log
+
+class PGFFuture(object):
+    """The pending result of compiling one figure.
+
+    Attributes
+    ----------
+    filename : str
+        Output filename.
+    log : str or None
+        Output of the TeX engine once done, or None if the figure was
+        taken from the render cache.
+
+    """
+    def __init__(self, filename, result):
+        self.filename = filename
+        self.log = None
+        self._result = result
+
+    def done(self):
+        """Return True if compiling has finished."""
+        return self._result.ready()
+
+    def result(self, timeout=None):
+        """Wait for the compile to finish and return the output
+        filename. Raises :class:`~mvdlib.plotutils.TeXError` if TeX
+        failed, or ``multiprocessing.TimeoutError``.
+
+        """
+        try:
+            filename, self.log = self._result.get(timeout)
+        except TeXError as e:
+            self.log = e.log
+            raise
+        return filename
+
+    def exception(self, timeout=None):
+        """Wait for the compile to finish and return the exception
+        raised, or None if it succeeded.
+
+        """
+        try:
+            self.result(timeout)
+        except multiprocessing.TimeoutError:
+            raise
+        except Exception as e:
+            return e
+        return None
+
+class TeXPool(object):
+    def __init__(self, processes=None, preamble=(), texcmd='xelatex',
+                 cache=True):
+        """Start a pool of concurrent TeX compiles.
+
+        Parameters
+        ----------
+        processes : int or None, optional
+            Maximum number of TeX processes running at a time. Default:
+            the number of CPUs
+        preamble : list, optional
+            List of strings to use as the pgf preamble.
+        texcmd : str, optional
+            TeX engine to use. Default: 'xelatex'
+        cache : bool, optional
+            Use the render cache of :func:`mvdlib.plotutils.pgfsave`.
+            Default: True
+
+        """
+        assert isinstance(preamble, (list, tuple))
+        self.preamble = list(preamble)
+        self.texcmd = texcmd
+        self.cache = cache
+        self.futures = []
+        self._pool = ThreadPool(processes or multiprocessing.cpu_count())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, filename, figure=None):
+        """Export figure (default: the current figure) and queue it
+        for compiling to the PDF file filename. The figure may be
+        closed or modified as soon as this returns.
+
+        Returns
+        -------
+        PGFFuture
+
+        """
+        assert isinstance(filename, (str, unicode))
+        builddir = tempfile.mkdtemp(prefix='pgfsave-')
+        try:
+            _export(figure or plt.gcf(), builddir, 'figure')
+        except:
+            shutil.rmtree(builddir)
+            raise
+        result = self._pool.apply_async(
+            _compile_job,
+            (builddir, filename, self.preamble, self.texcmd, self.cache))
+        future = PGFFuture(filename, result)
+        self.futures.append(future)
+        return future
+
+    def wait(self):
+        """
+        Wait until all submitted figures are compiled.
+
+        Returns
+        -------
+        errors : dict
+            Exceptions of failed compiles by output filename.
+
+        """
+        errors = {}
+        for future in self.futures:
+            error = future.exception()
+            if error is not None:
+                errors[future.filename] = error
+        return errors
+
+    def close(self):
+        """Wait for all compiles to finish and stop the pool."""
+        self._pool.close()
+        self._pool.join()
@@ -0,0 +1,188 @@
+"""
+mvdlib.profiling
+
+Opt-in instrumentation of the analysis code.
+
+Loading, fitting, and plotting functions throughout mvdlib are
+instrumented with :func:`timed` and :class:`section`. While profiling
+is disabled (the default) these only check a flag, so the overhead is
+negligible. Once enabled with :func:`enable`, every instrumented
+operation records its number of calls and wall time, plus the bytes
+read from files and the number of model evaluations (fit iterations)
+where applicable, in a registry keyed by operation name. Example::
+
+    from mvdlib import profiling
+    profiling.enable()
+    run_nightly_analysis()
+    print(profiling.summary())
+    profiling.dump('profile.json')
+
+Own code can be instrumented the same way::
+
+    @profiling.timed('my_analysis.load')
+    def load(filename):
+        profiling.add_bytes('my_analysis.load', filename)
+        ...
+
+    with profiling.section('my_analysis.fit'):
+        curve_fit(profiling.counted('my_analysis.fit', model), x, y)
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import os
+import json
+import time
+import functools
+
+_enabled = False
+
+# Statistics by operation name
+registry = {}
+
+class Stats(object):
+    """Statistics of one instrumented operation.
+
+    Attributes
+    ----------
+    calls : int
+        Number of calls.
+    time : float
+        Total wall time in seconds (including nested operations).
+    bytes_read : int
+        Total size of files read.
+    evaluations : int
+        Total number of model function evaluations by fits.
+
+    """
+    __slots__ = ('calls', 'time', 'bytes_read', 'evaluations')
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.
+        self.bytes_read = 0
+        self.evaluations = 0
+
+    def to_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+def _stats(name):
+    try:
+        return registry[name]
+    except KeyError:
+        stats = registry[name] = Stats()
+        return stats
+
+def enable(reset_stats=True):
+    """Start recording, by default discarding previous statistics."""
+    global _enabled
+    if reset_stats:
+        reset()
+    _enabled = True
+
+def disable():
+    """Stop recording. Statistics are kept."""
+    global _enabled
+    _enabled = False
+
+def enabled():
+    """Return True if profiling is enabled."""
+    return _enabled
+
+def reset():
+    """Discard all statistics."""
+    registry.clear()
+
+class section(object):
+    """Context manager timing the enclosed block as operation name::
+
+        with section('fit'):
+            ...
+
+    """
+    __slots__ = ('name', '_start')
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        if _enabled:
+            self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._start is not None:
+            stats = _stats(self.name)
+            stats.calls += 1
+            stats.time += time.time() - self._start
+            self._start = None
+
+def timed(name=None):
+    """Decorator recording calls and wall time of a function as
+    operation name (default: the function's qualified name).
+
+    """
+    def decorator(func):
+        label = name or '%s.%s' % (func.__module__, func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = _stats(label)
+                stats.calls += 1
+                stats.time += time.time() - start
+        return wrapper
+    return decorator
+
+def add_bytes(name, filename):
+    """Record reading the file filename (or an int number of bytes)
+    for operation name.
+
+    """
+    if _enabled:
+        if not isinstance(filename, (int, long)):
+            filename = os.path.getsize(filename)
+        _stats(name).bytes_read += filename
+
+def counted(name, func):
+    """Return func wrapped to count its evaluations for operation
+    name, e.g., a model function passed to curve_fit. While profiling
+    is disabled, func itself is returned.
+
+    """
+    if not _enabled:
+        return func
+    stats = _stats(name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats.evaluations += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+def to_dict():
+    """Return the statistics as a dict of dicts."""
+    return dict((name, stats.to_dict()) for name, stats in registry.items())
+
+def dump(filename):
+    """Write the statistics to filename as JSON."""
+    with open(filename, 'w') as out:
+        json.dump(to_dict(), out, indent=2, sort_keys=True)
+
+def summary():
+    """Return the statistics as a table sorted by total time."""
+    lines = ["{:<36s} {:>7s} {:>11s} {:>11s} {:>10s} {:>8s}".format(
+        "operation", "calls", "total [s]", "mean [ms]", "read [MB]", "evals")]
+    for name, stats in sorted(registry.items(), key=lambda i: -i[1].time):
+        mean = stats.time/stats.calls*1e3 if stats.calls else 0.
+        lines.append("{:<36s} {:>7d} {:>11.4f} {:>11.3f} {:>10.3f} {:>8d}"
+                     .format(name, stats.calls, stats.time, mean,
+                             stats.bytes_read/2**20, stats.evaluations))
+    return '\n'.join(lines)
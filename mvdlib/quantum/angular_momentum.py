@@ -6,7 +6,7 @@ Functions related to angular momentum.
 
 from __future__ import print_function
 from __future__ import division
-from numpy import sqrt
+from numpy import sqrt, array
 from scipy.misc import factorial
 from sympy.physics.quantum import cg
 
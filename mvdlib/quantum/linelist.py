@@ -0,0 +1,212 @@
+"""mvdlib.quantum.linelist
+
+Storage and lookup of atomic and molecular line lists.
+
+Lines are kept in a columnar store (one numpy array per field) sorted
+by wavenumber, so range queries are a pair of binary searches and
+return views rather than copies. Positions can be given and returned
+in any units understood by :func:`mvdlib.quantum.transitions.convert`.
+
+"""
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+from . import transitions
+
+# Column names and default dtypes for text line lists.
+_columns = ('species', 'lower', 'upper', 'wavenumber', 'strength')
+_dtype = [('species', 'S16'), ('lower', 'S32'), ('upper', 'S32'),
+          ('wavenumber', 'f8'), ('strength', 'f8')]
+
+class LineList(object):
+    """
+    A list of spectral lines sorted by wavenumber.
+
+    Parameters
+    ----------
+    species : array-like
+        Species (atom, ion, or molecule) each line belongs to.
+    lower : array-like
+        Lower level labels.
+    upper : array-like
+        Upper level labels.
+    wavenumber : array-like
+        Line positions in inverse cm.
+    strength : array-like
+        Line strengths (in whatever units the source uses).
+    presorted : bool, optional
+        If True, skip sorting because wavenumber is already in
+        ascending order.
+
+    """
+    def __init__(self, species, lower, upper, wavenumber, strength,
+                 presorted=False):
+        wavenumber = np.asarray(wavenumber, dtype=float)
+        columns = [np.asarray(species), np.asarray(lower),
+                   np.asarray(upper), wavenumber,
+                   np.asarray(strength, dtype=float)]
+        for column in columns:
+            if column.shape != wavenumber.shape or column.ndim != 1:
+                raise ValueError("All columns must be 1-D and of equal length.")
+        if not presorted:
+            order = np.argsort(wavenumber, kind='mergesort')
+            columns = [column[order] for column in columns]
+        (self.species, self.lower, self.upper,
+         self.wavenumber, self.strength) = columns
+
+    @classmethod
+    def load(cls, filename, delimiter=None, skiprows=0, usecols=None,
+             dtype=None):
+        """
+        Load a line list from file filename.
+
+        Text files must contain (at least) the columns species, lower
+        level, upper level, wavenumber in inverse cm, and strength.
+        Files ending in ``.npz`` are assumed to have been written by
+        :meth:`save` and are loaded without parsing.
+
+        Parameters
+        ----------
+        filename : str
+            File to load.
+        delimiter : str or None, optional
+            Column delimiter for text files. Default: None (whitespace)
+        skiprows : int, optional
+            Number of header rows to skip. Default: 0
+        usecols : sequence, optional
+            Indices of the five columns in the file, in the order
+            given above. Default: the first five columns
+        dtype : list, optional
+            Structured dtype to parse rows into; use this to allow
+            longer level labels, for example.
+
+        Returns
+        -------
+        LineList
+
+        """
+        if filename.endswith('.npz'):
+            with np.load(filename) as data:
+                return cls(*[data[name] for name in _columns],
+                           presorted=True)
+        data = np.loadtxt(filename, dtype=dtype or _dtype,
+                          delimiter=delimiter, skiprows=skiprows,
+                          usecols=usecols or range(len(_columns)),
+                          ndmin=1)
+        return cls(*[data[name] for name in data.dtype.names])
+
+    def save(self, filename):
+        """Save the sorted columns to the .npz file filename."""
+        np.savez(filename, **dict(zip(_columns, self.columns)))
+
+    @property
+    def columns(self):
+        """Tuple of all columns in the order species, lower, upper,
+        wavenumber, strength.
+
+        """
+        return (self.species, self.lower, self.upper,
+                self.wavenumber, self.strength)
+
+    def __len__(self):
+        return len(self.wavenumber)
+
+    def __getitem__(self, key):
+        """Return a LineList of the selected lines. Slices give views
+        of the columns, index arrays and masks give copies.
+
+        """
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 or None)
+        columns = [column[key] for column in self.columns]
+        return LineList(*columns, presorted=True)
+
+    def positions(self, units='cm^-1', out=None):
+        """
+        Return the line positions converted to units.
+
+        Parameters
+        ----------
+        units : str, optional
+            Any units accepted by
+            :func:`mvdlib.quantum.transitions.convert`.
+        out : np.ndarray, optional
+            Array to store the result in.
+
+        """
+        return transitions.convert(self.wavenumber, 'cm^-1', units, out=out)
+
+    def _bounds(self, lo, hi, units):
+        """Return the index range of lines between lo and hi given in
+        units.
+
+        """
+        lo, hi = min(lo, hi), max(lo, hi)
+        if hi <= 0:
+            return 0, 0
+        # Line positions are positive; a window reaching zero or below
+        # would convert to inf or negative values in reciprocal units
+        # such as wavelengths, so clip it.
+        lo = max(lo, np.finfo(float).tiny)
+        with np.errstate(over='ignore', divide='ignore'):
+            bounds = transitions.convert(np.array([lo, hi], dtype=float),
+                                         units, 'cm^-1')
+        kmin, kmax = np.min(bounds), np.max(bounds)
+        start = np.searchsorted(self.wavenumber, kmin, side='left')
+        stop = np.searchsorted(self.wavenumber, kmax, side='right')
+        return start, stop
+
+    def between(self, lo, hi, units='cm^-1'):
+        """Return all lines with positions between lo and hi
+        (inclusive) given in units.
+
+        """
+        start, stop = self._bounds(lo, hi, units)
+        return self[start:stop]
+
+    def query(self, center, delta, units='cm^-1'):
+        """
+        Return all lines within +/- delta of center.
+
+        Both center and delta are given in units, so, e.g., a laser
+        frequency and a scan range can be used directly. The search
+        is a binary search on the sorted wavenumber column and the
+        result shares memory with this list.
+
+        Parameters
+        ----------
+        center : float
+            Center of the search window.
+        delta : float
+            Half width of the search window.
+        units : str, optional
+            Units of center and delta. Default: 'cm^-1'
+
+        Returns
+        -------
+        LineList
+
+        Examples
+        --------
+        >>> lines = LineList(['Ca+', 'Ca+'], ['4S1/2', '4S1/2'],
+        ...                  ['4P1/2', '4P3/2'], [25191.51, 25414.40],
+        ...                  [1., 1.])
+        >>> len(lines.query(755.2, 0.1, 'THz'))
+        1
+
+        """
+        delta = abs(delta)
+        return self.between(center - delta, center + delta, units)
+
+    def nearest(self, value, units='cm^-1'):
+        """Return the index of the line closest to value given in
+        units.
+
+        """
+        if len(self) == 0:
+            raise ValueError("The line list is empty.")
+        k = transitions.convert(value, units, 'cm^-1')
+        i = np.searchsorted(self.wavenumber, k)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self)]
+        return min(candidates, key=lambda j: abs(self.wavenumber[j] - k))
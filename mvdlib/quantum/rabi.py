@@ -4,9 +4,12 @@ from __future__ import division
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
-from .. import plot_settings
+from .. import plotutils
+from .. import profiling
+from ..plotutils.errorbar import fast_errorbar
 
 class RabiFlop(object):
+    @profiling.timed('RabiFlop.load')
     def __init__(self, datafile, **kwargs):
         """Rabi flopping plot object.
 
@@ -28,6 +31,7 @@ class RabiFlop(object):
 
         """
         delimiter = kwargs.get('delimiter', ',')
+        profiling.add_bytes('RabiFlop.load', datafile)
         data = np.loadtxt(datafile, delimiter=delimiter)
         self.t = data[:,0]
         self.P = data[:,1]
@@ -46,56 +50,82 @@ class RabiFlop(object):
     def _func(self, t, A, f, tau):
         return A*(0.5 - 0.5*np.sin(f*t + np.pi/2.)*np.exp(-t/tau))
 
+    @profiling.timed('RabiFlop.fit')
     def fit(self, f0, tau):
         """Fit the data using initial guess Rabi (angular) frequency
         f0 and decoherence time constant tau.
 
         """
         p0 = [1., f0, tau]
-        self.p, self.cov = curve_fit(self._func, self.t, self.P, p0)
+        self.p, self.cov = curve_fit(
+            profiling.counted('RabiFlop.fit', self._func), self.t, self.P, p0)
         self.rabi_frequency = self.p[1]
         return self.p, self.cov
             
-    def plot(self, outfile, **kwargs):
-        """Plot the data.
-
-        Parameters
-        ----------
-        outfile : str
-            Figure file to output.
+    def draw(self, ax, **kwargs):
+        """Draw the data onto the matplotlib Axes ax using only the
+        object-oriented API.
 
         Keyword arguments
         -----------------
-        style : str
-            String specifying the plot style to use. Default:
-            'default'
         show_fit : bool
             If True, plot with a fit. Default: True
+        threshold : int or None
+            Plot binned averages above this many points (see
+            :func:`mvdlib.plotutils.errorbar.fast_errorbar`).
+            Default: 10000
         points : int
             Number of points to use for the fit plotting for
             smoothing. Default: 500
-        show : bool
-            Show the plot upon completion. Default: False
 
         """
-        style = kwargs.get('style', 'default')
-        plot_settings.load_settings(style, show_info=False)
-        plt.figure()
-        plt.hold(True)
         if kwargs.get('show_fit', True):
             if self.use_errorbars:
-                plt.errorbar(self.t, self.P, self.err, fmt='o', mfc='b', mec='b')
+                fast_errorbar(ax, self.t, self.P, self.err, fmt='o',
+                              mfc='b', mec='b',
+                              threshold=kwargs.get('threshold', 10000))
             else:
-                plt.plot(self.t, self.P, fmt='o', mfc='b', mec='b')
+                ax.plot(self.t, self.P, 'o', mfc='b', mec='b')
             points = kwargs.get('points', 500)
             t_fit = np.linspace(self.t[0], self.t[-1], points)
-            plt.plot(t_fit, self._func(t_fit, *self.p), 'r-', lw=1.5)
+            ax.plot(t_fit, self._func(t_fit, *self.p), 'r-', lw=1.5)
         else:
-            plt.plot(self.t, self.P, 'o-', mfc='b', mec='b')
-        plt.xlabel(r'Pulse duration [$\mu$s]')
-        plt.ylabel('Excitation probability')
-        plt.savefig(outfile, bbox_inches='tight')
-        if kwargs.get('show', False):
-            plt.show()
-            
-        
\ No newline at end of file
+            ax.plot(self.t, self.P, 'o-', mfc='b', mec='b')
+        ax.set_xlabel(r'Pulse duration [$\mu$s]')
+        ax.set_ylabel('Excitation probability')
+
+    @profiling.timed('RabiFlop.plot')
+    def plot(self, outfile, **kwargs):
+        """Plot the data.
+
+        Parameters
+        ----------
+        outfile : str
+            Figure file to output.
+
+        Keyword arguments
+        -----------------
+        style : str
+            String specifying the plot style to use. It is only
+            applied to this figure. Default: 'default'
+        show : bool
+            Show the plot upon completion. Otherwise the figure is
+            closed after saving. Default: False
+
+        Other keyword arguments are passed to :meth:`draw`.
+
+        Returns
+        -------
+        fig : matplotlib.figure.Figure
+
+        """
+        style = kwargs.get('style', 'default')
+        with plotutils.style(style):
+            fig = plt.figure()
+            self.draw(fig.gca(), **kwargs)
+            fig.savefig(outfile, bbox_inches='tight')
+            if kwargs.get('show', False):
+                plt.show()
+            else:
+                plt.close(fig)
+        return fig
@@ -7,6 +7,9 @@ frequency. Yeah, this mostly just involves multiplying by c or 1/c,
 but sometimes factors of 2*pi are forgotten, so this helps prevent
 that from happening!
 
+Any pair of supported units can be converted with :func:`convert`;
+the named ``x_to_y`` functions are kept as shortcuts.
+
 TODO: Additional testing.
 
 """
@@ -14,15 +17,40 @@ TODO: Additional testing.
 from __future__ import print_function
 from __future__ import division
 import numpy as np
-from scipy.constants import h, c, physical_constants as consts
+from scipy.constants import h, c, pi, physical_constants as consts
 
 # Units
 # -----
 
 # Conversion factors from non-SI to SI
-_wl_units = {'angstrom': 1e-10, 'nm': 1e-9, 'um': 1e-6, 'm': 1.0}
+_wl_units = {'angstrom': 1e-10, 'angstroms': 1e-10, 'nm': 1e-9, 'um': 1e-6,
+             'm': 1.0}
+_k_units = {'cm^-1': 1e2, '1/cm': 1e2, 'm^-1': 1.0}
 _f_units = {'Hz': 1.0, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9, 'THz': 1e12}
-_E_units = {'eV': consts['electron volt'][0], 'J': 1.0}
+_w_units = {'rad/s': 1.0, 'krad/s': 1e3, 'Mrad/s': 1e6, 'Grad/s': 1e9,
+            'Trad/s': 1e12}
+_eV = consts['electron volt'][0]
+_E_units = {'eV': _eV, 'meV': 1e-3*_eV, 'J': 1.0}
+
+# Every unit expressed as its SI energy equivalent. A unit maps to
+# (measure, a, reciprocal) such that E = a*value if not reciprocal
+# and E = a/value otherwise (i.e., for wavelengths).
+_units = {}
+for _name, _factor in _wl_units.items():
+    _units[_name] = ('wl', h*c/_factor, True)
+for _name, _factor in _k_units.items():
+    _units[_name] = ('k', h*c*_factor, False)
+for _name, _factor in _f_units.items():
+    _units[_name] = ('f', h*_factor, False)
+for _name, _factor in _w_units.items():
+    _units[_name] = ('w', h*_factor/(2*pi), False)
+for _name, _factor in _E_units.items():
+    _units[_name] = ('E', _factor, False)
+del _name, _factor
+
+# Resolved conversions, keyed on (from_units, to_units, from_measure,
+# to_measure).
+_conversions = {}
 
 # TODO: Eventually I'll make this into its own class.
 UnitsError = ValueError
@@ -39,18 +67,187 @@ def _units_err_msg(measure):
     if measure == 'wl':
         units = _wl_units
         name = "Wavelength"
+    elif measure == 'k':
+        units = _k_units
+        name = "Wavenumber"
     elif measure == 'f':
         units = _f_units
         name = "Frequency"
+    elif measure == 'w':
+        units = _w_units
+        name = "Angular frequency"
     elif measure == 'E':
         units = _E_units
         name = "Energy"
-    return name + "must be one of: " + str(units.keys())
+    else:
+        return "units must be one of: " + str(sorted(_units.keys()))
+    return name + " units must be one of: " + str(sorted(units.keys()))
+
+# Conversion
+# ----------
+
+def _lookup(units, measure):
+    """Return the (a, reciprocal) pair for units, optionally
+    requiring them to describe the given measure.
+
+    """
+    try:
+        unit_measure, a, reciprocal = _units[units]
+    except (KeyError, TypeError):
+        raise UnitsError(_units_err_msg(measure))
+    if measure is not None and unit_measure != measure:
+        raise UnitsError(_units_err_msg(measure))
+    return a, reciprocal
+
+def _resolve(from_units, to_units, from_measure=None, to_measure=None):
+    """
+    Resolve a pair of units into a single operation ``(scale,
+    reciprocal)`` such that the conversion is ``scale*values`` or
+    ``scale/values``, respectively. Results are cached so that unit
+    lookups and validation only happen the first time a given pair is
+    used.
+
+    """
+    key = (from_units, to_units, from_measure, to_measure)
+    try:
+        return _conversions[key]
+    except KeyError:
+        pass
+    a1, r1 = _lookup(from_units, from_measure)
+    a2, r2 = _lookup(to_units, to_measure)
+    if r2:
+        scale = a2/a1
+    else:
+        scale = a1/a2
+    op = (scale, r1 != r2)
+    _conversions[key] = op
+    return op
+
+def _apply(values, op, out=None, inplace=False):
+    """
+    Apply a resolved conversion in a single vectorized pass. The input
+    is never modified unless inplace is True, in which case it must be
+    a floating point array.
+
+    """
+    if inplace:
+        if out is not None:
+            raise ValueError("out and inplace are mutually exclusive.")
+        if not (isinstance(values, np.ndarray) and values.dtype.kind in 'fc'):
+            raise TypeError("inplace requires a floating point array.")
+        out = values
+    elif out is not None and not isinstance(out, np.ndarray):
+        raise TypeError("out must be a numpy array.")
+    scale, reciprocal = op
+    if reciprocal:
+        return np.divide(scale, values, out=out)
+    else:
+        return np.multiply(values, scale, out=out)
+
+def convert(values, from_units, to_units, out=None, inplace=False):
+    """
+    Convert between any of wavenumber, wavelength, frequency, angular
+    frequency, and energy units.
+
+    Each pair of units is resolved once into either a scaling or a
+    scaled reciprocal which is then applied in a single vectorized
+    pass, so converting large line lists is limited only by memory
+    bandwidth.
+
+    Parameters
+    ----------
+    values : float or array-like
+        The values to convert.
+    from_units : str
+        Units the values are given in, e.g., 'cm^-1', 'nm', 'THz',
+        'Mrad/s', or 'eV'.
+    to_units : str
+        Units to convert to.
+    out : np.ndarray, optional
+        Array to store the result in. Must have a shape that the
+        inputs broadcast to.
+    inplace : bool, optional
+        If True, overwrite ``values`` (which must be a floating point
+        array) with the result instead of allocating a new array.
+
+    Returns
+    -------
+    float or np.ndarray
+        The converted values (``out`` or ``values`` if either is used
+        for storage).
+
+    See Also
+    --------
+    Conversion
+
+    Examples
+    --------
+    >>> convert(25191.51, 'cm^-1', 'nm')  # doctest: +ELLIPSIS
+    396.9...
+
+    """
+    return _apply(values, _resolve(from_units, to_units), out, inplace)
+
+class Conversion(object):
+    """
+    A resolved conversion between two units.
+
+    Calling the object converts values exactly like :func:`convert`.
+    For converting large data sets (e.g., memory mapped line lists)
+    block by block, :meth:`blocks` writes each converted block into a
+    scratch buffer which is allocated once and reused, so peak memory
+    does not depend on the size of the input.
+
+    Parameters
+    ----------
+    from_units : str
+        Units to convert from.
+    to_units : str
+        Units to convert to.
+
+    """
+    def __init__(self, from_units, to_units):
+        self.from_units = from_units
+        self.to_units = to_units
+        self._op = _resolve(from_units, to_units)
+        self._scratch = None
+
+    def __call__(self, values, out=None, inplace=False):
+        return _apply(values, self._op, out, inplace)
+
+    def scratch(self, shape, dtype=float):
+        """
+        Return a scratch array of the given shape and dtype. The
+        underlying buffer is only reallocated when it is too small or
+        of the wrong type, so repeated calls return views of the same
+        memory.
+
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape))
+        if (self._scratch is None or self._scratch.dtype != dtype
+            or self._scratch.size < size):
+            self._scratch = np.empty(size, dtype=dtype)
+        return self._scratch[:size].reshape(shape)
+
+    def blocks(self, values, blocksize=2**20):
+        """
+        Iterate over converted blocks of at most blocksize values
+        along the first axis. Each yielded array is a view of the
+        scratch buffer and is only valid until the next iteration;
+        copy it if it needs to be kept.
+
+        """
+        values = np.asanyarray(values)
+        for start in range(0, len(values), blocksize):
+            block = values[start:start + blocksize]
+            yield self(block, out=self.scratch(block.shape))
 
 # Functions
 # ---------
 
-def wavenumber_to_frequency(wavenumber, f_units="THz"):
+def wavenumber_to_frequency(wavenumber, f_units="THz",
+                            out=None, inplace=False):
     """
     Convert the wavenumber in inverse cm to frequency.
 
@@ -58,6 +255,10 @@ def wavenumber_to_frequency(wavenumber, f_units="THz"):
     ----------
     wavenumber : float
         The wavenumber in inverse cm to convert.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``wavenumber`` with the result.
 
     Returns
     -------
@@ -70,14 +271,11 @@ def wavenumber_to_frequency(wavenumber, f_units="THz"):
     frequency_to_wavenumber
 
     """
-    f_SI = c*wavenumber*1e2
-    try:
-        f = f_SI/_f_units[f_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('f'))
-    return f
+    return _apply(wavenumber, _resolve('cm^-1', f_units, 'k', 'f'),
+                  out, inplace)
 
-def wavenumber_to_wavelength(wavenumber, wl_units="nm"):
+def wavenumber_to_wavelength(wavenumber, wl_units="nm",
+                             out=None, inplace=False):
     """
     Convert the wavenumber in inverse cm to wavelength.
 
@@ -87,6 +285,10 @@ def wavenumber_to_wavelength(wavenumber, wl_units="nm"):
         The wavenumber to convert.
     wl_units : str, optional
         Desired units for the resulting wavelength.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``wavenumber`` with the result.
 
     Returns
     -------
@@ -98,17 +300,10 @@ def wavenumber_to_wavelength(wavenumber, wl_units="nm"):
     wavenumber_to_frequency
 
     """
-    lmbda = 1/wavenumber
-    if wl_units == "nm":
-        return lmbda*1e7
-    elif wl_units == "um":
-        return lmbda*1e4
-    elif wl_units == "angstroms":
-        return lmbda*1e8
-    else:
-        raise ValueError("wl_units must be nm, um, or angstroms.")
+    return _apply(wavenumber, _resolve('cm^-1', wl_units, 'k', 'wl'),
+                  out, inplace)
 
-def frequency_to_wavenumber(freq, f_units='Hz'):
+def frequency_to_wavenumber(freq, f_units='Hz', out=None, inplace=False):
     """
     Convert the frequency freq into a wavenumber.
 
@@ -116,6 +311,10 @@ def frequency_to_wavenumber(freq, f_units='Hz'):
     ----------
     freq : float
         The frequency to convert.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``freq`` with the result.
 
     Returns
     -------
@@ -128,11 +327,10 @@ def frequency_to_wavenumber(freq, f_units='Hz'):
     wavenumber_to_frequency
 
     """
-    freq *= _f_units[f_units]
-    wavenumber = 1e-2*freq/c
-    return wavenumber
+    return _apply(freq, _resolve(f_units, 'cm^-1', 'f', 'k'), out, inplace)
 
-def frequency_to_wavelength(freq, f_units="THz", wl_units="nm"):
+def frequency_to_wavelength(freq, f_units="THz", wl_units="nm",
+                            out=None, inplace=False):
     """
     Convert the frequency freq to wavelength.
 
@@ -142,6 +340,10 @@ def frequency_to_wavelength(freq, f_units="THz", wl_units="nm"):
         The frequency to convert.
     wl_units : str, optional
         Units the wavelength is given in.    
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``freq`` with the result.
 
     Returns
     -------
@@ -149,18 +351,10 @@ def frequency_to_wavelength(freq, f_units="THz", wl_units="nm"):
         The calculated wavelength.
 
     """
-    try:
-        f_SI = freq*_f_units[f_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('f'))
-    lmbda_SI = c/f_SI
-    try:
-        lmbda = lmbda_SI/_wl_units[wl_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('wl'))
-    return lmbda
+    return _apply(freq, _resolve(f_units, wl_units, 'f', 'wl'), out, inplace)
 
-def frequency_to_energy(freq, f_units="THz", E_units="eV"):
+def frequency_to_energy(freq, f_units="THz", E_units="eV",
+                        out=None, inplace=False):
     """
     Convert a frequency to an energy.
 
@@ -172,6 +366,10 @@ def frequency_to_energy(freq, f_units="THz", E_units="eV"):
         Units the frequency is given in.
     E_units : str, optional
         Units for the returned energy value.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``freq`` with the result.
 
     Returns
     -------
@@ -179,18 +377,10 @@ def frequency_to_energy(freq, f_units="THz", E_units="eV"):
         The energy corresponding to the given wavelength.
 
     """
-    try:
-        f_SI = freq*_f_units[f_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('f'))
-    E_SI = h*f_SI
-    try:
-        E = E_SI/_E_units[E_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('E'))
-    return E
+    return _apply(freq, _resolve(f_units, E_units, 'f', 'E'), out, inplace)
 
-def wavelength_to_frequency(wl, wl_units="nm", f_units="THz"):
+def wavelength_to_frequency(wl, wl_units="nm", f_units="THz",
+                            out=None, inplace=False):
     """
     Convert a wavelength to frequency.
 
@@ -202,6 +392,10 @@ def wavelength_to_frequency(wl, wl_units="nm", f_units="THz"):
         Units the wavelength is given in.
     f_units : str, optional
         Units for the returned frequency value.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``wl`` with the result.
 
     Returns
     -------
@@ -209,19 +403,11 @@ def wavelength_to_frequency(wl, wl_units="nm", f_units="THz"):
         The frequency corresponding to the given wavelength.
 
     """
-    try:
-        wl_SI = wl*_wl_units[wl_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('wl'))
-    f_SI = c/wl_SI
-    try:
-        f = f_SI/_f_units[f_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('f'))
-    return f
+    return _apply(wl, _resolve(wl_units, f_units, 'wl', 'f'), out, inplace)
 
 
-def wavelength_to_energy(wl, wl_units="nm", E_units="eV"):
+def wavelength_to_energy(wl, wl_units="nm", E_units="eV",
+                         out=None, inplace=False):
     """
     Convert a wavelength to energy.
 
@@ -233,6 +419,10 @@ def wavelength_to_energy(wl, wl_units="nm", E_units="eV"):
         Units the wavelength is given in.
     E_units : str, optional
         Units for the returned energy value.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``wl`` with the result.
 
     Returns
     -------
@@ -240,17 +430,10 @@ def wavelength_to_energy(wl, wl_units="nm", E_units="eV"):
         The energy corresponding to the given wavelength.
 
     """
-    try:
-        E_SI = h*c/(wl*_wl_units[wl_units])
-    except KeyError:
-        raise UnitsError(_units_err_msg('wl'))
-    try:
-        E = E_SI/_E_units[E_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('E'))
-    return E
+    return _apply(wl, _resolve(wl_units, E_units, 'wl', 'E'), out, inplace)
 
-def energy_to_frequency(E, E_units="eV", f_units="THz"):
+def energy_to_frequency(E, E_units="eV", f_units="THz",
+                        out=None, inplace=False):
     """
     Convert energy to frequency.
 
@@ -262,6 +445,10 @@ def energy_to_frequency(E, E_units="eV", f_units="THz"):
         Units the energy is given in.
     f_units : str, optional
         Units for the returned frequency value.
+    out : np.ndarray, optional
+        Array to store the result in.
+    inplace : bool, optional
+        If True, overwrite ``E`` with the result.
 
     Returns
     -------
@@ -269,16 +456,7 @@ def energy_to_frequency(E, E_units="eV", f_units="THz"):
         The frequency corresponding to the given energy.
 
     """
-    try:
-        E_SI = E*_E_units[E_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('E'))
-    f_SI = E_SI/h
-    try:
-        f = f_SI/_f_units[f_units]
-    except KeyError:
-        raise UnitsError(_units_err_msg('f'))
-    return f
+    return _apply(E, _resolve(E_units, f_units, 'E', 'f'), out, inplace)
 
 if __name__ == "__main__":
     wavenum = 25191.51 # wavenumber in 1/cm for Ca+ 397 nm transition
@@ -7,6 +7,7 @@ setup(
     packages=(
         'mvdlib',
         'mvdlib.analysis',
+        'mvdlib.oceanoptics',
         'mvdlib.optics',
         'mvdlib.plot_settings',
         'mvdlib.plotutils',
@@ -0,0 +1,402 @@
+import os
+import sys
+import tempfile
+import pytest
+sys.path.insert(0, '..')
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from mvdlib.analysis import decimate
+from mvdlib.analysis.plot import Plotter
+
+t = np.linspace(0, 1, 100003)
+trace = np.sin(2*np.pi*50*t) + np.random.RandomState(0).normal(0, 0.1, len(t))
+
+def test_minmax_envelope():
+    x, y = decimate.minmax_envelope(t, trace, 500)
+    assert len(x) <= 2*501
+    assert np.all(np.diff(x) >= 0)
+    assert y.min() == trace.min() and y.max() == trace.max()
+    # short traces are left alone
+    x, y = decimate.minmax_envelope(t[:100], trace[:100], 500)
+    assert len(x) == 100
+
+def test_plotter_decimates():
+    datadir = tempfile.mkdtemp()
+    np.savetxt(os.path.join(datadir, 'trace_0001.dat'),
+               np.column_stack([t, trace]), header='t y')
+    plotter = Plotter(datadir, 'trace_')
+    plotter.add_data(1)
+    plotter.plot(decimate=400)
+    line = plt.gca().get_lines()[0]
+    assert len(line.get_xdata()) <= 2*401
+    plt.close('all')
+    assert os.path.getsize(os.path.join(datadir, 'last.svg')) < 500000
+
+def test_render_batch_rabi():
+    from mvdlib.quantum.rabi import RabiFlop
+    from mvdlib.plotutils.batch import RenderJob, render_batch
+    outdir = tempfile.mkdtemp()
+    tt = np.linspace(0, 10, 40)
+    P = 50 - 50*np.cos(2*tt)*np.exp(-tt/20)
+    datafile = os.path.join(outdir, 'rabi.csv')
+    np.savetxt(datafile, np.column_stack([tt, P, np.full(len(tt), 2.)]),
+               delimiter=',')
+    rabi = RabiFlop(datafile)
+    rabi.fit(2., 20.)
+    datadir = tempfile.mkdtemp()
+    np.savetxt(os.path.join(datadir, 'trace_0001.dat'),
+               np.column_stack([t, trace]), header='t y')
+    plotter = Plotter(datadir, 'trace_')
+    plotter.add_data(1)
+    # Drawing fills the plotter's decimation cache, which must not keep
+    # it from being sent to worker processes
+    plotter.plot(outfile=os.path.join(outdir, 'first.svg'))
+    jobs = [RenderJob(rabi, os.path.join(outdir, 'rabi.png'), 'default'),
+            RenderJob(plotter, os.path.join(outdir, 'trace.pdf'), 'web',
+                      {'xlabel': 't'})]
+    for filename in render_batch(jobs, processes=2):
+        assert os.path.getsize(filename) > 0
+    assert not os.path.exists(os.path.join(datadir, 'last.svg'))
+
+def _combined(n=3):
+    from mvdlib.analysis.combine import Combiner
+    datadir = tempfile.mkdtemp()
+    x = np.linspace(0, 1, 20)
+    for i in range(1, n + 1):
+        np.savetxt(os.path.join(datadir, 'data_%04d.dat' % i),
+                   np.column_stack([x, np.pi*x + i]))
+    combiner = Combiner(datadir, 'data_')
+    combiner.combine(range(1, n + 1))
+    return combiner
+
+def test_combiner_write_formats():
+    import json
+    combiner = _combined()
+    outdir = tempfile.mkdtemp()
+    # csv keeps its old layout
+    csv = combiner.write(outdir, 'notes', ['t', 'P', 'err'])
+    assert csv.endswith('data__combined_0001.csv')
+    assert open(csv).readline() == '# t,P,err\n'
+    assert os.path.exists(csv[:-4] + '.README.txt')
+    # numpy, memory mapped with named columns at full precision
+    npy = combiner.write(outdir, 'notes', ['t', 'P', 'err'], format='npy')
+    table = np.load(npy, mmap_mode='r')
+    assert np.array_equal(table['P'], combiner.ydata)
+    npz = np.load(combiner.write(outdir, 'notes', format='npz'))
+    assert np.array_equal(npz['yerr'], combiner.yerr)
+    metadata = json.loads(str(npz['metadata']))
+    assert metadata['indices'] == [1, 2, 3]
+    assert metadata['readme'] == 'notes'
+    # each output has its own number and README, whatever its format
+    names = sorted(os.listdir(outdir))
+    assert names == ['data__combined_' + name for name in
+                     ['0001.README.txt', '0001.csv',
+                      '0002.README.txt', '0002.json', '0002.npy',
+                      '0003.README.txt', '0003.npz']]
+
+def test_combiner_write_failure():
+    combiner = _combined()
+    outdir = tempfile.mkdtemp()
+    # metadata that cannot be serialized fails while writing the sidecar
+    try:
+        combiner.write(outdir, object(), format='npy')
+    except TypeError:
+        pass
+    else:
+        assert False, "write did not fail"
+    assert os.listdir(outdir) == []
+
+def test_combiner_write_optional_formats():
+    import json
+    from mvdlib.analysis import combine
+    combiner = _combined()
+    outdir = tempfile.mkdtemp()
+    if combine.h5py is not None:
+        with combine.h5py.File(combiner.write(outdir, format='hdf5'), 'r') as f:
+            assert np.array_equal(f['y'][:], combiner.ydata)
+            assert json.loads(f.attrs['metadata'])['prefix'] == 'data_'
+    if combine.pyarrow is not None:
+        table = combine.pyarrow.parquet.read_table(
+            combiner.write(outdir, format='parquet'))
+        assert np.array_equal(table.column('y').to_pylist(), combiner.ydata)
+        assert 'mvdlib' in table.schema.metadata
+
+def test_allocate_filename():
+    from mvdlib.analysis.combine import allocate_filename
+    outdir = tempfile.mkdtemp()
+    names = [allocate_filename(outdir, 'run_', 'csv') for i in range(3)]
+    assert [os.path.basename(n) for n in names] == \
+        ['run_0001.csv', 'run_0002.csv', 'run_0003.csv']
+    os.remove(names[0])
+    # numbering continues after the largest existing number
+    assert allocate_filename(outdir, 'run_', 'csv').endswith('run_0004.csv')
+    # numbers are shared by all extensions
+    assert allocate_filename(outdir, 'run_', 'npy').endswith('run_0005.npy')
+    assert allocate_filename(outdir, 'run_', 'csv',
+                             lock='lock').endswith('run_0006.csv')
+    assert os.path.exists(os.path.join(outdir, 'run_0006.lock'))
+
+def test_resample_indices():
+    from mvdlib.analysis import resample
+    idx = resample.jackknife_indices(4)
+    assert idx.tolist() == [[1, 2, 3], [0, 2, 3], [0, 1, 3], [0, 1, 2]]
+    idx = resample.bootstrap_indices(5, 7, seed=0)
+    assert idx.shape == (7, 5) and idx.min() >= 0 and idx.max() < 5
+
+def test_bootstrap_and_jackknife():
+    from mvdlib.analysis import resample
+    random = np.random.RandomState(2)
+    stack = random.normal(0, 1., (25, 40))
+    boot = resample.bootstrap(stack, resamples=2000, seed=0)
+    assert np.allclose(boot.value, stack.mean(axis=0))
+    assert boot.replicates.shape == (2000, 40)
+    # the bootstrap error of the mean approaches std/sqrt(n)
+    sem = stack.std(axis=0)/np.sqrt(25)
+    assert np.allclose(boot.error, sem, rtol=0.15)
+    assert (boot.interval[0] < boot.value).all()
+    assert (boot.interval[1] > boot.value).all()
+    # the vectorized mean agrees with explicit resampling
+    slow = resample.bootstrap(stack, lambda d: d.mean(axis=-2),
+                              resamples=2000, seed=0)
+    assert np.allclose(slow.replicates, boot.replicates)
+    # the jackknife error of the mean is exactly the standard error
+    jack = resample.jackknife(stack)
+    assert np.allclose(jack.error, stack.std(axis=0, ddof=1)/np.sqrt(25))
+    jack2 = resample.jackknife(stack, lambda d: d.mean(axis=-2))
+    assert np.allclose(jack2.replicates, jack.replicates)
+    median = resample.bootstrap(stack, lambda d: np.median(d, axis=-2),
+                                resamples=200, seed=1, chunksize=30)
+    assert median.replicates.shape == (200, 40)
+
+def _line(x, a, b):
+    return a*x + b
+
+def test_resample_fit():
+    from mvdlib.analysis import resample
+    combiner = _combined(12)
+    x = combiner.xdata
+    # slope pi, offsets 1..12
+    boot = resample.bootstrap_fit(x, combiner.ystack, _line, [1., 0.],
+                                  resamples=200, seed=0, processes=2)
+    assert np.allclose(boot.value, [np.pi, 6.5])
+    assert np.allclose(boot.error[0], 0, atol=1e-6)
+    assert abs(boot.error[1] - np.std(np.arange(1, 13))/np.sqrt(12)) < 0.3
+    jack = resample.jackknife_fit(x, combiner.ystack, _line, [1., 0.],
+                                  processes=1)
+    assert np.allclose(jack.error[1], np.std(np.arange(1, 13), ddof=1)
+                       / np.sqrt(12))
+    assert np.allclose(combiner.jackknife().error,
+                       np.std(np.arange(1, 13), ddof=1)/np.sqrt(12))
+
+def test_combine_methods():
+    from mvdlib.analysis.combine import Combiner, CombinationError
+    datadir = tempfile.mkdtemp()
+    x = np.linspace(0, 1, 5)
+    random = np.random.RandomState(0)
+    ys = random.normal(1., 0.1, (10, 5))
+    errs = np.full((10, 5), 0.1)
+    ys[3, 2] = 50.
+    errs[0] = 0.05
+    errs[4, 1] = 0.
+    for i in range(10):
+        np.savetxt(os.path.join(datadir, 'shot_%04d.dat' % (i + 1)),
+                   np.column_stack([x, ys[i], errs[i]]))
+    combiner = Combiner(datadir, 'shot_')
+    indices = range(1, 11)
+    _, y, err = combiner.combine(indices)
+    assert np.allclose(y, ys.mean(axis=0))
+    assert np.allclose(err, ys.std(axis=0))
+    # inverse-variance weights, ignoring the zero error
+    _, y, err = combiner.combine(indices, method='weighted')
+    w = 1/np.where(errs > 0, errs, 1)**2
+    w[4, 1] = 0
+    assert np.allclose(y, (w*ys).sum(axis=0)/w.sum(axis=0))
+    assert np.allclose(err, 1/np.sqrt(w.sum(axis=0)))
+    # the bad shot is rejected by clipping
+    _, y, err = combiner.combine(indices, method='clip')
+    assert combiner.ymask[3, 2] and combiner.ymask.sum() == 1
+    good = np.delete(ys[:, 2], 3)
+    assert np.allclose(y[2], good.mean()) and np.allclose(err[2], good.std())
+    _, y, err = combiner.combine(indices, method='median')
+    assert np.allclose(y, np.median(ys, axis=0))
+    assert abs(y[2] - 1) < 0.1 and err[2] < 0.3
+    # weighting needs an error column
+    two = tempfile.mkdtemp()
+    np.savetxt(os.path.join(two, 'shot_0001.dat'), np.column_stack([x, x]))
+    with pytest.raises(CombinationError):
+        Combiner(two, 'shot_').combine([1], method='weighted')
+    with pytest.raises(ValueError):
+        combiner.combine(indices, method='mode')
+
+def test_dataset_index():
+    from mvdlib.analysis.index import DatasetIndex
+    from mvdlib.analysis.combine import Combiner
+    datadir = tempfile.mkdtemp()
+    x = np.linspace(0, 1, 10)
+    for i in [1, 2, 3, 5, 12]:
+        np.savetxt(os.path.join(datadir, 'scan_%04d.dat' % i),
+                   np.column_stack([x, x + i]), header='x y')
+    open(os.path.join(datadir, 'scan_notes.dat'), 'w').close()
+    os.mkdir(os.path.join(datadir, 'scan_0099.dat'))
+    index = DatasetIndex(datadir, 'scan_')
+    assert index.indices == [1, 2, 3, 5, 12] and 4 not in index
+    assert [f.index for f in index.select(start=2, stop=5)] == [2, 3, 5]
+    assert [f.index for f in index.select('scan_000*')] == [1, 2, 3, 5]
+    assert [f.index for f in index.select([5, 4, 1], skip_missing=True)] \
+        == [5, 1]
+    with pytest.raises(IOError):
+        index.select([4])
+    assert index[12].size == os.path.getsize(index[12].path)
+    # files created after the scan are only seen after a refresh
+    np.savetxt(os.path.join(datadir, 'scan_0004.dat'),
+               np.column_stack([x, x + 4]), header='x y')
+    assert 4 not in index
+    index.refresh()
+    assert 4 in index
+    with open(index[1].path, 'a') as out:
+        out.write('1 1\n')
+    assert index[1].changed() and not index[2].changed()
+    assert [f.index for f in index.select(stop=3, skip_changed=True)] \
+        == [2, 3]
+    # Combiner and Plotter
+    combiner = Combiner(datadir, 'scan_', skiprows=1)
+    _, y, _ = combiner.combine(range(2, 7), skip_missing=True)
+    assert combiner.indeces == [2, 3, 4, 5]
+    assert np.allclose(y, x + 3.5)
+    combiner.combine('scan_001*')
+    assert combiner.indeces == [12]
+    with pytest.raises(IOError):
+        combiner.combine([6])
+    plotter = Plotter(datadir, 'scan_')
+    plotter.add_data('scan_000[23].dat')
+    plotter.add_data([3, 7], skip_missing=True, legend=['three'])
+    assert plotter.legend == ['scan_0002.dat', 'scan_0003.dat', 'three']
+
+def test_multicolumn():
+    from mvdlib.analysis.combine import Combiner
+    from mvdlib.analysis.columns import header_names
+    datadir = tempfile.mkdtemp()
+    t = np.linspace(0, 1, 8)
+    names = ['t'] + ['ch%d' % c for c in range(12)]
+    for i in range(1, 4):
+        np.savetxt(os.path.join(datadir, 'det_%04d.dat' % i),
+                   np.column_stack([t] + [t*c + i for c in range(12)]),
+                   header=' '.join(names))
+    fname = os.path.join(datadir, 'det_0001.dat')
+    assert header_names(fname) == names
+    assert header_names(fname, skiprows=1) == names
+    combiner = Combiner(datadir, 'det_')
+    x, y, _ = combiner.combine([1, 2, 3], y='ch5')
+    assert combiner.columns == names
+    assert np.allclose(x, t) and np.allclose(y, 5*t + 2)
+    data = combiner.data
+    assert data.shape == (3, 8, 13)
+    # further channels reuse the loaded files and are views of them
+    _, y, _ = combiner.combine([1, 2, 3], y=12)
+    assert combiner.data is data and np.allclose(y, 11*t + 2)
+    assert combiner.ystack.base is data
+    assert np.may_share_memory(combiner.column('ch0'), data)
+    with pytest.raises(KeyError):
+        combiner.combine([1, 2, 3], y='ch99')
+    plotter = Plotter(datadir, 'det_')
+    plotter.add_data([1, 2], y=['ch1', 'ch2'], legend=['a', 'b'])
+    assert plotter.legend == ['a ch1', 'a ch2', 'b ch1', 'b ch2']
+    assert np.allclose(plotter.y[3], t*2 + 2)
+    assert plotter.y[0].base is plotter.y[1].base
+    fig = plt.figure()
+    plotter.draw(fig.gca())
+    plt.close(fig)
+
+def test_combiner_write_metadata():
+    import json
+    from mvdlib.analysis import combine
+    combiner = _combined()
+    outdir = tempfile.mkdtemp()
+    readers = {
+        'npy': lambda f: json.load(open(os.path.splitext(f)[0] + '.json')),
+        'npz': lambda f: json.loads(str(np.load(f)['metadata'])),
+    }
+    if combine.h5py is not None:
+        readers['hdf5'] = lambda f: json.loads(
+            combine.h5py.File(f, 'r').attrs['metadata'])
+    if combine.pyarrow is not None:
+        readers['parquet'] = lambda f: json.loads(
+            combine.pyarrow.parquet.read_table(f).schema.metadata['mvdlib'])
+    for format, read in sorted(readers.items()):
+        metadata = read(combiner.write(outdir, 'notes', format=format))
+        assert metadata['prefix'] == 'data_', format
+        assert metadata['indices'] == [1, 2, 3], format
+        assert metadata['readme'] == 'notes', format
+
+def test_resample_combine_methods():
+    from mvdlib.analysis import resample
+    from mvdlib.analysis.combine import Combiner
+    datadir = tempfile.mkdtemp()
+    x = np.linspace(0, 1, 6)
+    random = np.random.RandomState(3)
+    ys = random.normal(1., 0.1, (15, 6))
+    ys[4] = 30.
+    errs = random.uniform(0.05, 0.5, (15, 6))
+    errs[4] = 50.
+    for i in range(15):
+        np.savetxt(os.path.join(datadir, 'shot_%04d.dat' % (i + 1)),
+                   np.column_stack([x, ys[i], errs[i]]))
+    combiner = Combiner(datadir, 'shot_')
+    indices = range(1, 16)
+    plain = resample.jackknife(ys)
+    for method in ['weighted', 'clip', 'median']:
+        combiner.combine(indices, method=method)
+        boot = combiner.bootstrap(resamples=300, seed=0)
+        jack = combiner.jackknife()
+        assert np.allclose(boot.value, combiner.ydata), method
+        assert np.allclose(jack.value, combiner.ydata), method
+        assert boot.replicates.shape == (300, 6)
+        # robust estimates do not see the spread of the bad shot
+        assert (jack.error < plain.error).all(), method
+    # the weighted replicates resample errors together with the data
+    combiner.combine(indices, method='weighted')
+    w = 1/errs**2
+    keep = np.arange(1, 15)
+    assert np.allclose(combiner.jackknife().replicates[0],
+                       (w[keep]*ys[keep]).sum(axis=0)/w[keep].sum(axis=0))
+
+def test_decimation_cache_replaced_trace():
+    datadir = tempfile.mkdtemp()
+    np.savetxt(os.path.join(datadir, 'trace_0001.dat'),
+               np.column_stack([t, trace]), header='t y')
+    plotter = Plotter(datadir, 'trace_')
+    plotter.add_data(1)
+    fig = plt.figure()
+    plotter.draw(fig.gca(), decimate=100)
+    plotter.y[0] = plotter.y[0] + 10
+    ax = fig.add_subplot(111, label='redraw')
+    plotter.draw(ax, decimate=100)
+    assert np.isclose(ax.get_lines()[0].get_ydata().max(), trace.max() + 10)
+    # entries go away with their arrays
+    del plotter.x[:], plotter.y[:]
+    import gc
+    gc.collect()
+    assert len(plotter._decimated._cache) == 0
+    plt.close(fig)
+
+def test_plot_closes_figures():
+    from mvdlib.quantum.rabi import RabiFlop
+    outdir = tempfile.mkdtemp()
+    np.savetxt(os.path.join(outdir, 'trace_0001.dat'),
+               np.column_stack([t, trace]), header='t y')
+    tt = np.linspace(0, 10, 40)
+    datafile = os.path.join(outdir, 'rabi.csv')
+    np.savetxt(datafile, np.column_stack([tt, 50 - 50*np.cos(2*tt),
+                                          np.full(len(tt), 2.)]),
+               delimiter=',')
+    plt.close('all')
+    plotter = Plotter(outdir, 'trace_')
+    plotter.add_data(1)
+    rabi = RabiFlop(datafile)
+    for i in range(3):
+        fig = plotter.plot(outfile=os.path.join(outdir, 'p.png'), show=False)
+        assert len(fig.axes[0].get_lines()) == 1
+        rabi.plot(os.path.join(outdir, 'r.png'), show_fit=False)
+    assert plt.get_fignums() == []
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+sys.path.insert(0, '..')
+import numpy as np
+from mvdlib.quantum import transitions
+from mvdlib.quantum.linelist import LineList
+
+def make_lines(n=1000):
+    rs = np.random.RandomState(0)
+    k = rs.uniform(10000., 30000., n)
+    species = np.array(['Ca+']*n)
+    levels = np.array(['L%d' % i for i in range(n)])
+    return LineList(species, levels, levels, k, rs.uniform(size=n))
+
+def test_sorted():
+    lines = make_lines()
+    assert np.all(np.diff(lines.wavenumber) >= 0)
+    # labels follow their lines
+    assert len(set(lines.lower)) == len(lines)
+
+def test_query_any_units():
+    lines = make_lines()
+    k0, dk = 20000., 50.
+    expected = lines.wavenumber[np.abs(lines.wavenumber - k0) <= dk]
+    assert np.all(lines.query(k0, dk).wavenumber == expected)
+    # same window expressed as a wavelength range
+    wl = transitions.convert(np.array([k0 - dk, k0 + dk]), 'cm^-1', 'nm')
+    res = lines.between(wl[0], wl[1], 'nm')
+    assert np.allclose(res.wavenumber, expected)
+    assert np.allclose(res.positions('nm'),
+                       transitions.convert(expected, 'cm^-1', 'nm'))
+
+def test_save_load():
+    lines = make_lines(10)
+    fname = os.path.join(tempfile.mkdtemp(), 'lines.npz')
+    lines.save(fname)
+    loaded = LineList.load(fname)
+    for a, b in zip(lines.columns, loaded.columns):
+        assert np.all(a == b)
+
+def test_query_window_reaching_zero():
+    import warnings
+    lines = make_lines()
+    # all lines with wavelengths up to 500 nm (20000 cm^-1 and above)
+    expected = lines.wavenumber[lines.wavenumber >= 20000.]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        for lo in (0., -100.):
+            assert np.allclose(lines.between(lo, 500., 'nm').wavenumber,
+                               expected)
+        assert np.allclose(lines.query(300., 300., 'nm').wavenumber,
+                           lines.wavenumber[lines.wavenumber >= 1e7/600.])
+        # frequencies are proportional to wavenumbers
+        below = lines.wavenumber[lines.wavenumber <= 15000.]
+        k = transitions.convert(15000., 'cm^-1', 'THz')
+        assert np.allclose(lines.query(0., k, 'THz').wavenumber, below)
+        assert len(lines.between(-10., -1., 'nm')) == 0
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+sys.path.insert(0, '..')
+import numpy as np
+from mvdlib import misc
+
+x = np.random.RandomState(0).normal(3., 2., 10001)
+
+def test_running_stats():
+    lo, hi, sumsq, n = misc.running_stats(x, chunksize=1000)
+    assert lo == x.min() and hi == x.max()
+    assert np.isclose(sumsq, np.sum(x**2))
+    assert n == len(x)
+    # iterable of chunks
+    assert np.isclose(misc.stream_rms(misc.chunks(x, 333)), misc.rms(x))
+
+def test_inplace_matches_copy():
+    for func in (misc.remove_offset, misc.normalize,
+                 misc.fix_offset_and_normalize):
+        y = x.copy()
+        res = func(y, inplace=True, chunksize=1000)
+        assert res is y
+        assert np.allclose(y, func(x))
+
+def test_inplace_memmap():
+    fname = os.path.join(tempfile.mkdtemp(), 'trace.dat')
+    data = np.memmap(fname, dtype=float, mode='w+', shape=x.shape)
+    data[:] = x
+    misc.fix_offset_and_normalize(data, inplace=True, chunksize=512)
+    data.flush()
+    del data
+    data = np.memmap(fname, dtype=float, mode='r', shape=x.shape)
+    assert np.allclose(data, misc.fix_offset_and_normalize(x))
+
+def test_fused_matches_reference():
+    y = x.reshape(-1, 1)
+    for data in (x, y, x[::2]):
+        expected = (data - data.min())/(data - data.min()).max()
+        assert np.allclose(misc.fix_offset_and_normalize(data), expected)
+    out = np.empty_like(x)
+    assert misc.fix_offset_and_normalize(x, out=out) is out
+    assert np.isclose(misc.rms(x), np.sqrt(np.sum(x**2)/len(x)))
+    assert np.isclose(misc.rms(list(x)), misc.rms(x))
+
+def test_running_stats_nan():
+    # NaN propagates like np.min/np.max wherever it falls
+    for i in range(4):
+        y = np.array([1., 3., 5., 2.])
+        y[i] = np.nan
+        for chunksize in (1, 2, 4):
+            lo, hi, sumsq, n = misc.running_stats(y, chunksize)
+            assert np.isnan(lo) and np.isnan(hi) and np.isnan(sumsq)
+            assert n == 4
+            assert np.isnan(misc.remove_offset(y.copy(), True, chunksize)).all()
+            assert np.isnan(misc.normalize(y.copy(), True, chunksize)).all()
+
+def test_fused_nan():
+    # same NaN behaviour as the unfused data.min()/data.max() version
+    z = np.random.RandomState(1).normal(size=3*misc._BLOCKSIZE)
+    for i in (0, misc._BLOCKSIZE - 1, misc._BLOCKSIZE + 5, len(z) - 1):
+        y = z.copy()
+        y[i] = np.nan
+        assert np.isnan(misc.fix_offset_and_normalize(y)).all()
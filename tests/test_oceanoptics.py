@@ -0,0 +1,305 @@
+import os
+import sys
+import tempfile
+import zipfile
+sys.path.insert(0, '..')
+import numpy as np
+from mvdlib import fit_functions
+from mvdlib.oceanoptics import OOSpectrum, SpectrumSeries, reader
+
+lmbda = np.linspace(380., 420., 2048)
+response = fit_functions.gaussian(lmbda, 1000., 50., 397., 0.5)
+
+_spectrasuite = """SpectraSuite Data File
+++++++++++++++++++++++++++++++++++++
+Date: Mon Feb 24 14:15:41 CET 2014
+User: mvd
+Spectrometer Serial Number: USB2G14742
+Spectrometer Channel: 0
+Integration Time (usec): 100000 (USB2G14742)
+Spectra Averaged: 3 (USB2G14742)
+Boxcar Smoothing: 0 (USB2G14742)
+Correct for Electrical Dark: No (USB2G14742)
+Strobe/Lamp Enabled: No (USB2G14742)
+Correct for Detector Non-linearity: Yes (USB2G14742)
+Correct for Stray Light: No (USB2G14742)
+Number of Pixels in Processed Spectrum: 2048
+>>>>>Begin Processed Spectral Data<<<<<
+{data}
+>>>>>End Processed Spectral Data<<<<<
+"""
+
+_oceanview = """Data from FLMS12345__0__12-00-00-000.txt Node
+
+Date: Tue Mar 01 12:00:00 CET 2016
+User: mvd
+Spectrometer: FLMS12345
+Trigger mode: 0
+Integration Time (sec): 1.000000E-1
+Scans to average: 2
+Electric dark correction enabled: true
+Nonlinearity correction enabled: false
+Boxcar width: 1
+XAxis mode: Wavelengths
+Number of Pixels in Spectrum: 2048
+>>>>>Begin Spectral Data<<<<<
+{data}
+"""
+
+def _write(text, name):
+    fname = os.path.join(tempfile.mkdtemp(), name)
+    with open(fname, 'w') as out:
+        out.write(text)
+    return fname
+
+def _data(*columns):
+    return '\n'.join('\t'.join('%.6f' % v for v in row)
+                     for row in zip(*columns))
+
+def test_spectrasuite():
+    fname = _write(_spectrasuite.format(data=_data(lmbda, response)),
+                   'spectrasuite.txt')
+    spec = OOSpectrum()
+    spec.load_sample(fname)
+    assert np.allclose(spec.lmbda, lmbda, atol=1e-6)
+    assert np.allclose(spec.response, response, atol=1e-6)
+    header = spec.header
+    assert header.serial == 'USB2G14742'
+    assert np.isclose(header.integration_time, 0.1)
+    assert header.averages == 3
+    assert header.dark_corrected is False
+    assert header.nonlinearity_corrected is True
+    assert header.pixels == 2048
+    assert header.extra['Spectrometer Channel'] == '0'
+
+def test_oceanview_multiple_blocks():
+    block = _oceanview.format(data=_data(lmbda, response))
+    fname = _write(block + '>>>>>End Spectral Data<<<<<\n' + block,
+                   'oceanview.txt')
+    spectra = reader.read_spectra(fname)
+    assert len(spectra) == 2
+    header = spectra[1].header
+    assert header.serial == 'FLMS12345'
+    assert np.isclose(header.integration_time, 0.1)
+    assert header.averages == 2 and header.boxcar == 1
+    assert header.dark_corrected is True
+
+def test_multiple_columns_without_header():
+    fname = _write(_data(lmbda, response, 2*response), 'bare.txt')
+    spec = reader.read_spectrum(fname)
+    assert spec.response.shape == (2, len(lmbda))
+    assert np.allclose(spec.response[1], 2*response, atol=1e-5)
+
+def test_procspec():
+    doubles = lambda x: ''.join('<double>%r</double>' % v for v in x)
+    xml = ('<spectra><processedPixels>%s</processedPixels>'
+           '<channelWavelengths>%s</channelWavelengths>'
+           '<integrationTime>100000</integrationTime>'
+           '<spectrometerSerialNumber>USB2G14742</spectrometerSerialNumber>'
+           '</spectra>') % (doubles(response), doubles(lmbda))
+    fname = os.path.join(tempfile.mkdtemp(), 'spectrum.ProcSpec')
+    with zipfile.ZipFile(fname, 'w') as archive:
+        archive.writestr('ps_0.xml', xml)
+    spec = reader.read_spectrum(fname)
+    assert np.all(spec.response == response)
+    assert np.all(spec.lmbda == lmbda)
+    assert np.isclose(spec.header.integration_time, 0.1)
+    assert spec.header.serial == 'USB2G14742'
+
+def _series_spectra(n=40):
+    centers = np.linspace(395., 399., n)
+    return centers, np.array([fit_functions.gaussian(lmbda, 1000., 50., t0, 0.5)
+                              for t0 in centers])
+
+def test_series_growth_and_operations():
+    centers, spectra = _series_spectra()
+    series = SpectrumSeries(lmbda, capacity=1)
+    for s in spectra:
+        series.append(s)
+    assert len(series) == len(spectra)
+    assert series.capacity < 2*len(spectra)
+    assert np.all(series.responses == spectra)
+    dark = np.full(len(lmbda), 50.)
+    assert np.allclose(series.subtract_dark(dark), spectra - 50.)
+    assert np.all(series.responses == spectra)
+    assert np.allclose(series.mean(), spectra.mean(axis=0))
+    band = series.integrate_band(390., 410.) - 50.*20.
+    assert np.allclose(band, 1000.*0.5*np.sqrt(2*np.pi), rtol=1e-3)
+    p, perr = series.fit_gaussians()
+    assert np.allclose(p[:,2], centers)
+
+def test_series_memmap():
+    centers, spectra = _series_spectra(10)
+    fname = os.path.join(tempfile.mkdtemp(), 'series.dat')
+    series = SpectrumSeries(lmbda, capacity=2, filename=fname)
+    series.append(spectra[:3])
+    series.append(spectra[3:])
+    series.flush()
+    assert isinstance(series.responses, np.memmap)
+    stored = np.memmap(fname, dtype=float, mode='r')
+    assert np.all(stored[:spectra.size].reshape(spectra.shape) == spectra)
+
+def test_gaussian_edge_peak():
+    from mvdlib.oceanoptics import peaks, pipeline
+    # Line centered at the edge of the window: one half maximum crossing
+    # lies outside the data, so the FWHM cannot be measured
+    edge = fit_functions.gaussian(lmbda, 1000., 50., 380.2, 0.5)
+    p0 = peaks.gaussian_params(lmbda, edge)
+    assert np.isfinite(p0).all() and p0[3] > 0
+    assert np.isfinite(peaks.gaussian_params(lmbda, [edge, response])).all()
+    def frame(key, y):
+        spec = OOSpectrum()
+        spec.lmbda, spec.response = lmbda, y
+        return pipeline.Frame(key, spec)
+    fit = pipeline.GaussianFit()
+    fit._last = np.full(4, np.nan)
+    f = frame('edge', edge)
+    fit(f)
+    assert np.allclose(f.results['gaussian'], [1000., 50., 380.2, 0.5],
+                       rtol=1e-3)
+    assert np.allclose(fit._last, f.results['gaussian'])
+    # A failed fit is reported, not stored or used as a starting point
+    bad = pipeline.GaussianFit(p0=np.full(4, np.nan))
+    try:
+        bad(frame('bad', edge))
+    except RuntimeError:
+        pass
+    else:
+        assert False, "non-finite fit not reported"
+    assert bad._last is None
+    series = SpectrumSeries(lmbda)
+    series.append(edge)
+    series.append(response)
+    p, perr = series.fit_gaussians()
+    assert np.allclose(p[0], [1000., 50., 380.2, 0.5], rtol=1e-3)
+    assert np.allclose(p[1], [1000., 50., 397., 0.5], rtol=1e-3)
+    p, perr = series.fit_gaussians(p0=np.full(4, np.nan))
+    assert np.isnan(p).all() and np.isnan(perr).all()
+
+def test_pipeline_simulated():
+    from mvdlib.oceanoptics import pipeline
+    source = pipeline.SimulatedSource(n=20, drift=0.01, seed=0)
+    dark = np.full(2048, 50.)
+    pipe = pipeline.Pipeline(source, [pipeline.DarkSubtraction(dark),
+                                      pipeline.GaussianFit()], maxsize=2)
+    frames = list(pipe.start().results(timeout=10))
+    assert [f.key for f in frames] == ['simulated_%d' % i for i in range(20)]
+    assert all(f.error is None for f in frames)
+    centers = np.array([f.results['gaussian'][2] for f in frames])
+    assert np.allclose(centers, 397. + 0.01*np.arange(20), atol=1e-2)
+    assert pipe.latency_stats()['count'] == 20
+
+def test_pipeline_directory():
+    from mvdlib.oceanoptics import pipeline
+    path = tempfile.mkdtemp()
+    for i in range(3):
+        with open(os.path.join(path, 'spec_%d.txt' % i), 'w') as out:
+            out.write(_spectrasuite.format(data=_data(lmbda, response)))
+    source = pipeline.DirectorySource(path, '*.txt', interval=0.01,
+                                      existing=True, timeout=0.1)
+    pipe = pipeline.Pipeline(source, [pipeline.Normalize()])
+    frames = list(pipe.start().results(timeout=10))
+    assert len(frames) == 3
+    assert all(np.isclose(f.response.max(), 1.) for f in frames)
+
+def test_peaks():
+    from mvdlib.oceanoptics import peaks
+    centers, spectra = _series_spectra(5)
+    narrow = np.array([fit_functions.gaussian(lmbda, 1000., 50., t0, 0.05)
+                       for t0 in centers + 0.007])
+    noisy = narrow + np.random.RandomState(1).normal(0, 1., narrow.shape)
+    found = peaks.find_peaks(noisy[0])
+    assert len(found) == 1 and abs(lmbda[found[0]] - centers[0]) < 0.02
+    rows, cols = peaks.find_peaks(noisy)
+    assert np.all(rows == np.arange(5))
+    for method, atol in (('gaussian', 1e-3), ('parabolic', 5e-3),
+                         ('centroid', 5e-3)):
+        result = peaks.strongest_peak(lmbda, noisy, method)
+        assert np.allclose(result.center, centers + 0.007, atol=atol)
+    result = peaks.strongest_peak(lmbda, spectra[0])
+    assert np.isclose(result.center, centers[0], atol=1e-4)
+    assert np.isclose(result.height, 1000., rtol=1e-3)
+    p = peaks.gaussian_params(lmbda, spectra)
+    assert np.allclose(fit_functions.get_fwhm(p.T), 2.3548*0.5, rtol=1e-2)
+
+def test_fit_gaussian_roi():
+    spec = OOSpectrum()
+    spec.lmbda = lmbda
+    spec.response = response + np.random.RandomState(2).normal(0, 1., len(lmbda))
+    p_full, _ = spec.fit_gaussian()
+    for kwargs in ({'roi': 'auto'}, {'roi': (395., 399.)},
+                   {'roi': np.array([395., 399.])},
+                   {'roi': 'auto', 'binning': 2}):
+        p, cov = spec.fit_gaussian(**kwargs)
+        assert np.allclose(p, p_full, rtol=1e-2)
+    p = [1000., 50., 397., 0.5]
+    h = 1e-6
+    numeric = np.column_stack([
+        (fit_functions.gaussian(lmbda, *(p + h*np.eye(4)[i])) -
+         fit_functions.gaussian(lmbda, *p))/h for i in range(4)])
+    assert np.allclose(fit_functions.gaussian_jac(lmbda, *p), numeric,
+                       rtol=1e-3, atol=1e-3)
+
+def test_calibration():
+    from mvdlib.oceanoptics import calibration
+    from mvdlib.quantum import transitions
+    pixels = np.arange(2048.)
+    true = np.polyval([1e-9, -5e-6, 0.06, 350.], pixels)
+    lines = np.array([365.015, 404.656, 435.833, 446.0, 455.0])
+    lamp = sum(fit_functions.gaussian(true, 1000., 0., l, 0.1)
+               for l in lines) + 10.
+    # stored axis is slightly off; reference lines given in cm^-1
+    cal = calibration.Calibration.fit(
+        lamp, transitions.convert(lines, 'nm', 'cm^-1'), units='cm^-1',
+        approx=true + 0.3, serial='USB2G14742')
+    assert np.allclose(cal.axis(), true, atol=1e-3)
+    assert cal.axis() is cal.axis()
+    calibration.register(cal)
+    try:
+        fname = _write(_spectrasuite.format(data=_data(lmbda, response)),
+                       'calibrated.txt')
+        a, b = OOSpectrum(), OOSpectrum()
+        a.load_sample(fname)
+        b.load_sample(fname)
+        assert a.lmbda is cal.axis() and b.lmbda is a.lmbda
+        series = SpectrumSeries.from_files([fname, fname])
+        assert series.lmbda is cal.axis()
+    finally:
+        calibration.unregister('USB2G14742')
+
+def test_pipeline_directory_bad_file():
+    import time
+    from mvdlib.oceanoptics import pipeline
+    path = tempfile.mkdtemp()
+    with open(os.path.join(path, 'spec_0.txt'), 'w') as out:
+        out.write('not a spectrum\n')
+    source = pipeline.DirectorySource(path, '*.txt', interval=0.01,
+                                      existing=True, timeout=0.5)
+    pipe = pipeline.Pipeline(source, [pipeline.Normalize()]).start()
+    time.sleep(0.1)
+    with open(os.path.join(path, 'spec_1.txt'), 'w') as out:
+        out.write(_spectrasuite.format(data=_data(lmbda, response)))
+    frames = list(pipe.results(timeout=10))
+    assert [os.path.basename(f.key) for f in frames] == ['spec_0.txt',
+                                                         'spec_1.txt']
+    assert isinstance(frames[0].error, ValueError)
+    assert frames[0].response is None and frames[0].latency >= 0
+    assert frames[1].error is None
+    assert np.isclose(frames[1].response.max(), 1.)
+
+def test_calibration_one_to_one():
+    from mvdlib.oceanoptics import calibration
+    pixels = np.arange(2048.)
+    true = np.polyval([1e-9, -5e-6, 0.06, 350.], pixels)
+    lines = np.array([365.015, 404.656, 435.833, 446.0, 455.0])
+    # an unlisted line 0.5 nm from a reference line
+    lamp = sum(fit_functions.gaussian(true, 1000., 0., l, 0.1)
+               for l in np.append(lines, 405.15)) + 10.
+    cal = calibration.Calibration.fit(lamp, lines, approx=true + 0.3)
+    assert len(cal.residuals) == len(lines)
+    assert np.allclose(cal.axis(), true, atol=1e-3)
+    # the axis is kept with its calibration
+    other = calibration.Calibration(cal.coefficients, cal.pixels)
+    assert other.axis() is not cal.axis()
+    assert np.array_equal(other.axis(), cal.axis())
+    assert not hasattr(calibration, '_axes')
@@ -1,8 +1,12 @@
+import os
 import sys
+import tempfile
 sys.path.insert(0, '..')
 import numpy as np
 import matplotlib.pyplot as plt
 from mvdlib import plotutils
+from mvdlib.plotutils.batch import RenderJob, render_batch
+from mvdlib.plotutils.errorbar import fast_errorbar, bin_data
 
 x = np.linspace(0, 10, 100)
 y = np.sin(x)
@@ -15,6 +19,236 @@ def test_old_plot_settings():
     plt.savefig('plotutils.pdf')
     plt.close(fig)
 
+def test_style_context():
+    before = dict(plt.rcParams)
+    with plotutils.style('web'):
+        assert plt.rcParams['font.size'] == 14
+        assert plt.rcParams['mathtext.fontset'] == 'stixsans'
+    assert dict(plt.rcParams) == before
+    # parsed once and cached
+    assert 'web' in plotutils._style_cache
+    rc, comment = plotutils.read_style('web')
+    rc['font.size'] = 1
+    assert plotutils.read_style('web')[0]['font.size'] == 14
+    # installation specific keys are ignored
+    assert 'backend' not in plotutils.read_style('default')[0]
+
+def test_register_style():
+    filename = os.path.join(tempfile.mkdtemp(), 'mine.json')
+    with open(filename, 'w') as json_file:
+        json_file.write('{"comment": "Mine", "lines.linewidth": 3}')
+    plotutils.register_style('mine', filename)
+    assert plotutils.read_style('mine') == ({'lines.linewidth': 3.}, 'Mine')
+    plotutils.register_style('mine', {'lines.linewidth': 4})
+    with plotutils.style('mine'):
+        assert plt.rcParams['lines.linewidth'] == 4
+    del plotutils.styles['mine']
+    plotutils._style_cache.pop('mine')
+
+class _Sine(object):
+    def __init__(self, phase):
+        self.phase = phase
+
+    def draw(self, ax, **kwargs):
+        ax.plot(x, np.sin(x + self.phase), kwargs.get('fmt', '-'))
+
+def test_render_batch():
+    outdir = tempfile.mkdtemp()
+    before = dict(plt.rcParams)
+    jobs = [RenderJob(_Sine(i), os.path.join(outdir, 'sub', '%d.png' % i),
+                      'web', {'fmt': 'o', 'dpi': 50})
+            for i in range(4)]
+    jobs.append(RenderJob(_Sine(0), os.path.join(outdir, 'sine.svg')))
+    filenames = render_batch(jobs, processes=2)
+    assert filenames == [job.filename for job in jobs]
+    for filename in filenames:
+        assert os.path.getsize(filename) > 0
+    with open(filenames[-1]) as svg:
+        assert svg.read(100).startswith('<?xml')
+    # serial rendering in this process leaves pyplot untouched
+    render_batch(jobs[:2], processes=1)
+    assert dict(plt.rcParams) == before
+    assert plt.get_fignums() == []
+
+def test_fast_errorbar():
+    fig = plt.figure()
+    ax = fig.gca()
+    artists = fast_errorbar(ax, x, y, 0.1, fmt='o')
+    assert not artists.binned
+    assert len(artists.errorbars.get_segments()) == len(x)
+    assert len(ax.lines) == 1 and len(ax.collections) == 1
+    assert not artists.line.get_rasterized()
+    assert ax.get_ylim()[1] >= 1.1
+    plt.close(fig)
+
+def test_fast_errorbar_binned():
+    n = 200000
+    xx = np.linspace(0, 10, n)
+    yy = np.sin(xx) + np.random.RandomState(1).normal(0, 0.1, n)
+    fig = plt.figure()
+    artists = fast_errorbar(fig.gca(), xx, yy, 0.1, bins=100)
+    assert artists.binned
+    assert len(artists.line.get_xdata()) == 100
+    assert np.allclose(artists.line.get_ydata(), np.sin(artists.line.get_xdata()),
+                       atol=0.05)
+    # the error of the mean of 2000 points with error 0.1
+    assert np.allclose(artists.errorbars.get_segments()[0][:,1].ptp(),
+                       2*0.1/np.sqrt(n/100))
+    plt.close(fig)
+    fig = plt.figure()
+    artists = fast_errorbar(fig.gca(), xx[:5000], yy[:5000], 0.1)
+    assert artists.line.get_rasterized() and artists.errorbars.get_rasterized()
+    plt.close(fig)
+
+def test_bin_data_without_errors():
+    xm, ym, err = bin_data([0, 1, 2, 3], [1, 3, 5, 5], bins=2)
+    assert np.allclose(xm, [0.5, 2.5])
+    assert np.allclose(ym, [2, 5])
+    assert np.allclose(err, [1/np.sqrt(2), 0])
+
+def _stub_tex(directory):
+    """Write a fake TeX engine which "compiles" a .tex file by copying
+    the PGF files it inputs to the PDF, one per form feed separated
+    "page", counting its invocations.
+
+    """
+    script = os.path.join(directory, 'faketex')
+    with open(script, 'w') as out:
+        out.write('#!%s\n' % sys.executable)
+        out.write(
+            'import sys, re, time\n'
+            'tex = open(sys.argv[-1]).read()\n'
+            'pgf = [open(name).read()\n'
+            '       for name in re.findall(r"\\\\input{(.*?)}", tex)]\n'
+            'print("This is FakeTeX")\n'
+            'if "SLOW" in pgf[0]: time.sleep(0.5)\n'
+            'if "FAIL" in pgf: sys.exit(1)\n'
+            'open(sys.argv[-1][:-3] + "pdf", "w").write("\\f".join(pgf))\n'
+            'open(%r, "a").write("x")\n' % os.path.join(directory, 'count'))
+    os.chmod(script, 0o755)
+    return script
+
+def _stub_split(directory):
+    """Write a fake PDF splitter for the output of _stub_tex."""
+    script = os.path.join(directory, 'fakesplit')
+    with open(script, 'w') as out:
+        out.write('#!%s\n' % sys.executable)
+        out.write(
+            'import sys\n'
+            'pages = open(sys.argv[1]).read().split("\\f")\n'
+            'for i, page in enumerate(pages):\n'
+            '    open(sys.argv[2] % (i + 1), "w").write(page)\n')
+    os.chmod(script, 0o755)
+    return [script, '{input}', '{output}']
+
+def _compile_pgf(content, outfile, texcmd, preamble=()):
+    builddir = tempfile.mkdtemp()
+    with open(os.path.join(builddir, 'figure.pgf'), 'w') as pgf:
+        pgf.write(content)
+    return plotutils._compile(builddir, 'figure', outfile, list(preamble),
+                              texcmd, True)
+
+def test_pgf_cache():
+    tmp = tempfile.mkdtemp()
+    texcmd = _stub_tex(tmp)
+    old_cache_dir = plotutils.cache_dir
+    plotutils.cache_dir = os.path.join(tmp, 'cache')
+    count = lambda: len(open(os.path.join(tmp, 'count')).read())
+    try:
+        out = os.path.join(tmp, 'a.pdf')
+        assert _compile_pgf('figure a', out, texcmd) == out
+        assert open(out).read() == 'figure a'
+        assert count() == 1
+        # unchanged figure: no compile
+        _compile_pgf('figure a', os.path.join(tmp, 'b.pdf'), texcmd)
+        assert count() == 1
+        assert open(os.path.join(tmp, 'b.pdf')).read() == 'figure a'
+        # changed figure or preamble: compile
+        _compile_pgf('figure c', os.path.join(tmp, 'c.pdf'), texcmd)
+        _compile_pgf('figure a', os.path.join(tmp, 'd.pdf'), texcmd,
+                     [r'\usepackage{amsmath}'])
+        assert count() == 3
+        assert len(os.listdir(plotutils.cache_dir)) == 3
+        try:
+            _compile_pgf('FAIL', os.path.join(tmp, 'e.pdf'), texcmd)
+            assert False
+        except RuntimeError:
+            pass
+        assert not os.path.exists(os.path.join(tmp, 'e.pdf'))
+    finally:
+        plotutils.cache_dir = old_cache_dir
+
+def test_pgf_batch():
+    from mvdlib.plotutils.pgfbatch import PGFBatch
+    tmp = tempfile.mkdtemp()
+    texcmd = _stub_tex(tmp)
+    old_cache_dir = plotutils.cache_dir
+    plotutils.cache_dir = os.path.join(tmp, 'cache')
+    count = lambda: len(open(os.path.join(tmp, 'count')).read())
+    exported = []
+    # Exporting PGF needs a real TeX installation, so store text instead
+    def export(fig, builddir, name):
+        with open(os.path.join(builddir, name + '.pgf'), 'w') as pgf:
+            pgf.write(fig)
+        exported.append(name)
+    import mvdlib.plotutils.pgfbatch as pgfbatch
+    old_export = pgfbatch._export
+    pgfbatch._export = export
+    try:
+        _compile_pgf('figure 1', os.path.join(tmp, 'cached.pdf'), texcmd)
+        assert count() == 1
+        with PGFBatch(texcmd=texcmd, splitcmd=_stub_split(tmp)) as batch:
+            for i in range(5):
+                plotutils.pgfsave(os.path.join(tmp, '%d.pdf' % i),
+                                  figure='figure %d' % i, batch=batch)
+            assert len(batch) == 5
+        # one TeX run for the four figures not in the cache
+        assert count() == 2
+        for i in range(5):
+            assert open(os.path.join(tmp, '%d.pdf' % i)).read() == \
+                'figure %d' % i
+        assert not os.path.exists(batch.builddir)
+        # everything cached now
+        batch = PGFBatch(texcmd=texcmd, splitcmd=_stub_split(tmp))
+        batch.add(os.path.join(tmp, 'again.pdf'), 'figure 3')
+        assert batch.compile() == [os.path.join(tmp, 'again.pdf')]
+        assert count() == 2
+    finally:
+        plotutils.cache_dir = old_cache_dir
+        pgfbatch._export = old_export
+
+def test_tex_pool():
+    import time
+    from mvdlib.plotutils import texpool
+    tmp = tempfile.mkdtemp()
+    texcmd = _stub_tex(tmp)
+    def export(fig, builddir, name):
+        with open(os.path.join(builddir, name + '.pgf'), 'w') as pgf:
+            pgf.write(fig)
+    old_export = texpool._export
+    texpool._export = export
+    try:
+        start = time.time()
+        with texpool.TeXPool(4, texcmd=texcmd, cache=False) as pool:
+            futures = [plotutils.pgfsave(os.path.join(tmp, '%d.pdf' % i),
+                                         figure='SLOW %d' % i, pool=pool)
+                       for i in range(4)]
+            failed = pool.submit(os.path.join(tmp, 'failed.pdf'), 'FAIL')
+            # submitting does not wait for TeX
+            assert time.time() - start < 0.5
+            assert pool.wait().keys() == [failed.filename]
+        # the four slow compiles ran concurrently
+        assert time.time() - start < 1.5
+        for i, future in enumerate(futures):
+            assert future.done()
+            assert future.result() == os.path.join(tmp, '%d.pdf' % i)
+            assert open(future.filename).read() == 'SLOW %d' % i
+            assert 'FakeTeX' in future.log
+        assert isinstance(failed.exception(), plotutils.TeXError)
+        assert 'FakeTeX' in failed.log
+    finally:
+        texpool._export = old_export
+
 def pgf_test():
     fig = plt.figure()
     plt.plot(x, y)
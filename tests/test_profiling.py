@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import tempfile
+sys.path.insert(0, '..')
+import numpy as np
+from mvdlib import profiling, fit_functions
+from mvdlib.analysis.combine import Combiner
+from mvdlib.analysis.plot import Plotter
+from mvdlib.oceanoptics import OOSpectrum
+from mvdlib.quantum.rabi import RabiFlop
+
+def _write_files(n=3):
+    datadir = tempfile.mkdtemp()
+    x = np.linspace(0, 1, 50)
+    for i in range(1, n + 1):
+        np.savetxt(os.path.join(datadir, 'data_%04d.dat' % i),
+                   np.column_stack([x, x*i]))
+    return datadir
+
+def test_disabled():
+    profiling.disable()
+    profiling.reset()
+    Combiner(_write_files(), 'data_').combine([1, 2])
+    assert profiling.registry == {}
+
+@profiling.timed()
+def _work():
+    with profiling.section('test.inner'):
+        pass
+
+def test_timed_and_section():
+    profiling.enable()
+    try:
+        for i in range(3):
+            _work()
+    finally:
+        profiling.disable()
+    stats = profiling.registry['test_profiling._work']
+    assert stats.calls == 3 and stats.time >= 0
+    assert profiling.registry['test.inner'].calls == 3
+
+def test_instrumented_pipeline():
+    datadir = _write_files()
+    t = np.linspace(0, 10, 40)
+    rabi_file = os.path.join(datadir, 'rabi.csv')
+    np.savetxt(rabi_file, np.column_stack(
+        [t, 50 - 50*np.cos(2*t)*np.exp(-t/20), np.ones(len(t))]),
+        delimiter=',')
+    profiling.enable()
+    try:
+        Combiner(datadir, 'data_').combine([1, 2, 3])
+        RabiFlop(rabi_file).fit(2., 20.)
+    finally:
+        profiling.disable()
+    combine = profiling.registry['Combiner.combine']
+    assert combine.calls == 1
+    assert combine.bytes_read == sum(
+        os.path.getsize(os.path.join(datadir, 'data_%04d.dat' % i))
+        for i in range(1, 4))
+    assert profiling.registry['RabiFlop.load'].bytes_read == \
+        os.path.getsize(rabi_file)
+    assert profiling.registry['RabiFlop.fit'].evaluations > 3
+
+    table = profiling.summary().splitlines()
+    assert len(table) == 1 + len(profiling.registry)
+    assert 'Combiner.combine' in profiling.summary()
+    outfile = os.path.join(datadir, 'profile.json')
+    profiling.dump(outfile)
+    with open(outfile) as infile:
+        data = json.load(infile)
+    assert data['Combiner.combine']['calls'] == 1
+
+def test_instrumented_spectrum_and_plotter():
+    datadir = _write_files()
+    spec = OOSpectrum()
+    spec.lmbda = np.linspace(380., 420., 2048)
+    # a line at the edge of the window, whose FWHM cannot be measured
+    spec.response = fit_functions.gaussian(spec.lmbda, 1000., 50., 380.2, .5)
+    profiling.enable()
+    try:
+        p, cov = spec.fit_gaussian()
+        p_roi, cov = spec.fit_gaussian(roi='auto')
+        plotter = Plotter(datadir, 'data_')
+        plotter.add_data([1, 2])
+    finally:
+        profiling.disable()
+    assert np.allclose(p, [1000., 50., 380.2, .5], rtol=1e-3)
+    assert np.allclose(p_roi, p, rtol=1e-3)
+    assert profiling.registry['OOSpectrum.fit_gaussian'].evaluations > 2
+    assert profiling.registry['Plotter.add_data'].bytes_read == sum(
+        os.path.getsize(os.path.join(datadir, 'data_%04d.dat' % i))
+        for i in (1, 2))
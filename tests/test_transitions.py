@@ -0,0 +1,78 @@
+import sys
+sys.path.insert(0, '..')
+import numpy as np
+from scipy.constants import c, h
+from mvdlib.quantum import transitions
+
+wavenum = 25191.51 # Ca+ 397 nm transition
+
+def test_convert_matches_definitions():
+    wl = transitions.convert(wavenum, 'cm^-1', 'nm')
+    assert np.isclose(wl, 1e7/wavenum)
+    f = transitions.convert(wavenum, 'cm^-1', 'Hz')
+    assert np.isclose(f, c*wavenum*1e2)
+    w = transitions.convert(f, 'Hz', 'rad/s')
+    assert np.isclose(w, 2*np.pi*f)
+    E = transitions.convert(w, 'rad/s', 'J')
+    assert np.isclose(E, h*f)
+    assert np.isclose(transitions.convert(E, 'J', 'cm^-1'), wavenum)
+
+def test_convert_round_trip():
+    units = ['nm', 'um', 'cm^-1', 'THz', 'Grad/s', 'eV']
+    x = np.linspace(20000., 30000., 11)
+    for a in units:
+        for b in units:
+            y = transitions.convert(x, 'cm^-1', a)
+            z = transitions.convert(transitions.convert(y, a, b), b, 'cm^-1')
+            assert np.allclose(z, x)
+
+def test_convert_out():
+    x = np.linspace(400., 800., 10)
+    out = np.empty_like(x)
+    res = transitions.convert(x, 'nm', 'THz', out=out)
+    assert res is out
+    assert np.allclose(out, transitions.wavelength_to_frequency(x))
+
+def test_shortcuts_validate_units():
+    for func, units in ((transitions.wavenumber_to_frequency, 'nm'),
+                        (transitions.wavenumber_to_wavelength, 'THz'),
+                        (transitions.convert, 'parsec')):
+        try:
+            if func is transitions.convert:
+                func(1., 'nm', units)
+            else:
+                func(1., units)
+        except transitions.UnitsError as e:
+            assert 'units units' not in str(e).lower()
+        else:
+            assert False, "expected UnitsError"
+
+def test_inputs_not_mutated():
+    freq = np.array([1e12, 2e12, 3e12])
+    orig = freq.copy()
+    transitions.frequency_to_wavenumber(freq)
+    assert np.all(freq == orig)
+
+def test_inplace():
+    x = np.linspace(400., 800., 10)
+    expected = transitions.convert(x, 'nm', 'THz')
+    res = transitions.convert(x, 'nm', 'THz', inplace=True)
+    assert res is x
+    assert np.allclose(x, expected)
+    try:
+        transitions.convert(np.arange(10), 'nm', 'THz', inplace=True)
+    except TypeError:
+        pass
+    else:
+        assert False, "expected TypeError"
+
+def test_conversion_blocks_reuse_scratch():
+    conv = transitions.Conversion('cm^-1', 'THz')
+    x = np.linspace(20000., 30000., 1000)
+    blocks = []
+    buffers = set()
+    for block in conv.blocks(x, blocksize=300):
+        buffers.add(block.__array_interface__['data'][0])
+        blocks.append(block.copy())
+    assert len(buffers) == 1
+    assert np.allclose(np.concatenate(blocks), conv(x))